@@ -30,6 +30,8 @@ import sift.ui.open_cache_dialog_ui as open_cache_dialog_ui
 from sift.control.LayerManager import LayerSetsManager
 from sift.model.document import Document, DocLayer
 from sift.view.SceneGraphManager import SceneGraphManager
+from sift.view.texture_budget import DEFAULT_TEXTURE_BUDGET
+from sift.view.animation import format_stats
 from sift.view.ProbeGraphs import ProbeGraphManager, DEFAULT_POINT_PROBE
 from sift.view.export_image import ExportImageHelper
 from sift.view.create_algebraic import CreateAlgebraicDialog
@@ -335,6 +337,14 @@ class Main(QtGui.QMainWindow):
         else:
             self.update_frame_time_to_top_visible()
 
+    def update_preload_progress(self, ready, total):
+        if ready < total:
+            self.ui.statusbar.showMessage("INFO: {} of {} animation frames loaded".format(ready, total), STATUS_BAR_DURATION)
+
+    def report_animation(self, stats):
+        # let the presenter know whether the requested frame rate actually happened
+        self.ui.statusbar.showMessage("INFO: Animation " + format_stats(stats), STATUS_BAR_DURATION * 3)
+
     def update_frame_time_to_top_visible(self, *args):
         # FUTURE: don't address layer set directly
         self.ui.animationLabel.setText(self.document.time_label_for_uuid(self.scene_manager.layer_set.top_layer_uuid()))
@@ -507,7 +517,9 @@ class Main(QtGui.QMainWindow):
             data_str = "N/A"
         self.ui.cursorProbeText.setText("Probe Value: {} ".format(data_str))
 
-    def __init__(self, workspace_dir=None, workspace_size=None, glob_pattern=None, border_shapefile=None, center=None):
+    def __init__(self, workspace_dir=None, workspace_size=None, glob_pattern=None, border_shapefile=None, center=None,
+                 watch_dirs=(), packed_rgb=False, texture_budget=DEFAULT_TEXTURE_BUDGET, half_float=False,
+                 wait_for_frames=False, hold_frames=False):
         super(Main, self).__init__()
         self.ui = Ui_MainWindow()
         self.ui.setupUi(self)
@@ -529,9 +541,16 @@ class Main(QtGui.QMainWindow):
         # create manager and helper classes
         self.workspace = Workspace(workspace_dir, max_size_gb=workspace_size, queue=self.queue)
         self.document = doc = Document(self.workspace)
+        for watch_dir in watch_dirs:
+            self.workspace.watch_directory(watch_dir)
         self.scene_manager = SceneGraphManager(doc, self.workspace, self.queue,
                                                border_shapefile=border_shapefile,
                                                center=center,
+                                               packed_rgb=packed_rgb,
+                                               texture_budget=texture_budget,
+                                               half_float=half_float,
+                                               wait_for_frames=wait_for_frames,
+                                               hold_frames=hold_frames,
                                                parent=self)
         self.export_image = ExportImageHelper(self, self.document, self.scene_manager)
 
@@ -541,6 +560,8 @@ class Main(QtGui.QMainWindow):
         self.ui.projectionComboBox.currentIndexChanged.connect(self.document.change_projection_index)
 
         self.scene_manager.didChangeFrame.connect(self.update_frame_slider)
+        self.scene_manager.didChangePreload.connect(self.update_preload_progress)
+        self.scene_manager.didReportAnimation.connect(self.report_animation)
         self.ui.animPlayPause.clicked.connect(self.toggle_animation)
         self.ui.animPlayPause.setContextMenuPolicy(QtCore.Qt.CustomContextMenu)
         self.ui.animPlayPause.customContextMenuRequested.connect(self.show_animation_speed_slider)
@@ -622,6 +643,7 @@ class Main(QtGui.QMainWindow):
         self.document.didRemoveLayers.connect(self.update_frame_time_to_top_visible)
         self.document.didAddBasicLayer.connect(self.update_frame_time_to_top_visible)
         self.document.didAddCompositeLayer.connect(self.update_frame_time_to_top_visible)
+        self.document.didAddCompositeLayers.connect(self.update_frame_time_to_top_visible)
         self.document.didChangeProjection.connect(self.scene_manager.set_projection)
 
         self.ui.panZoomToolButton.toggled.connect(partial(self.change_tool, name=TOOL.PAN_ZOOM))
@@ -642,6 +664,7 @@ class Main(QtGui.QMainWindow):
         zap = lambda *args: self.graphManager.update_point_probe(DEFAULT_POINT_PROBE)
         self.document.didAddBasicLayer.connect(zap)
         self.document.didAddCompositeLayer.connect(zap)
+        self.document.didAddCompositeLayers.connect(zap)
         # FIXME: These were added as a simple fix to update the probe value on layer changes, but this should really
         #        have its own manager-like object
         def _blackhole(*args, **kwargs):
@@ -649,6 +672,7 @@ class Main(QtGui.QMainWindow):
         self.document.didChangeLayerVisibility.connect(_blackhole)
         self.document.didAddBasicLayer.connect(_blackhole)
         self.document.didAddCompositeLayer.connect(_blackhole)
+        self.document.didAddCompositeLayers.connect(_blackhole)
         self.document.didRemoveLayers.connect(_blackhole)
         self.document.didReorderLayers.connect(_blackhole)
         if False:
@@ -665,6 +689,7 @@ class Main(QtGui.QMainWindow):
 
     def closeEvent(self, event, *args, **kwargs):
         LOG.debug('main window closing')
+        self.scene_manager.close()
         self.workspace.close()
 
     def toggle_animation(self, action:QtGui.QAction=None, *args):
@@ -738,6 +763,13 @@ class Main(QtGui.QMainWindow):
         dialog.raise_()
         dialog.activateWindow()
 
+    def loop_algebraic(self, *args, **kwargs):
+        uuids = list(self.behaviorLayersList.current_selected_uuids())
+        if len(uuids) != 1:
+            LOG.warning('select one algebraic layer to build a loop from')
+            return
+        self.document.loop_algebraic_layers_following(uuids[0])
+
     def setup_menu(self):
         open_action = QtGui.QAction("&Open...", self)
         open_action.setShortcut("Ctrl+O")
@@ -832,6 +864,9 @@ class Main(QtGui.QMainWindow):
         algebraic = QtGui.QAction("Create Algebraic", self)
         algebraic.triggered.connect(self.create_algebraic)
 
+        loop_algebraic = QtGui.QAction("Loop Algebraic Across Time Steps", self)
+        loop_algebraic.triggered.connect(self.loop_algebraic)
+
         toggle_point = QtGui.QAction("Toggle Point Probe", self)
         toggle_point.setShortcut('X')
         toggle_point.triggered.connect(lambda: self.graphManager.toggle_point_probe(DEFAULT_POINT_PROBE))
@@ -844,6 +879,7 @@ class Main(QtGui.QMainWindow):
         layer_menu = menubar.addMenu('&Layer')
         layer_menu.addAction(composite)
         layer_menu.addAction(algebraic)
+        layer_menu.addAction(loop_algebraic)
 
         view_menu = menubar.addMenu('&View')
         view_menu.addAction(animate)
@@ -894,6 +930,18 @@ def main():
                         help="Specify glob pattern for input images")
     parser.add_argument("-c", "--center", nargs=2, type=float,
                         help="Specify center longitude and latitude for camera")
+    parser.add_argument("--watch", dest="watch_dirs", action="append", default=[],
+                        help="Follow a landing directory (Linux), importing new files that continue the animation loop")
+    parser.add_argument("--packed-rgb", action="store_true",
+                        help="Apply RGB color limits and gamma on the CPU and pack each RGB layer into one 8-bit texture, fitting more frames of RGB loops in GPU memory")
+    parser.add_argument("--texture-budget", type=int, default=DEFAULT_TEXTURE_BUDGET // (1024 * 1024),
+                        help="Megabytes of GPU texture memory shared by all image layers")
+    parser.add_argument("--half-float", action="store_true",
+                        help="Store image tiles as 16-bit floats where the data range allows it, halving texture memory per frame")
+    parser.add_argument("--wait-for-frames", action="store_true",
+                        help="Start animation playback only once every frame that fits in memory is loaded for the current view")
+    parser.add_argument("--hold-frames", action="store_true",
+                        help="When frames cannot be drawn in time, show every frame and slow the animation down instead of dropping frames")
     parser.add_argument("--desktop", type=int, default=0,
                         help="Number of monitor/display to show the main window on (0 for main, 1 for secondary, etc.)")
     parser.add_argument('-v', '--verbose', dest='verbosity', action="count", default=int(os.environ.get("VERBOSITY", 2)),
@@ -921,6 +969,12 @@ def main():
         glob_pattern=args.glob_pattern,
         border_shapefile=args.border_shapefile,
         center=args.center,
+        watch_dirs=args.watch_dirs,
+        packed_rgb=args.packed_rgb,
+        texture_budget=args.texture_budget * 1024 * 1024,
+        half_float=args.half_float,
+        wait_for_frames=args.wait_for_frames,
+        hold_frames=args.hold_frames,
     )
     screen = QtGui.QApplication.desktop()
     screen_geometry = screen.screenGeometry(args.desktop)
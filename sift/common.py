@@ -63,6 +63,9 @@ IMAGE_MESH_SIZE = 10
 # smallest difference between two image extents (in canvas units)
 # before the image is considered "out of view"
 CANVAS_EXTENTS_EPSILON = 1e-4
+# largest finite float16, and how many distinct values float16 must keep across a product's range to stand in for float32
+HALF_FLOAT_MAX = 65504.
+HALF_FLOAT_LEVELS = 1024
 
 #R_EQ = 6378.1370  # km
 #R_POL = 6356.7523142  # km
@@ -441,6 +444,104 @@ def visible_tiles(pixel_rez,
     return tilebox
 
 
+@jit(nopython=True)
+def _tile_fraction(ti, tiles_avail):
+    """factor and offset of one tile along one axis, see TileCalculator.calc_tile_fraction
+    """
+    if ti < -tiles_avail / 2. + 0.5:
+        # left/top edge tile
+        offset = -tiles_avail / 2. + 0.5 - ti
+        return 1. - offset, offset
+    elif tiles_avail / 2. + 0.5 - ti < 1:
+        # right/bottom edge tile
+        return tiles_avail / 2. + 0.5 - ti, 0.
+    # full tile
+    return 1., 0.
+
+
+@jit(nopython=True)
+def fill_tile_coordinates(vertices, tex_coords, slots, tiys, tixs, ttiles,
+                          image_shape, tile_shape, image_center, pixel_rez, stride,
+                          texture_shape, tessellation_level, x_shift):
+    """
+    write vertex and texture coordinates of a batch of tiles in to preallocated (N, 2) float32 buffers
+    tile k goes to rows slots[k] * 6 * tessellation_level ** 2 onward, quads laid out like calc_vertex_coordinates
+    x_shift moves the vertices east in world coordinates, e.g. for a copy wrapped around the anti-meridian
+    """
+    tl = tessellation_level
+    tile_rows = 6 * tl * tl
+    ath = (image_shape[0] / float(stride[0])) / tile_shape[0]
+    atw = (image_shape[1] / float(stride[1])) / tile_shape[1]
+    tile_w = pixel_rez[1] * tile_shape[1] * stride[1]
+    tile_h = pixel_rez[0] * tile_shape[0] * stride[0]
+    origin_x = image_center[1] - tile_w / 2. + x_shift
+    origin_y = image_center[0] + tile_h / 2.
+    one_tile_tex_width = 1.0 / (texture_shape[1] * tile_shape[1]) * tile_shape[1]
+    one_tile_tex_height = 1.0 / (texture_shape[0] * tile_shape[0]) * tile_shape[0]
+    # corners of the two triangles of a quad
+    quad_x = (0., 1., 1., 0., 1., 0.)
+    quad_y = (0., 0., 1., 0., 1., 1.)
+    for k in range(slots.shape[0]):
+        tiy = tiys[k]
+        tix = tixs[k]
+        factor_y, offset_y = _tile_fraction(tiy, ath)
+        factor_x, offset_x = _tile_fraction(tix, atw)
+        ttiy = ttiles[k] // texture_shape[1]
+        ttix = ttiles[k] % texture_shape[1]
+        for x_idx in range(tl):
+            vx0 = origin_x + tile_w * (tix + offset_x + factor_x * x_idx / tl)
+            tx0 = one_tile_tex_width * (ttix + factor_x * x_idx / tl)
+            for y_idx in range(tl):
+                vy0 = origin_y - tile_h * (tiy + offset_y + factor_y * y_idx / tl)
+                ty0 = one_tile_tex_height * (ttiy + factor_y * y_idx / tl)
+                row = slots[k] * tile_rows + (x_idx * tl + y_idx) * 6
+                for c in range(6):
+                    vertices[row + c, 0] = vx0 + quad_x[c] * tile_w * factor_x / tl
+                    # Origin is upper-left so image goes down
+                    vertices[row + c, 1] = vy0 - quad_y[c] * tile_h * factor_y / tl
+                    tex_coords[row + c, 0] = tx0 + quad_x[c] * one_tile_tex_width * factor_x / tl
+                    tex_coords[row + c, 1] = ty0 + quad_y[c] * one_tile_tex_height * factor_y / tl
+
+
+@jit(nopython=True)
+def finite_range(data):
+    """
+    (min, max) of the finite values of a float array, (nan, nan) if there are none
+    """
+    lo = np.inf
+    hi = -np.inf
+    for v in data.flat:
+        if np.isfinite(v):
+            if v < lo:
+                lo = v
+            if v > hi:
+                hi = v
+    if lo > hi:
+        return np.nan, np.nan
+    return lo, hi
+
+
+def half_float_fits(lo, hi, levels=HALF_FLOAT_LEVELS):
+    """
+    True if float16 holds values from lo to hi without overflowing and with at least `levels` steps between them
+    """
+    if not (np.isfinite(lo) and np.isfinite(hi)):
+        return False
+    biggest = max(abs(lo), abs(hi))
+    if biggest > HALF_FLOAT_MAX:
+        return False
+    # float16 is coarsest at the largest magnitude
+    step = float(np.spacing(np.float16(biggest)))
+    return hi == lo or (hi - lo) / step >= levels
+
+
+def to_half_float(data):
+    """
+    float16 copy of a tile, NaN fill values stay NaN and values beyond float16 saturate instead of becoming infinite
+    """
+    return np.clip(data, -HALF_FLOAT_MAX, HALF_FLOAT_MAX).astype(np.float16)
+
+
 class TileCalculator(object):
     """
     common calculations for mercator tile groups in an array or file
@@ -506,6 +607,13 @@ class TileCalculator(object):
         self.tile_size = rez(self.pixel_rez.dy * self.tile_shape[0], self.pixel_rez.dx * self.tile_shape[1])
         self.overview_stride = self.calc_overview_stride()
 
+    def set_texture_shape(self, texture_shape):
+        """
+        texture atlas was resized, texture coordinates are calculated for the new shape from here on
+        """
+        self.texture_shape = texture_shape
+        self.texture_size = (self.texture_shape[0] * self.tile_shape[0], self.texture_shape[1] * self.tile_shape[1])
+
     def visible_tiles(self, visible_geom, stride=pnt(1, 1), extra_tiles_box=box(0, 0, 0, 0)):
         # return visible_tiles(self.pixel_rez,
         #                      self.tile_size,
@@ -680,10 +788,78 @@ class TileCalculator(object):
         quads = np.ascontiguousarray(quads[:, :2])
         return quads
 
+    def calc_tile_coordinates(self, vertices, tex_coords, slots, tiys, tixs, ttiles, stride,
+                              tessellation_level=1, x_shift=0.):
+        """Write vertex and texture coordinates of many tiles in to preallocated buffers in one call.
+
+        :param vertices: (N, 2) float32 buffer, 6 * tessellation_level ** 2 rows per tile slot
+        :param tex_coords: (N, 2) float32 buffer laid out like vertices
+        :param slots: tile slot in the buffers of each tile
+        :param tiys: image tile Y index of each tile
+        :param tixs: image tile X index of each tile
+        :param ttiles: texture tile index of each tile
+        :param stride: (Y, X) stride of the tiles
+        :param x_shift: world units to move the vertices east, for copies wrapped around the anti-meridian
+        """
+        fill_tile_coordinates(vertices, tex_coords,
+                              np.ascontiguousarray(slots, dtype=np.int64),
+                              np.ascontiguousarray(tiys, dtype=np.int64),
+                              np.ascontiguousarray(tixs, dtype=np.int64),
+                              np.ascontiguousarray(ttiles, dtype=np.int64),
+                              (np.int64(self.image_shape[0]), np.int64(self.image_shape[1])),
+                              (np.int64(self.tile_shape[0]), np.int64(self.tile_shape[1])),
+                              (np.float64(self.image_center[0]), np.float64(self.image_center[1])),
+                              (np.float64(self.pixel_rez[0]), np.float64(self.pixel_rez[1])),
+                              (np.int64(stride[0]), np.int64(stride[1])),
+                              (np.int64(self.texture_shape[0]), np.int64(self.texture_shape[1])),
+                              np.int64(tessellation_level), np.float64(x_shift))
+
     def calc_view_extents(self, canvas_point, image_point, canvas_size, dx, dy):
         return calc_view_extents(self.image_extents_box, canvas_point, image_point, canvas_size, dx, dy)
 
 
+class tests(unittest.TestCase):
+
+    def test_batch_tile_coordinates(self):
+        calc = TileCalculator('test', (1000, 2000), pnt(x=-1000e3, y=500e3), rez(dy=1e3, dx=1e3),
+                              tile_shape=(64, 64), texture_shape=(4, 8))
+        stride = pnt(np.int64(2), np.int64(2))
+        tess = 3
+        tile_rows = 6 * tess * tess
+        # edge tiles on every side, in no particular slot order
+        tiles = [(-4, -8, 5), (3, 7, 0), (0, 0, 31), (-4, 7, 12), (3, -8, 1)]
+        slots = [4, 0, 2, 1, 3]
+        vertices = np.zeros((5 * tile_rows, 2), dtype=np.float32)
+        tex_coords = np.zeros((5 * tile_rows, 2), dtype=np.float32)
+        calc.calc_tile_coordinates(vertices, tex_coords, slots, [t[0] for t in tiles], [t[1] for t in tiles], [t[2] for t in tiles],
+                                   stride, tessellation_level=tess)
+        for slot, (tiy, tix, ttile) in zip(slots, tiles):
+            factor_rez, offset_rez = calc.calc_tile_fraction(tiy, tix, stride)
+            rows = slice(slot * tile_rows, (slot + 1) * tile_rows)
+            np.testing.assert_allclose(vertices[rows], calc.calc_vertex_coordinates(tiy, tix, stride[0], stride[1], factor_rez, offset_rez, tessellation_level=tess))
+            np.testing.assert_allclose(tex_coords[rows], calc.calc_texture_coordinates(ttile, factor_rez, offset_rez, tessellation_level=tess))
+        shifted = np.zeros((tile_rows, 2), dtype=np.float32)
+        calc.calc_tile_coordinates(shifted, np.zeros_like(shifted), [0], [0], [0], [31], stride, tessellation_level=tess, x_shift=2000e3)
+        # float32 vertices: within a meter
+        np.testing.assert_allclose(shifted[:, 0] - 2000e3, vertices[2 * tile_rows:3 * tile_rows, 0], atol=1.)
+
+
+    def test_half_float(self):
+        data = np.array([[np.nan, 0.5, 99.], [-1e6, 1e6, 3.]], dtype=np.float32)
+        lo, hi = finite_range(data)
+        self.assertEqual((lo, hi), (-1e6, 1e6))
+        self.assertTrue(np.isnan(finite_range(np.full((2, 2), np.nan, dtype=np.float32))[0]))
+        half = to_half_float(data)
+        self.assertEqual(half.dtype, np.float16)
+        self.assertTrue(np.isnan(half[0, 0]))
+        self.assertEqual((half[1, 0], half[1, 1]), (-HALF_FLOAT_MAX, HALF_FLOAT_MAX))
+        # reflectances fit, brightness temperatures need float32 to keep enough steps, as do huge ranges
+        self.assertTrue(half_float_fits(0., 100.))
+        self.assertFalse(half_float_fits(200., 330.))
+        self.assertFalse(half_float_fits(lo, hi))
+        self.assertFalse(half_float_fits(np.nan, np.nan))
+
+
 def main():
     parser = argparse.ArgumentParser(
         description="PURPOSE",
@@ -258,6 +258,7 @@ class LayerStackTreeViewModel(QAbstractItemModel):
         doc.didChangeLayerName.connect(self.refresh)
         doc.didAddBasicLayer.connect(self.doc_added_basic_layer)
         doc.didAddCompositeLayer.connect(self.refresh)
+        doc.didAddCompositeLayers.connect(self.refresh)
         doc.willPurgeLayer.connect(self.refresh)
         doc.didSwitchLayerSet.connect(self.refresh)
         doc.didReorderAnimation.connect(self.refresh)
@@ -70,6 +70,7 @@ import numpy as np
 from weakref import ref
 
 from sift.common import KIND, INFO, prez
+from sift.workspace.matrix import DataAdjacencyMatrix
 from PyQt4.QtCore import QObject, pyqtSignal
 
 
@@ -260,10 +261,12 @@ class Document(QObject):  # base class is rightmost, mixins left of that
     _workspace = None
     _layer_sets = None  # list(DocLayerSet(prez, ...) or None)
     _layer_with_uuid = None  # dict(uuid:Doc____Layer)
+    _matrix = None  # DataAdjacencyMatrix of layers with a scheduled time, for sibling and next/last lookups
 
     # signals
     didAddBasicLayer = pyqtSignal(tuple, UUID, prez)  # new order list with None for new layer; info-dictionary, overview-content-ndarray
     didAddCompositeLayer = pyqtSignal(tuple, UUID, prez)  # comp layer is derived from multiple basic layers and has its own UUID
+    didAddCompositeLayers = pyqtSignal(tuple, list)  # new order, [(UUID, prez), ...] for a batch of RGB or algebraic layers in animation order
     didRemoveLayers = pyqtSignal(tuple, list, int, int)  # new order, UUIDs that were removed from current layer set, first row removed, num rows removed
     willPurgeLayer = pyqtSignal(UUID)  # UUID of the layer being removed
     didReorderLayers = pyqtSignal(tuple)  # list of original indices in their new order, None for new layers
@@ -284,6 +287,7 @@ class Document(QObject):  # base class is rightmost, mixins left of that
         self._workspace = workspace
         self._layer_sets = [DocLayerStack(self)] + [None] * (layer_set_count - 1)
         self._layer_with_uuid = {}
+        self._matrix = DataAdjacencyMatrix()
         self.available_projections = OrderedDict((
             ('Mercator', {
                 'proj4_str': '+proj=merc +datum=WGS84 +ellps=WGS84 +over',
@@ -332,6 +336,7 @@ class Document(QObject):  # base class is rightmost, mixins left of that
         self.default_projection = 'LCC (CONUS)'
         self.current_projection = self.default_projection
         # TODO: connect signals from workspace to slots including update_dataset_info
+        workspace.didDiscoverExternalDataset.connect(self.add_discovered_frame)
 
     def projection_info(self, projection_name=None):
         return self.available_projections[projection_name or self.current_projection]
@@ -428,12 +433,34 @@ class Document(QObject):  # base class is rightmost, mixins left of that
         if INFO.UNIT_CONVERSION not in dataset:
             dataset[INFO.UNIT_CONVERSION] = units_conversion(dataset)
         presentation, reordered_indices = self._insert_layer_with_info(dataset, insert_before=insert_before)
+        self._matrix.add([dataset])
 
         # signal updates from the document
         self.didAddBasicLayer.emit(reordered_indices, dataset.uuid, presentation)
 
         return uuid, dataset, active_content_data
 
+    def add_discovered_frame(self, info):
+        """
+        a product arrived in a watched directory and was imported by the workspace
+        if it continues the current animation loop, add it as a layer and extend the loop with it
+        :param info: product info dictionary from Workspace.didDiscoverExternalDataset
+        """
+        uuid = info[INFO.UUID]
+        anim = [u for u in self.current_animation_order if u in self._layer_with_uuid]
+        if uuid in self._layer_with_uuid or not anim:
+            return
+        keys = (INFO.SHORT_NAME, INFO.SCENE, INFO.INSTRUMENT, INFO.PLATFORM, INFO.KIND)
+        if not all(all(self._layer_with_uuid[u].get(k) == info.get(k) for k in keys) for u in anim):
+            LOG.debug('discovered product {} does not belong to the current animation loop'.format(uuid))
+            return
+        self.activate_product_uuid_as_new_layer(uuid)
+        keep = set(anim) | {uuid}
+        new_anim_uuids = [u for u in self.time_siblings(uuid)[0] if u in keep]
+        LOG.info('adding discovered frame {} to animation loop'.format(uuid))
+        self.current_layer_set.animation_order = new_anim_uuids
+        self.didReorderAnimation.emit(tuple(new_anim_uuids))
+
     def open_files(self, paths, insert_before=0):
         """
         sort paths into preferred load order
@@ -786,6 +813,14 @@ class Document(QObject):  # base class is rightmost, mixins left of that
         :param bandwise: True if we want to change by band instead of time
         :return: UUID of new focus layer
         """
+        if uuid in self._matrix:
+            new_focus = self._matrix.neighbor(uuid, delta, bandwise=bandwise)
+            sibs = (self._matrix.channel_siblings if bandwise else self._matrix.time_siblings)(uuid)[0]
+            sibs.remove(new_focus)
+            if sibs:
+                self.toggle_layer_visibility(sibs, False)
+            self.toggle_layer_visibility(new_focus, True)
+            return new_focus
         if bandwise:  # next or last band
             consult_guide = self.channel_siblings
         else:
@@ -902,7 +937,14 @@ class Document(QObject):  # base class is rightmost, mixins left of that
         uuids = self.time_siblings(uuid)[0]
         return self.change_gamma_for_layers_where(gamma, uuids=uuids)
 
-    def create_algebraic_composite(self, operations, namespace, info=None, insert_before=0):
+    def create_algebraic_composite(self, operations, namespace, info=None, insert_before=0, resolution='finest'):
+        """
+        create algebraic layers for every time step at which all the namespace inputs are available
+        time steps which already have a layer of this name and expression are skipped
+        the layers are added in one batch and calculated together in the background; when there is more than one they become the animation loop
+        :param resolution: 'finest' to replicate coarser inputs up to the finest grid, 'coarsest' to downsample finer inputs
+        :return: list of (sched_time, uuid) for the new layers
+        """
         if info is None:
             info = {}
 
@@ -913,14 +955,25 @@ class Document(QObject):  # base class is rightmost, mixins left of that
             sname = self[u][INFO.SHORT_NAME]
             short_name_to_ns_name.setdefault(sname, []).append(k)
 
+        # a reused name with a new expression still gets its layers
+        existing_times = set(layer.get(INFO.SCHED_TIME) for layer in self._layer_with_uuid.values()
+                             if info.get(INFO.SHORT_NAME) is not None
+                             and layer.get(INFO.SHORT_NAME) == info[INFO.SHORT_NAME]
+                             and layer.get(INFO.KIND) == KIND.COMPOSITE
+                             and self.get_algebraic_namespace(layer.uuid)[1] == operations)
+
         namespace_siblings = {k: self.time_siblings(u)[0] for k, u in namespace.items()}
         # go out of our way to make sure we make as many sibling layers as possible
         # even if one or more time steps are missing
         # NOTE: This does not handle if one product has a missing step and
         # another has a different missing time step
         time_master = max(namespace_siblings.values(), key=lambda v: len(v))
+        old_layer_count = len(self.current_layer_set)
+        created, presentations = [], {}
         for idx in range(len(time_master)):
             t = self[time_master[idx]][INFO.SCHED_TIME]
+            if t in existing_times:
+                continue
             channel_siblings = [(self[u][INFO.SHORT_NAME], u) for u in self.channel_siblings(time_master[idx])[0]]
             temp_namespace = {}
             for sn, u in channel_siblings:
@@ -934,12 +987,66 @@ class Document(QObject):  # base class is rightmost, mixins left of that
                 continue
             LOG.info("Creating algebraic layer '{}' for time {:%Y-%m-%d %H:%M:%S}".format(info.get(INFO.SHORT_NAME), self[time_master[idx]].get(INFO.SCHED_TIME)))
 
-            uuid, layer_info, data = self._workspace.create_algebraic_composite(operations, temp_namespace, info.copy())
+            uuid, layer_info, data = self._workspace.create_algebraic_composite(operations, temp_namespace, info.copy(), resolution=resolution)
+            if uuid in self._layer_with_uuid:
+                LOG.info("equivalent algebraic layer {} is already loaded".format(layer_info.get(INFO.DISPLAY_NAME)))
+                layer = self._layer_with_uuid[uuid]
+                if layer.get(INFO.SHORT_NAME) != layer_info.get(INFO.SHORT_NAME):
+                    # the workspace relabeled the product for this request
+                    layer.update_definitive(layer_info)
+                    self.didChangeLayerName.emit(uuid, layer[INFO.DISPLAY_NAME])
+                continue
             self._layer_with_uuid[uuid] = dataset = DocBasicLayer(self, layer_info)
-            presentation, reordered_indices = self._insert_layer_with_info(dataset, insert_before=insert_before)
+            presentations[uuid], _ = self._insert_layer_with_info(dataset, insert_before=insert_before)
             if INFO.UNIT_CONVERSION not in dataset:
                 dataset[INFO.UNIT_CONVERSION] = units_conversion(dataset)
-            self.didAddCompositeLayer.emit(reordered_indices, dataset.uuid, presentation)
+            created.append((t, uuid))
+
+        if not created:
+            return created
+        # register the whole loop in one update, in animation order
+        added = [(uu, presentations[uu]) for _, uu in sorted(created)]
+        self._matrix.add([self._layer_with_uuid[uu] for uu, _ in added])
+        # new layers are inserted at the top
+        reordered_indices = tuple([None] * len(added) + list(range(old_layer_count)))
+        self.didAddCompositeLayers.emit(reordered_indices, added)
+        # shown immediately by on-demand evaluation, written to the workspace cache in the background
+        self._workspace.materialize_algebraic_batch([uuid for _, uuid in created])
+        if len(created) > 1:
+            new_anim_order = tuple(uu for _, uu in sorted(created))
+            self.current_layer_set.animation_order = new_anim_order
+            self.didReorderAnimation.emit(new_anim_order)
+        return created
+
+    def loop_algebraic_layers_following(self, uuid: UUID):
+        """
+        apply the recipe (expression and band mapping) of an algebraic layer to every loaded time step
+        and make the resulting layers, together with the original, the animation loop
+        :param uuid: algebraic layer to follow
+        :return: animation order, or None if the layer is not algebraic
+        """
+        namespace, operations = self.get_algebraic_namespace(uuid)
+        if not operations:
+            LOG.warning('loop_algebraic_layers_following can only operate on algebraic layers')
+            return None
+        master = self._layer_with_uuid[uuid]
+        if any(u not in self._layer_with_uuid for u in namespace.values()):
+            LOG.warning('inputs of algebraic layer {} are no longer loaded'.format(master.get(INFO.DISPLAY_NAME)))
+            return None
+        info = {INFO.SHORT_NAME: master[INFO.SHORT_NAME]}
+        for k in (INFO.DATASET_NAME, INFO.UNITS):
+            if k in master:
+                info[k] = master[k]
+        created = self.create_algebraic_composite(operations, namespace, info=info)
+        # include layers from earlier loops or manual creation of the same recipe
+        sequence = [(layer.get(INFO.SCHED_TIME), layer.uuid) for layer in self._layer_with_uuid.values()
+                    if layer.get(INFO.SHORT_NAME) == master[INFO.SHORT_NAME] and layer.get(INFO.KIND) == KIND.COMPOSITE
+                    and layer.get(INFO.SCHED_TIME) is not None and self.get_algebraic_namespace(layer.uuid)[1] == operations]
+        new_anim_order = tuple(uu for _, uu in sorted(sequence))
+        self.current_layer_set.animation_order = new_anim_order
+        self.didReorderAnimation.emit(new_anim_order)
+        LOG.info('algebraic loop of {} layers, {} new'.format(len(new_anim_order), len(created)))
+        return new_anim_order
 
     def create_rgb_composite(self, r=None, g=None, b=None, clim=None, all_timesteps=True):
         """
@@ -956,6 +1063,7 @@ class Document(QObject):  # base class is rightmost, mixins left of that
 
         self._layer_with_uuid[uuid] = ds_info = DocRGBLayer(self, ds_info)
         ds_info.update_metadata_from_dependencies()
+        self._matrix.add([ds_info])
         presentation, reordered_indices = self._insert_layer_with_info(ds_info)
 
         LOG.info('generating incomplete (invalid) composite for user to configure')
@@ -983,6 +1091,45 @@ class Document(QObject):  # base class is rightmost, mixins left of that
         # FUTURE: register with workspace so that it can persist info to disk if needed
         return ds_info
 
+    def create_rgb_composites(self, trios, clim=None):
+        """
+        bulk version of create_rgb_composite used to build loops
+        every layer is built and inserted before a single didAddCompositeLayers signal,
+        so the scenegraph can create all the visuals and schedule their tiles together
+        :param trios: sequence of (r, g, b) component UUIDs or layers, any of which may be None, in animation order
+        :param clim: presentation color limits for all the new layers, else their components' defaults
+        :return: list of new DocRGBLayer
+        """
+        from uuid import uuid1 as uuidgen
+        old_layer_count = len(self.current_layer_set)
+        added, components = [], []
+        for trio in trios:
+            layer = DocRGBLayer(self, {INFO.UUID: uuidgen(), INFO.KIND: KIND.RGB})
+            for color, lyr in zip('rgb', trio):
+                if lyr is None:
+                    continue
+                lyr = self[lyr] if isinstance(lyr, UUID) else lyr
+                setattr(layer, color, lyr)
+                components.append(lyr.uuid)
+            layer.update_metadata_from_dependencies()
+            self._layer_with_uuid[layer.uuid] = layer
+            presentation, _ = self._insert_layer_with_info(layer)
+            if clim is not None:
+                presentation = presentation._replace(climits=clim)
+                self.current_layer_set[self.current_layer_set.index(layer.uuid)] = presentation
+            added.append((layer.uuid, presentation))
+        if not added:
+            return []
+        layers = [self._layer_with_uuid[uuid] for uuid, _ in added]
+        self._matrix.add(layers)
+        # new layers are inserted at the top, in reverse of the order given
+        reordered_indices = tuple([None] * len(added) + list(range(old_layer_count)))
+        LOG.info('adding {} RGB layers in one batch'.format(len(added)))
+        self.didAddCompositeLayers.emit(reordered_indices, added)
+        if components:
+            self.toggle_layer_visibility(set(components), False)
+        return layers
+
     def change_rgb_component_layer(self, layer:DocRGBLayer, propagate_to_siblings=True, **rgba):
         """
         change the layer composition for an RGB layer, and signal
@@ -1015,6 +1162,7 @@ class Document(QObject):  # base class is rightmost, mixins left of that
         # These clims are the current state of the default clims for each sub-layer
         layer[INFO.CLIM] = tuple(clims)
         updated = layer.update_metadata_from_dependencies()
+        self._matrix.update([layer])
         LOG.info('updated metadata for layer %s: %s' % (layer.uuid, repr(list(updated.keys()))))
         # These clims are the presentation versions
         prez_clims = tuple(cl if cl is not None else layer[INFO.CLIM][idx] for idx, cl in enumerate(prez_clims))
@@ -1055,6 +1203,24 @@ class Document(QObject):  # base class is rightmost, mixins left of that
         for x in [q for q in self._layer_with_uuid.values() if q.kind in kind]:
             yield x.uuid, (x.platform, x.instrument, x.sched_time, x.band)
 
+    def _building_blocks(self, platform, instrument, bands, kind=(KIND.IMAGE, KIND.COMPOSITE)):
+        """
+        directory of loaded layers which could be used as RGB components, found with a metadatabase query
+        :param bands: band numbers of interest
+        :return: {(platform, instrument, sched_time, band): uuid}
+        """
+        bands = [b for b in bands if b is not None]
+        if not bands:
+            return {}
+        zult = {}
+        for uuid in self._workspace.product_uuids_where(match={INFO.PLATFORM: platform, INFO.INSTRUMENT: instrument},
+                                                        bands=bands):
+            x = self._layer_with_uuid.get(uuid)
+            if x is None or x.kind not in kind:
+                continue
+            zult[(x.platform, x.instrument, x.sched_time, x.band)] = uuid
+        return zult
+
     def _rgb_layer_siblings_uuids(self, master_layer:DocRGBLayer):
         """
         given an RGB layer, find all the other layers with similar instrument-band selection
@@ -1087,8 +1253,8 @@ class Document(QObject):  # base class is rightmost, mixins left of that
         """
         # FUTURE: consolidate/promote commonalities with loop_rgb_layers_following
         # build a directory of image layers to draw from
-        building_blocks = dict((key,uuid) for (uuid,key) in self._directory_of_layers(kind=[KIND.IMAGE, KIND.COMPOSITE]))
         plat, inst, band = master_layer.platform, master_layer.instrument, master_layer.band
+        building_blocks = self._building_blocks(plat, inst, band)
         did_change = []
         for sibling in sibling_layers:
             if isinstance(sibling, UUID):
@@ -1130,23 +1296,26 @@ class Document(QObject):  # base class is rightmost, mixins left of that
             LOG.warning("cannot identify schedule time of master")
             return
 
+        rband, gband, bband = master.band[:3]
+        plat, inst, sched_time = master.platform, master.instrument, master.sched_time
+
         # build a directory of image layers to draw from
-        building_blocks = dict((key,uuid) for (uuid,key) in self._directory_of_layers(kind=[KIND.IMAGE, KIND.COMPOSITE]))
+        building_blocks = self._building_blocks(plat, inst, (rband, gband, bband))
+
+        # build a directory of RGB layers we already have
+        already_have = dict((key,uuid) for (uuid,key) in self._directory_of_layers(kind=KIND.RGB))
 
-        # find the list of loaded timesteps
-        loaded_timesteps = set(x.sched_time for x in self._layer_with_uuid.values())
+        # find the list of loaded timesteps which could contribute to the loop
+        loaded_timesteps = set(key[2] for key in building_blocks.keys())
+        loaded_timesteps |= set(key[2] for key in already_have.keys() if key[:2] == (plat, inst) and key[3] == master.band)
         loaded_timesteps = list(sorted(loaded_timesteps, reverse=True))  # build in last-to-first order to get proper layer list order
         LOG.debug('time steps available: %s' % repr(loaded_timesteps))
 
         # animation sequence we're going to use
         sequence = [(master.sched_time, master.uuid)]
 
-        # build a directory of RGB layers we already have
-        already_have = dict((key,uuid) for (uuid,key) in self._directory_of_layers(kind=KIND.RGB))
         to_build, to_make_invisible = [], []
         # figure out what layers we can build matching pattern, using building blocks
-        rband, gband, bband = master.band[:3]
-        plat, inst, sched_time = master.platform, master.instrument, master.sched_time
         for step in loaded_timesteps:
             if step==sched_time:
                 continue
@@ -1167,12 +1336,13 @@ class Document(QObject):  # base class is rightmost, mixins left of that
                 LOG.info("no complete RGB could be made for %s" % step)
 
         # build new RGB layers
-        if create_additional_layers:
+        if create_additional_layers and to_build:
             LOG.info('creating %d additional RGB layers from loaded image layers' % len(to_build))
-            for (when,r,g,b) in to_build:
-                # rl,gl,bl = self._layer_with_uuid[r], self._layer_with_uuid[g], self._layer_with_uuid[b]
-                new_layer = self.create_rgb_composite(r, g, b)
-                sequence.append((when, new_layer.uuid))
+            to_build.sort(key=lambda step: step[0])  # first animation frame first, so its tiles are scheduled first
+            clim = self.prez_for_uuid(master.uuid).climits if force_color_limits else None
+            new_layers = self.create_rgb_composites([(r, g, b) for (_, r, g, b) in to_build], clim=clim)
+            sequence.extend((when, new_layer.uuid) for (when, _, _, _), new_layer in zip(to_build, new_layers))
+            to_make_invisible = []  # create_rgb_composites already hid the components
 
         if force_color_limits:
             pinfo = self.prez_for_uuid(master.uuid)
@@ -1216,6 +1386,8 @@ class Document(QObject):  # base class is rightmost, mixins left of that
         layer = self._layer_with_uuid[uuid]
         if isinstance(layer, DocRGBLayer):
             return self.loop_rgb_layers_following(layer.uuid)
+        if layer.get(INFO.KIND) == KIND.COMPOSITE and self.get_algebraic_namespace(uuid)[1]:
+            return self.loop_algebraic_layers_following(uuid)
         new_anim_uuids, _ = self.time_siblings(uuid)
         if new_anim_uuids is None or len(new_anim_uuids)<2:
             LOG.info('no time siblings to chosen band, will try channel siblings to chosen time')
@@ -1353,7 +1525,9 @@ class Document(QObject):  # base class is rightmost, mixins left of that
                 self.willPurgeLayer.emit(uuid)
                 # remove from our bookkeeping
                 del self._layer_with_uuid[uuid]
+                self._matrix.remove([uuid])
                 # remove from workspace
+                self._workspace.cancel_materialize_algebraic(uuid)
                 self._workspace.remove(uuid)
 
     def channel_siblings(self, uuid, sibling_infos=None):
@@ -1364,13 +1538,20 @@ class Document(QObject):  # base class is rightmost, mixins left of that
         :param sibling_infos: dictionary of UUID -> Dataset Info to sort through
         :return: sorted list of sibling uuids in channel order
         """
-        if sibling_infos is None:
-            sibling_infos = self._layer_with_uuid
-        it = sibling_infos.get(uuid, None)
-        if it is None:
-            return None
-        sibs = [(x[INFO.SHORT_NAME], x[INFO.UUID]) for x in
-                self._filter(sibling_infos.values(), it, {INFO.SCENE, INFO.SCHED_TIME, INFO.INSTRUMENT, INFO.PLATFORM})]
+        keys = {INFO.SCENE, INFO.SCHED_TIME, INFO.INSTRUMENT, INFO.PLATFORM}
+        if sibling_infos is not None:
+            it = sibling_infos.get(uuid, None)
+            if it is None:
+                return None
+            candidates = self._filter(sibling_infos.values(), it, keys)
+        elif uuid in self._matrix:
+            return self._matrix.channel_siblings(uuid)
+        else:
+            it = self._layer_with_uuid.get(uuid, None)
+            if it is None:
+                return None
+            candidates = self._siblings_from_workspace(it, keys, order_by=(INFO.SHORT_NAME,))
+        sibs = [(x[INFO.SHORT_NAME], x[INFO.UUID]) for x in candidates]
         # then sort it by bands
         sibs.sort()
         offset = [i for i, x in enumerate(sibs) if x[1] == uuid]
@@ -1388,6 +1569,23 @@ class Document(QObject):  # base class is rightmost, mixins left of that
             if not fail:
                 yield md
 
+    def _siblings_from_workspace(self, reference, keys, order_by):
+        """
+        find loaded layers matching reference on keys, using the workspace metadatabase's indexed columns
+        keys which are not indexed, and document-only layers such as RGBs, are filtered here
+        :param reference: layer we're finding siblings for
+        :param keys: INFO keys which have to match
+        :param order_by: INFO keys for the database to sort on
+        :return: generator of matching layers
+        """
+        indexed = set(keys) & self._workspace.queryable_info_keys
+        match = dict((k, reference.get(k, None)) for k in indexed)
+        uuids = self._workspace.product_uuids_where(match=match, order_by=order_by)
+        candidates = [self._layer_with_uuid[u] for u in uuids if u in self._layer_with_uuid]
+        # document-only layers are not in the metadatabase
+        candidates += [x for x in self._layer_with_uuid.values() if x.kind == KIND.RGB]
+        return self._filter(candidates, reference, keys)
+
     def time_siblings(self, uuid, sibling_infos=None):
         """
         return time-ordered list of datasets which have the same band, in time order
@@ -1395,13 +1593,20 @@ class Document(QObject):  # base class is rightmost, mixins left of that
         :param sibling_infos: dictionary of UUID -> Dataset Info to sort through
         :return: sorted list of sibling uuids in time order, index of where uuid is in the list
         """
-        if sibling_infos is None:
-            sibling_infos = self._layer_with_uuid
-        it = sibling_infos.get(uuid, None)
-        if it is None:
-            return [], 0
-        sibs = [(x[INFO.SCHED_TIME], x[INFO.UUID]) for x in
-                self._filter(sibling_infos.values(), it, {INFO.SHORT_NAME, INFO.STANDARD_NAME, INFO.SCENE, INFO.INSTRUMENT, INFO.PLATFORM, INFO.KIND})]
+        keys = {INFO.SHORT_NAME, INFO.STANDARD_NAME, INFO.SCENE, INFO.INSTRUMENT, INFO.PLATFORM, INFO.KIND}
+        if sibling_infos is not None:
+            it = sibling_infos.get(uuid, None)
+            if it is None:
+                return [], 0
+            candidates = self._filter(sibling_infos.values(), it, keys)
+        elif uuid in self._matrix:
+            return self._matrix.time_siblings(uuid)
+        else:
+            it = self._layer_with_uuid.get(uuid, None)
+            if it is None:
+                return [], 0
+            candidates = self._siblings_from_workspace(it, keys, order_by=(INFO.SCHED_TIME,))
+        sibs = [(x[INFO.SCHED_TIME], x[INFO.UUID]) for x in candidates]
         # then sort it into time order
         sibs.sort()
         offset = [i for i,x in enumerate(sibs) if x[1]==uuid]
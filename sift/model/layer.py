@@ -59,6 +59,13 @@ class DocLayer(ChainMap):
         self._user_modified = {}
         super(DocLayer, self).__init__(self._user_modified, self._additional, self._definitive)
 
+    def update_definitive(self, info):
+        """
+        replace the information provided by the workspace, e.g. after it relabeled the product
+        """
+        self._definitive = info
+        self.maps[-1] = info
+
     @property
     def parent(self):
         """
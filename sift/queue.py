@@ -24,6 +24,7 @@ __docformat__ = 'reStructuredText'
 
 import os, sys
 import logging, unittest, argparse
+import threading
 from PyQt4.QtCore import QObject, pyqtSignal, QThread
 
 LOG = logging.getLogger(__name__)
@@ -39,6 +40,8 @@ TheQueue = None
 class Worker(QThread):
     """
     Worker thread use by TaskQueue
+    Tasks are keyed; adding a task with replace=True replaces any queued task with the same key,
+    and a running task with that key is cancelled at its next status yield
     """
     queue = None
     depth = 0
@@ -47,16 +50,44 @@ class Worker(QThread):
 
     def __init__(self, myid:int):
         super(Worker, self).__init__()
-        self.queue = []
+        self.queue = []  # [(key, task_iterable), ...]
         self.depth = 0
         self.id = myid
-
-    def add(self, key, task_iterable):
-        # FUTURE: replace queued task if key matches
-        self.queue.append(task_iterable)
-        self.depth += 1
+        self.current_key = None
+        self._cancel_key = None
+        self._lock = threading.Lock()
+        # a task added while run() is returning would otherwise wait for the next add
+        self.finished.connect(self._restart_if_pending)
+
+    def add(self, key, task_iterable, replace=False):
+        with self._lock:
+            if replace:
+                self._cancel(key)
+            self.queue.append((key, task_iterable))
+            self.depth += 1
         self.start()
 
+    def _cancel(self, key):
+        if key is None:
+            return
+        for queued in [q for q in self.queue if q[0] == key]:
+            self.queue.remove(queued)
+            self.depth -= 1
+            _close_task(queued[1])
+        if self.current_key == key:
+            self._cancel_key = key
+
+    def cancel(self, key):
+        """
+        drop queued tasks with this key, and stop the running one at its next yield
+        """
+        with self._lock:
+            self._cancel(key)
+
+    def _restart_if_pending(self):
+        if self.queue:
+            self.start()
+
     def _did_progress(self, task_status):
         """
         Summarize the task queue, including progress, and send it out as a signal
@@ -68,11 +99,20 @@ class Worker(QThread):
         self.workerDidMakeProgress.emit(self.id, info)
 
     def run(self):
-        while len(self.queue)>0:
-            task = self.queue.pop(0)
+        while True:
+            with self._lock:
+                if not self.queue:
+                    self.current_key = None
+                    break
+                key, task = self.queue.pop(0)
+                self.current_key, self._cancel_key = key, None
             try:
                 for status in task:
                     self._did_progress(status)
+                    if self._cancel_key is not None and self._cancel_key == key:
+                        LOG.debug('task {} superseded, cancelling'.format(key))
+                        _close_task(task)
+                        break
             except Exception:
                 LOG.error("Background task failed")
                 LOG.debug("Background task exception: ", exc_info=True)
@@ -80,6 +120,18 @@ class Worker(QThread):
         self._did_progress(None)
 
 
+def _close_task(task):
+    """
+    let a generator task clean up (its finally clauses run) rather than leaving it suspended
+    """
+    close = getattr(task, 'close', None)
+    if close is not None:
+        try:
+            close()
+        except Exception:
+            LOG.debug("Background task failed to close: ", exc_info=True)
+
+
 class TaskQueue(QObject):
     """
     Global background task queue for loading, rendering, et cetera.
@@ -121,7 +173,7 @@ class TaskQueue(QObject):
     def remaining(self):
         return sum([len(x.queue) for x in self.workers])
 
-    def add(self, key, task_iterable, description, interactive=False, use_process_pool=False, use_thread_pool=False):
+    def add(self, key, task_iterable, description, interactive=False, use_process_pool=False, use_thread_pool=False, replace=False):
         """
         Add an iterable task which will yield progress information dictionaries.
 
@@ -131,8 +183,10 @@ class TaskQueue(QObject):
                 update_display(status_info)
             pop_display(final_status_info)
 
-        :param key: unique key for task; queuing the same key will result in the old task being removed and the new one deferred to the end
+        :param key: unique key for task
         :param task_iterable: callable resulting in an iterable, or an iterable itself to be run on the background
+        :param replace: only the latest task for this key is worth running, e.g. a retile for the newest view of a layer;
+                        queued tasks with the key are dropped and a running one is closed at its next progress yield
         :return:
         """
         if interactive:
@@ -141,7 +195,18 @@ class TaskQueue(QObject):
             self._interactive_round_robin %= 2
         else:
             wdex = 2
-        self.workers[wdex].add(key, task_iterable)
+        if replace:
+            self.cancel(key)
+        self.workers[wdex].add(key, task_iterable, replace=replace)
+
+    def cancel(self, key):
+        """
+        Drop any queued task with this key and stop a running one at its next progress yield.
+        """
+        if key is None:
+            return
+        for worker in self.workers:
+            worker.cancel(key)
 
     def _did_progress(self, worker_id, worker_status):
         """
@@ -25,9 +25,9 @@ except AttributeError:
 class Ui_create_algebraic_dialog(object):
     def setupUi(self, create_algebraic_dialog):
         create_algebraic_dialog.setObjectName(_fromUtf8("create_algebraic_dialog"))
-        create_algebraic_dialog.resize(369, 306)
+        create_algebraic_dialog.resize(369, 330)
         self.buttons = QtGui.QDialogButtonBox(create_algebraic_dialog)
-        self.buttons.setGeometry(QtCore.QRect(10, 270, 351, 32))
+        self.buttons.setGeometry(QtCore.QRect(10, 294, 351, 32))
         self.buttons.setOrientation(QtCore.Qt.Horizontal)
         self.buttons.setStandardButtons(QtGui.QDialogButtonBox.Cancel|QtGui.QDialogButtonBox.Ok)
         self.buttons.setObjectName(_fromUtf8("buttons"))
@@ -36,6 +36,9 @@ class Ui_create_algebraic_dialog(object):
         self.operations_text.setLineWidth(2)
         self.operations_text.setMidLineWidth(1)
         self.operations_text.setObjectName(_fromUtf8("operations_text"))
+        self.coarsest_check = QtGui.QCheckBox(create_algebraic_dialog)
+        self.coarsest_check.setGeometry(QtCore.QRect(10, 264, 351, 22))
+        self.coarsest_check.setObjectName(_fromUtf8("coarsest_check"))
         self.formLayoutWidget = QtGui.QWidget(create_algebraic_dialog)
         self.formLayoutWidget.setGeometry(QtCore.QRect(10, 10, 351, 143))
         self.formLayoutWidget.setObjectName(_fromUtf8("formLayoutWidget"))
@@ -94,6 +97,8 @@ class Ui_create_algebraic_dialog(object):
     def retranslateUi(self, create_algebraic_dialog):
         create_algebraic_dialog.setWindowTitle(_translate("create_algebraic_dialog", "Create Algebraic Layer", None))
         self.operations_text.setPlainText(_translate("create_algebraic_dialog", "result = x - y", None))
+        self.coarsest_check.setToolTip(_translate("create_algebraic_dialog", "Downsample finer inputs instead of replicating coarser ones", None))
+        self.coarsest_check.setText(_translate("create_algebraic_dialog", "Calculate at coarsest input resolution", None))
         self.name_label.setText(_translate("create_algebraic_dialog", "Name:", None))
         self.operation_label.setText(_translate("create_algebraic_dialog", "Operation:", None))
         self.x_label.setText(_translate("create_algebraic_dialog", "x:", None))
@@ -25,6 +25,8 @@ __docformat__ = 'reStructuredText'
 __author__ = 'davidh'
 
 import logging
+import time
+from collections import deque
 import numpy as np
 
 from vispy.scene import PanZoomCamera, BaseCamera
@@ -33,6 +35,13 @@ from vispy.geometry import Rect
 
 LOG = logging.getLogger(__name__)
 
+# camera motion older than this is not used to predict where the view is going
+MOTION_WINDOW = 0.5  # seconds
+MOTION_SAMPLES = 16
+# keep predictions within a couple of views of where we are
+MAX_PREDICTED_PAN = 2.0  # view widths
+MAX_PREDICTED_ZOOM = 4.0
+
 
 class PanZoomProbeCamera(PanZoomCamera):
     """Camera that maps mouse presses to events for probing.
@@ -57,8 +66,29 @@ class PanZoomProbeCamera(PanZoomCamera):
     def __init__(self, *args, **kwargs):
         self._pan_limits = kwargs.pop("pan_limits", None)
         self._zoom_limits = kwargs.pop("zoom_limits", (0.001, 0.001))
+        # recent (time, center, size) of the view rectangle, for predicting motion
+        self._motion = deque(maxlen=MOTION_SAMPLES)
         super(PanZoomProbeCamera, self).__init__(*args, **kwargs)
 
+    def predict_motion(self, lead):
+        """Extrapolate recent panning and zooming `lead` seconds ahead.
+
+        :param lead: seconds to look ahead
+        :return: ((x, y) pan as a fraction of the current view size, zoom factor applied to the view size);
+                 ((0, 0), 1) when the camera is not moving
+        """
+        now = time.monotonic()
+        samples = [m for m in self._motion if now - m[0] <= MOTION_WINDOW]
+        if len(samples) < 2:
+            return (0., 0.), 1.
+        (t0, c0, s0), (t1, c1, s1) = samples[0], samples[-1]
+        dt = t1 - t0
+        if dt <= 0 or not (s0[0] and s1[0] and s1[1]):
+            return (0., 0.), 1.
+        pan = tuple(float(np.clip((c1[i] - c0[i]) / dt * lead / s1[i], -MAX_PREDICTED_PAN, MAX_PREDICTED_PAN)) for i in (0, 1))
+        zoom = float(np.clip((s1[0] / s0[0]) ** (lead / dt), 1. / MAX_PREDICTED_ZOOM, MAX_PREDICTED_ZOOM))
+        return pan, zoom
+
     def _viewbox_set(self, viewbox):
         """ Friend method of viewbox to register itself.
         """
@@ -133,6 +163,7 @@ class PanZoomProbeCamera(PanZoomCamera):
 
         if self._rect != rect:
             self._rect = rect
+            self._motion.append((time.monotonic(), rect.center, (abs(rect.width), abs(rect.height))))
             self.view_changed()
 
     def viewbox_mouse_event(self, event):
@@ -26,6 +26,8 @@ import sys
 import logging
 import unittest
 import argparse
+import threading
+from collections import namedtuple, OrderedDict
 
 import shapefile
 
@@ -52,8 +54,11 @@ from sift.common import (
     calc_pixel_size,
     get_reference_points,
     get_reference_points_image,
+    finite_range,
+    half_float_fits,
+    to_half_float,
     )
-from sift.view.Program import TextureAtlas2D, Texture2D
+from sift.view.Program import TextureAtlas2D, Texture2D, GL_TAKES_HALF_FLOATS
 # The below imports are needed because we subclassed the ImageVisual
 from vispy.visuals.shaders import Function
 from vispy.visuals.transforms import NullTransform
@@ -172,10 +177,11 @@ class TextureTileState(object):
     - ttile: Texture Tile, Tile in the actual GPU texture storage (0 to `num_tiles`)
 
     This class is meant to be used as a bookkeeper/consultant right before taking action
-    on the Texture Atlas.
+    on the Texture Atlas. Retiles running on different threads hold `lock` while they use it.
     """
     def __init__(self, num_tiles):
         self.num_tiles = num_tiles
+        self.lock = threading.RLock()
         self.reset()
 
     def __getitem__(self, item):
@@ -191,32 +197,29 @@ class TextureTileState(object):
     def reset(self):
         self.itile_cache = {}
         self._rev_cache = {}
-        # True if the data doesn't matter, False if data matters
-        self.tile_free = [True] * self.num_tiles
-        self.itile_age = []
+        # texture tiles whose data doesn't matter, lowest index on top
+        self.tile_free = list(range(self.num_tiles - 1, -1, -1))
+        # expiring image tiles, oldest first
+        self.itile_age = OrderedDict()
+        # image tiles given an atlas tile whose data has not been delivered yet: retile that will deliver it
+        self.undelivered = {}
 
     def next_available_tile(self):
-        for idx, tile_free in enumerate(self.tile_free):
-            if tile_free:
-                return idx
+        if self.tile_free:
+            return self.tile_free.pop()
 
         # We don't have any free tiles, remove the oldest one
-        LOG.debug("Expiring image tile from texture atlas: %r", self.itile_age[0])
-        ttile_idx = self.remove_tile(self.itile_age[0])
-        return ttile_idx
+        oldest = next(iter(self.itile_age))
+        LOG.debug("Expiring image tile from texture atlas: %r", oldest)
+        self.remove_tile(oldest)
+        return self.tile_free.pop()
 
     def refresh_age(self, itile_idx):
         """Update the age of an image tile so it is less likely to expire.
         """
-        try:
-            # Remove it from wherever it is
-            self.itile_age.remove(itile_idx)
-        except ValueError:
-            # we haven't heard about this tile, that's ok, we'll add it to the list
-            pass
-
-        # Put it to the end as the "youngest" tile
-        self.itile_age.append(itile_idx)
+        # Put it to the end as the "youngest" tile, wherever it was or if we haven't heard about it
+        self.itile_age[itile_idx] = None
+        self.itile_age.move_to_end(itile_idx)
 
     def add_tile(self, itile_idx, expires=True):
         """Get texture index for new tile. If tile is already known return its current location.
@@ -233,7 +236,6 @@ class TextureTileState(object):
 
         self.itile_cache[itile_idx] = ttile_idx
         self._rev_cache[ttile_idx] = itile_idx
-        self.tile_free[ttile_idx] = False
         if expires:
             self.refresh_age(itile_idx)
         return ttile_idx
@@ -241,10 +243,91 @@ class TextureTileState(object):
     def remove_tile(self, itile_idx):
         ttile_idx = self.itile_cache.pop(itile_idx)
         self._rev_cache.pop(ttile_idx)
-        self.tile_free[ttile_idx] = True
-        self.itile_age.remove(itile_idx)
+        self.tile_free.append(ttile_idx)
+        self.itile_age.pop(itile_idx, None)
+        self.undelivered.pop(itile_idx, None)
         return ttile_idx
 
+    def delivered(self, itile_idx, owner):
+        """The data of a tile planned by owner has been handed over for upload.
+        """
+        if self.undelivered.get(itile_idx) is owner:
+            del self.undelivered[itile_idx]
+
+    def release(self, planned, owner):
+        """Free the atlas tiles of planned tiles that owner never delivered, so a later retile plans them again
+        rather than drawing whatever the atlas tile holds.
+
+        :param planned: [(stride, tiy, tix, tex_tile_idx), ...]
+        """
+        for p in planned:
+            itile = p[:3]
+            if self.undelivered.get(itile) is owner and self.itile_cache.get(itile) == p[3]:
+                self.remove_tile(itile)
+
+
+TileBuffers = namedtuple('TileBuffers', ['stride', 'tile_box', 'ttiles', 'vertices', 'tex_coords'])
+
+
+def build_tile_buffers(calc, texture_state, stride, tile_box, overview=None, pending=(), previous=None):
+    """Vertex and texture coordinates drawing the tiles of a tile box, top to bottom and left to right.
+
+    Tiles laid out in `previous` at the same stride and atlas tile are copied from it rather than recalculated,
+    so a retile after a small pan or another batch of a progressive retile only calculates the tiles that changed.
+    The arrays of `previous` are not modified, they may be in use by the GUI thread.
+
+    :param calc: TileCalculator of the image
+    :param texture_state: TextureTileState saying where each image tile is in the atlas
+    :param overview: (vertex_coordinates, texture_coordinates) of overview tiles to draw after the others
+    :param pending: (stride, tiy, tix) tiles holding an atlas tile whose data has not been delivered yet, not drawn
+    :param previous: TileBuffers returned earlier for the same calc and atlas, or None
+    :return: TileBuffers, ttiles is the atlas tile drawn in each tile slot or -1
+    """
+    tl6 = 6 * TESS_LEVEL * TESS_LEVEL
+    rows, cols = tile_box.b - tile_box.t, tile_box.r - tile_box.l
+    num_tiles = rows * cols
+    num_overview = 0 if overview is None else overview[0].shape[0]
+
+    ttiles = np.full((num_tiles,), -1, dtype=np.int64)
+    for used_tile_idx, (tiy, tix) in enumerate((tiy, tix) for tiy in range(tile_box.t, tile_box.b) for tix in range(tile_box.l, tile_box.r)):
+        itile = (stride, tiy, tix)
+        # atlas too small or data not delivered yet: leave the tile undrawn, the overview shows through
+        if itile in texture_state and itile not in pending:
+            ttiles[used_tile_idx] = texture_state[itile]
+
+    vertices = np.empty((tl6 * num_tiles + num_overview, 2), dtype=np.float32)
+    tex_coords = np.empty((tl6 * num_tiles + num_overview, 2), dtype=np.float32)
+    tile_vertices = vertices[:tl6 * num_tiles].reshape((num_tiles, tl6, 2))
+    tile_tex_coords = tex_coords[:tl6 * num_tiles].reshape((num_tiles, tl6, 2))
+    if overview is not None:
+        # XXX: This completely depends on drawing order, putting it at the end seems to work
+        vertices[tl6 * num_tiles:] = overview[0]
+        tex_coords[tl6 * num_tiles:] = overview[1]
+
+    todo = ttiles >= 0
+    if previous is not None and previous.stride == stride:
+        # copy the part of the tile box both layouts share, then redo whatever moved in the atlas
+        pb = previous.tile_box
+        t, b, l, r = max(tile_box.t, pb.t), min(tile_box.b, pb.b), max(tile_box.l, pb.l), min(tile_box.r, pb.r)
+        if t < b and l < r:
+            prev_shape = (pb.b - pb.t, pb.r - pb.l)
+            prev_num_tiles = prev_shape[0] * prev_shape[1]
+            here = slice(t - tile_box.t, b - tile_box.t), slice(l - tile_box.l, r - tile_box.l)
+            there = slice(t - pb.t, b - pb.t), slice(l - pb.l, r - pb.l)
+            tile_vertices.reshape((rows, cols, tl6, 2))[here] = previous.vertices[:tl6 * prev_num_tiles].reshape(prev_shape + (tl6, 2))[there]
+            tile_tex_coords.reshape((rows, cols, tl6, 2))[here] = previous.tex_coords[:tl6 * prev_num_tiles].reshape(prev_shape + (tl6, 2))[there]
+            same = todo.reshape((rows, cols))[here] & (ttiles.reshape((rows, cols))[here] == previous.ttiles.reshape(prev_shape)[there])
+            todo.reshape((rows, cols))[here] &= ~same
+
+    tile_vertices[ttiles < 0] = 0
+    tile_tex_coords[ttiles < 0] = 0
+    slots = np.flatnonzero(todo)
+    if slots.size:
+        tiys, tixs = np.divmod(slots, cols)
+        calc.calc_tile_coordinates(vertices, tex_coords, slots, tiys + tile_box.t, tixs + tile_box.l, ttiles[slots],
+                                   stride, tessellation_level=TESS_LEVEL)
+    return TileBuffers(stride, tile_box, ttiles, vertices, tex_coords)
+
 
 class TiledGeolocatedImageVisual(ImageVisual):
     def __init__(self, data, origin_x, origin_y, cell_width, cell_height,
@@ -253,7 +336,7 @@ class TiledGeolocatedImageVisual(ImageVisual):
                  texture_shape=(DEFAULT_TEXTURE_HEIGHT, DEFAULT_TEXTURE_WIDTH),
                  wrap_lon=False, projection=DEFAULT_PROJECTION,
                  cmap='viridis', method='tiled', clim='auto', gamma=1.,
-                 interpolation='nearest', **kwargs):
+                 interpolation='nearest', half_float=False, **kwargs):
         if method != 'tiled':
             raise ValueError("Only 'tiled' method is currently supported")
         method = 'subdivide'
@@ -294,6 +377,17 @@ class TiledGeolocatedImageVisual(ImageVisual):
         )
         # What tiles have we used and can we use
         self.texture_state = TextureTileState(self.num_tex_tiles)
+        # last vertex layout built and last coordinates sent to the GPU, so that retiles only redo tiles that changed
+        self._tile_buffers = None
+        self._uploaded_coordinates = None
+        # bumped whenever the atlas is resized, tiles built for an older atlas are dropped
+        self.texture_generation = 0
+        # shared host cache of tiles and the workspace content each channel is taken from, see use_tile_cache
+        self._tile_cache = None
+        self._content_ids = None
+        # float16 atlases if asked for and the data fits
+        self._half_float = half_float
+        self._tile_dtype = self._choose_tile_dtype([data])
 
         # load 'float packed rgba8' interpolation kernel
         # to load float interpolation kernel use
@@ -345,7 +439,7 @@ class TiledGeolocatedImageVisual(ImageVisual):
         self._need_interpolation_update = True
         self._texture = TextureAtlas2D(self.texture_shape, tile_shape=self.tile_shape,
                                        interpolation=texture_interpolation,
-                                       format="LUMINANCE", internalformat="R32F",
+                                       format="LUMINANCE", internalformat=self._internalformat,
                                        )
         self._subdiv_position = VertexBuffer()
         self._subdiv_texcoord = VertexBuffer()
@@ -421,70 +515,207 @@ class TiledGeolocatedImageVisual(ImageVisual):
         # Update kwargs to reflect the new spatial resolution of the overview image
         nfo["cell_width"] = self.cell_width * x_slice.step
         nfo["cell_height"] = self.cell_height * y_slice.step
+        self._upload_overview()
+
+    def _set_overview_data(self, ttile_idx, overview_data):
+        self._texture.set_tile_data(ttile_idx, self._to_tile_dtype(self._normalize_data(overview_data)))
+
+    def _upload_overview(self):
+        """Place the overview in the texture atlas and draw only it until the next retile.
+        """
+        nfo = self.overview_info
+        y_slice, x_slice = self.calc.overview_stride
         # Tell the texture state that we are adding a tile that should never expire and should always exist
         nfo["texture_tile_index"] = ttile_idx = self.texture_state.add_tile((0, 0, 0), expires=False)
-        self._texture.set_tile_data(ttile_idx, self._normalize_data(nfo["data"]))
+        self._set_overview_data(ttile_idx, nfo["data"])
 
         # Handle wrapping around the anti-meridian so there is a -180/180 continuous image
         num_tiles = 1 if not self.wrap_lon else 2
         tl = TESS_LEVEL * TESS_LEVEL
         nfo["texture_coordinates"] = np.empty((6 * num_tiles * tl, 2), dtype=np.float32)
         nfo["vertex_coordinates"] = np.empty((6 * num_tiles * tl, 2), dtype=np.float32)
-        factor_rez, offset_rez = self.calc.calc_tile_fraction(0, 0, pnt(np.int64(y_slice.step), np.int64(x_slice.step)))
-        nfo["texture_coordinates"][:6 * tl, :2] = self.calc.calc_texture_coordinates(ttile_idx, factor_rez, offset_rez, tessellation_level=TESS_LEVEL)
-        nfo["vertex_coordinates"][:6 * tl, :2] = self.calc.calc_vertex_coordinates(0, 0, y_slice.step, x_slice.step, factor_rez, offset_rez, tessellation_level=TESS_LEVEL)
+        stride = (y_slice.step, x_slice.step)
+        self.calc.calc_tile_coordinates(nfo["vertex_coordinates"], nfo["texture_coordinates"], [0], [0], [0], [ttile_idx],
+                                        stride, tessellation_level=TESS_LEVEL)
+        if self.wrap_lon:
+            # the same overview again, one image width east
+            e = self.calc.image_extents_box
+            self.calc.calc_tile_coordinates(nfo["vertex_coordinates"], nfo["texture_coordinates"], [1], [0], [0], [ttile_idx],
+                                            stride, tessellation_level=TESS_LEVEL, x_shift=e.r - e.l)
         self._set_vertex_tiles(nfo["vertex_coordinates"], nfo["texture_coordinates"])
 
+    def _atlases(self):
+        return [self._texture]
+
+    def use_tile_cache(self, tile_cache, content_ids):
+        """Copy tiles out of content through a host tile cache shared with other layers.
+
+        :param tile_cache: HostTileCache
+        :param content_ids: workspace content identifier of each channel, None for a missing channel
+        """
+        self._tile_cache = tile_cache
+        self._content_ids = list(content_ids)
+
+    def _content_stride(self, chn_idx, stride):
+        """stride the channel's data was taken from its content with, for a given tile stride
+        """
+        return stride
+
+    def _channel_data(self, data):
+        """strided content of each channel, from the data given to retile
+        """
+        return [data]
+
+    def _extract_tile(self, chn_idx, data, stride, y_slice, x_slice):
+        content_id = self._content_ids[chn_idx] if self._content_ids is not None else None
+        if self._tile_cache is None or content_id is None:
+            tile = np.array(data[y_slice, x_slice], dtype=np.float32)
+        else:
+            # the cache holds float32 tiles whatever the atlas, so layers can share them
+            tile = self._tile_cache.tile(content_id, self._content_stride(chn_idx, stride), data, y_slice, x_slice)
+        return self._to_tile_dtype(tile)
+
+    def _choose_tile_dtype(self, channels):
+        """half-float (R16F) atlases if half floats were asked for and the overview of every channel fits them, else float32
+        """
+        if not self._half_float:
+            return np.float32
+        for data in channels:
+            if data is None:
+                continue
+            y_slice, x_slice = self.calc.calc_overview_stride(image_shape=data.shape)
+            lo, hi = finite_range(np.asarray(data[y_slice, x_slice], dtype=np.float32))
+            if not half_float_fits(lo, hi):
+                LOG.info("values of '%s' from %r to %r do not fit half floats, using float32 textures", self.name, lo, hi)
+                return np.float32
+        return np.float16
+
+    @property
+    def _internalformat(self):
+        return "R16F" if self._tile_dtype == np.float16 else "R32F"
+
+    def _to_tile_dtype(self, data):
+        """tile data as uploaded: float16 for half-float atlases if GL takes them,
+        otherwise the float32 tile as is, GL stores it in 16 bits without a conversion on either thread
+        """
+        if data is not None and self._tile_dtype == np.float16 and GL_TAKES_HALF_FLOATS:
+            return to_half_float(data)
+        return data
+
+    @property
+    def tile_bytes(self):
+        """texture memory needed for one atlas tile across all of this layer's atlases
+        """
+        return int(self.tile_shape[0]) * int(self.tile_shape[1]) * np.dtype(self._tile_dtype).itemsize * len(self._atlases())
+
+    @property
+    def host_tile_bytes(self):
+        """host memory one image tile takes in the tile cache, which holds float32 tiles of each channel
+        whatever the atlas format
+        """
+        return int(self.tile_shape[0]) * int(self.tile_shape[1]) * 4
+
+    def set_texture_shape(self, texture_shape):
+        """Resize the texture atlas to hold a different number of tiles, keeping only the overview.
+
+        :param texture_shape: (rows, cols) in tiles
+        :return: True if the atlas changed, in which case the layer needs a retile
+        """
+        texture_shape = tuple(texture_shape)
+        if texture_shape == tuple(self.texture_shape):
+            return False
+        LOG.debug("resizing texture atlas of '%s' from %r to %r tiles", self.name, self.texture_shape, texture_shape)
+        self.texture_shape = texture_shape
+        self.num_tex_tiles = texture_shape[0] * texture_shape[1]
+        self.calc.set_texture_shape(texture_shape)
+        self.texture_state = TextureTileState(self.num_tex_tiles)
+        self._tile_buffers = None
+        self.texture_generation += 1
+        for atlas in self._atlases():
+            atlas.set_texture_shape(texture_shape)
+        self._latest_tile_box = None
+        if self.overview_info is not None:
+            self._upload_overview()
+        return True
+
     def _normalize_data(self, data):
         if data is not None and data.dtype == np.float64:
             data = data.astype(np.float32)
 
         return data
 
+    def _normalize_content(self, data):
+        return self._normalize_data(data)
+
+    def _plan_texture_tiles(self, stride, tile_box, owner=None):
+        """Assign atlas tiles to the image tiles of a tile box that are not resident yet.
+
+        Image tiles nearest the center of the box come first in the result. They are given their
+        atlas tiles last so that they are the last to expire if the atlas cannot hold the whole box.
+        Tiles another retile planned but has not delivered yet are planned again, and belong to this one from now on.
+        :param owner: retile delivering the planned tiles, None if they are all delivered at once
+        :return: [(stride, tiy, tix, tex_tile_idx), ...]
+        """
+        cy, cx = (tile_box.t + tile_box.b - 1) / 2., (tile_box.l + tile_box.r - 1) / 2.
+        itiles = sorted(((tiy, tix) for tiy in range(tile_box.t, tile_box.b) for tix in range(tile_box.l, tile_box.r)),
+                        key=lambda t: (t[0] - cy) ** 2 + (t[1] - cx) ** 2)
+        state = self.texture_state
+        with state.lock:
+            planned = []
+            for tiy, tix in reversed(itiles):
+                itile = (stride, tiy, tix)
+                already_in = itile in state and itile not in state.undelivered
+                # Update the age if already in there
+                tex_tile_idx = state.add_tile(itile)
+                if not already_in:
+                    planned.append((stride, tiy, tix, tex_tile_idx))
+            # drop tiles whose atlas tile was taken again by a tile nearer the center
+            planned = [p for p in reversed(planned) if p[:3] in state and state[p[:3]] == p[3]]
+            for p in planned:
+                if owner is None:
+                    state.undelivered.pop(p[:3], None)
+                else:
+                    state.undelivered[p[:3]] = owner
+            return planned
+
+    def _build_texture_tile(self, data, stride, tiy, tix, tex_tile_idx):
+        """Copy the data of one planned tile, safe to run concurrently with other tiles.
+        """
+        # Assume we were given a total image worth of this stride
+        y_slice, x_slice = self.calc.calc_tile_slice(tiy, tix, stride)
+        # force a copy of the data from the content array (provided by the workspace) to a vispy-compatible contiguous float array
+        # this can be a potentially time-expensive operation since content array is often huge and always memory-mapped, so paging may occur
+        # we don't want this paging deferred until we're back in the GUI thread pushing data to OpenGL!
+        tile_data = self._extract_tile(0, data, stride, y_slice, x_slice)
+        return stride, tiy, tix, tex_tile_idx, tile_data
+
     def _build_texture_tiles(self, data, stride, tile_box):
         """Prepare and organize strided data in to individual tiles with associated information.
         """
-        data = self._normalize_data(data)
-
+        data = self._normalize_content(data)
         LOG.debug("Uploading texture data for %d tiles (%r)", (tile_box.b - tile_box.t) * (tile_box.r - tile_box.l), tile_box)
-        # Tiles start at upper-left so go from top to bottom
-        tiles_info = []
-        for tiy in range(tile_box.t, tile_box.b):
-            for tix in range(tile_box.l, tile_box.r):
-                already_in = (stride, tiy, tix) in self.texture_state
-                # Update the age if already in there
-                # Assume that texture_state does not change from the main thread if this is run in another
-                tex_tile_idx = self.texture_state.add_tile((stride, tiy, tix))
-                if already_in:
-                    # FIXME: we should make a list/set of the tiles we need to add before this
-                    continue
-
-                # Assume we were given a total image worth of this stride
-                y_slice, x_slice = self.calc.calc_tile_slice(tiy, tix, stride)
-                # force a copy of the data from the content array (provided by the workspace) to a vispy-compatible contiguous float array
-                # this can be a potentially time-expensive operation since content array is often huge and always memory-mapped, so paging may occur
-                # we don't want this paging deferred until we're back in the GUI thread pushing data to OpenGL!
-                tile_data = np.array(data[y_slice, x_slice], dtype=np.float32)
-                tiles_info.append((stride, tiy, tix, tex_tile_idx, tile_data))
-
-        return tiles_info
+        return [self._build_texture_tile(data, *planned) for planned in self._plan_texture_tiles(stride, tile_box)]
 
     def _set_texture_tiles(self, tiles_info):
         for tile_info in tiles_info:
             stride, tiy, tix, tex_tile_idx, data = tile_info
             self._texture.set_tile_data(tex_tile_idx, data)
 
-    def _build_vertex_tiles(self, preferred_stride, tile_box):
+    def _build_vertex_tiles(self, preferred_stride, tile_box, pending=()):
         """Rebuild the vertex buffers used for rendering the image when using
         the subdivide method.
 
         SIFT Note: Copied from 0.5.0dev original ImageVisual class
+
+        :param pending: (stride, tiy, tix) tiles holding an atlas tile whose data has not been delivered yet, not drawn
         """
         total_num_tiles = (tile_box.b - tile_box.t) * (tile_box.r - tile_box.l)
         total_overview_tiles = 0
+        overview = None
         if self.overview_info is not None:
             # we should be providing an overview image
             total_overview_tiles = int(self.overview_info["vertex_coordinates"].shape[0] / 6 / (TESS_LEVEL * TESS_LEVEL))
+            overview = self.overview_info["vertex_coordinates"], self.overview_info["texture_coordinates"]
 
         if total_num_tiles <= 0:
             # we aren't looking at this image
@@ -493,48 +724,34 @@ class TiledGeolocatedImageVisual(ImageVisual):
         elif total_num_tiles > self.num_tex_tiles - total_overview_tiles:
             LOG.warning("Current view sees more tiles than can be held in the GPU")
             # We continue on because there should be an overview image for any tiles that can't be drawn
-        total_num_tiles += total_overview_tiles
-
-        tex_coords = np.empty((6 * total_num_tiles * (TESS_LEVEL * TESS_LEVEL), 2), dtype=np.float32)
-        vertices = np.empty((6 * total_num_tiles * (TESS_LEVEL * TESS_LEVEL), 2), dtype=np.float32)
-
-        # What tile are we currently describing out of all the tiles being viewed
-        used_tile_idx = -1
-        # Set up the overview tile
-        if self.overview_info is not None:
-            # XXX: This completely depends on drawing order, putting it at the end seems to work
-            tex_coords[-6 * total_overview_tiles * TESS_LEVEL * TESS_LEVEL:, :] = self.overview_info["texture_coordinates"]
-            vertices[-6 * total_overview_tiles * TESS_LEVEL * TESS_LEVEL:, :] = self.overview_info["vertex_coordinates"]
-
-        LOG.debug("Building vertex data for %d tiles (%r)", total_num_tiles, tile_box)
-        tl = TESS_LEVEL * TESS_LEVEL
-        # Tiles start at upper-left so go from top to bottom
-        for tiy in range(tile_box.t, tile_box.b):
-            for tix in range(tile_box.l, tile_box.r):
-                # Update the index here because we have multiple exit/continuation points
-                used_tile_idx += 1
-
-                # Check if the tile we want to draw is actually in the GPU, if not (atlas too small?) fill with zeros and keep going
-                if (preferred_stride, tiy, tix) not in self.texture_state:
-                    # THIS SHOULD NEVER HAPPEN IF TEXTURE BUILDING IS DONE CORRECTLY AND THE ATLAS IS BIG ENOUGH
-                    tex_coords[TESS_LEVEL*TESS_LEVEL*used_tile_idx*6: TESS_LEVEL*TESS_LEVEL*(used_tile_idx+1)*6, :] = 0
-                    vertices[TESS_LEVEL*TESS_LEVEL*used_tile_idx*6: TESS_LEVEL*TESS_LEVEL*(used_tile_idx+1)*6, :] = 0
-                    continue
-
-                # we should have already loaded the texture data in to the GPU so get the index of that texture
-                tex_tile_idx = self.texture_state[(preferred_stride, tiy, tix)]
-                factor_rez, offset_rez = self.calc.calc_tile_fraction(tiy, tix, preferred_stride)
-                tex_coords[tl*used_tile_idx*6: tl*(used_tile_idx+1)*6, :] = self.calc.calc_texture_coordinates(tex_tile_idx, factor_rez, offset_rez, tessellation_level=TESS_LEVEL)
-                vertices[tl*used_tile_idx*6: tl*(used_tile_idx+1)*6, :] = self.calc.calc_vertex_coordinates(tiy, tix,
-                                                                                                            preferred_stride[0], preferred_stride[1],
-                                                                                                            factor_rez, offset_rez,
-                                                                                                            tessellation_level=TESS_LEVEL)
 
-        return vertices, tex_coords
+        LOG.debug("Building vertex data for %d tiles (%r)", total_num_tiles + total_overview_tiles, tile_box)
+        # only tiles that moved in the atlas or came into view since the last build are calculated
+        with self.texture_state.lock:
+            buffers = build_tile_buffers(self.calc, self.texture_state, preferred_stride, tile_box,
+                                         overview=overview, pending=pending, previous=self._tile_buffers)
+        self._tile_buffers = buffers
+        return buffers.vertices, buffers.tex_coords
 
     def _set_vertex_tiles(self, vertices, tex_coords):
-        self._subdiv_position.set_data(vertices.astype('float32'))
-        self._subdiv_texcoord.set_data(tex_coords.astype('float32'))
+        uploaded = self._uploaded_coordinates
+        self._uploaded_coordinates = vertices, tex_coords
+        tl6 = 6 * TESS_LEVEL * TESS_LEVEL
+        if uploaded is None or uploaded[0].shape != vertices.shape or vertices.shape[0] % tl6:
+            self._subdiv_position.set_data(vertices.astype('float32'))
+            self._subdiv_texcoord.set_data(tex_coords.astype('float32'))
+            return
+        # same layout as what the GPU has: send only the runs of tiles whose coordinates changed
+        changed = np.any((uploaded[0] != vertices).reshape((-1, tl6 * 2)), axis=1) | \
+            np.any((uploaded[1] != tex_coords).reshape((-1, tl6 * 2)), axis=1)
+        if np.count_nonzero(changed) * 2 > changed.shape[0]:
+            self._subdiv_position.set_data(vertices.astype('float32'))
+            self._subdiv_texcoord.set_data(tex_coords.astype('float32'))
+            return
+        edges = np.flatnonzero(np.diff(np.concatenate(([0], changed.view(np.int8), [0]))))
+        for start, stop in zip(edges[::2], edges[1::2]):
+            self._subdiv_position.set_subdata(vertices[start * tl6:stop * tl6].astype('float32'), offset=int(start * tl6))
+            self._subdiv_texcoord.set_subdata(tex_coords[start * tl6:stop * tl6].astype('float32'), offset=int(start * tl6))
 
     def determine_reference_points(self):
         # Image points transformed to canvas coordinates
@@ -601,6 +818,9 @@ class TiledGeolocatedImageVisual(ImageVisual):
 
         Tell workspace we will be needed
         """
+        if self.num_tex_tiles <= 1:
+            # the texture budget left us room for the overview only
+            return False, self._stride, self._latest_tile_box
         try:
             view_box = self.get_view_box()
             preferred_stride = self._get_stride(view_box)
@@ -618,6 +838,47 @@ class TiledGeolocatedImageVisual(ImageVisual):
 
         return need_retile, preferred_stride, tile_box
 
+    def predict_tiles(self, pan, zoom):
+        """Determine the stride and tiles for where the view is heading.
+
+        :param pan: (x, y) shift of the view as a fraction of its current size
+        :param zoom: factor applied to the current view size
+        :return: (preferred_stride, tile_box) of the predicted view
+        :raises ValueError: if the image is not viewable in this projection
+        """
+        v = self.get_view_box()
+        cx = (v.l + v.r) / 2. + pan[0] * (v.r - v.l)
+        cy = (v.b + v.t) / 2. + pan[1] * (v.t - v.b)
+        hw, hh = (v.r - v.l) * zoom / 2., (v.t - v.b) * zoom / 2.
+        predicted = vue(b=cy - hh, l=cx - hw, t=cy + hh, r=cx + hw, dy=v.dy * zoom, dx=v.dx * zoom)
+        preferred_stride = self._get_stride(predicted)
+        tile_box = self.calc.visible_tiles(predicted, stride=preferred_stride, extra_tiles_box=box(1, 1, 1, 1))
+        return preferred_stride, tile_box
+
+    def prefetch(self, data, preferred_stride, tile_box):
+        """Copy the content of a predicted view into the host tile cache ahead of time.
+
+        Only host memory is touched: atlas tiles are assigned and uploaded by the retile once the view gets there,
+        which then finds its tiles in the cache instead of paging in the content.
+        :return: number of tiles copied into the cache
+        """
+        if self._tile_cache is None or self._content_ids is None:
+            return 0
+        state = self.texture_state
+        with state.lock:
+            ahead = [(tiy, tix) for tiy in range(tile_box.t, tile_box.b) for tix in range(tile_box.l, tile_box.r)
+                     if (preferred_stride, tiy, tix) not in state]
+        copied = 0
+        for tiy, tix in ahead:
+            y_slice, x_slice = self.calc.calc_tile_slice(tiy, tix, preferred_stride)
+            for chn_idx, chn_data in enumerate(self._channel_data(data)):
+                content_id = self._content_ids[chn_idx]
+                if chn_data is None or content_id is None:
+                    continue
+                self._tile_cache.tile(content_id, self._content_stride(chn_idx, preferred_stride), chn_data, y_slice, x_slice)
+            copied += 1
+        return copied
+
     def retile(self, data, preferred_stride, tile_box):
         """Get data from workspace and retile/retexture as needed.
         """
@@ -625,6 +886,48 @@ class TiledGeolocatedImageVisual(ImageVisual):
         vertices, tex_coords = self._build_vertex_tiles(preferred_stride, tile_box)
         return tiles_info, vertices, tex_coords
 
+    def retile_progressively(self, data, preferred_stride, tile_box, executor):
+        """Like retile, but tiles are extracted concurrently on an executor and delivered in batches,
+        tiles nearest the center of the view first.
+
+        Each batch comes with vertices drawing every tile delivered so far, so it can be handed to set_retiled
+        as soon as it arrives. Batches double in size to keep the number of vertex rebuilds logarithmic.
+        :param executor: concurrent.futures executor to extract tiles on
+        :return: generator of (tiles_info, vertices, tex_coords, fraction of tiles done)
+        """
+        data = self._normalize_content(data)
+        state = self.texture_state
+        owner = object()
+        planned = self._plan_texture_tiles(preferred_stride, tile_box, owner=owner)
+        if not planned:
+            vertices, tex_coords = self._build_vertex_tiles(preferred_stride, tile_box)
+            yield [], vertices, tex_coords, 1.
+            return
+        LOG.debug("Extracting %d tiles for '%s' (%r)", len(planned), self.name, tile_box)
+        futures = [executor.submit(self._build_texture_tile, data, *p) for p in planned]
+        pending = set(p[:3] for p in planned)
+        batch = []
+        deliver_at = 1
+        try:
+            for done, future in enumerate(futures, 1):
+                tile_info = future.result()
+                batch.append(tile_info)
+                pending.discard(tile_info[:3])
+                if done == deliver_at or done == len(futures):
+                    vertices, tex_coords = self._build_vertex_tiles(preferred_stride, tile_box, pending=pending)
+                    with state.lock:
+                        for tile_info in batch:
+                            state.delivered(tile_info[:3], owner)
+                    yield batch, vertices, tex_coords, float(done) / len(futures)
+                    batch = []
+                    deliver_at *= 2
+        finally:
+            # abandoned part way, e.g. superseded by a newer retile or the atlas was resized
+            for future in futures:
+                future.cancel()
+            with state.lock:
+                state.release(planned, owner)
+
     def set_retiled(self, preferred_stride, tile_box, tiles_info, vertices, tex_coords):
         self._set_texture_tiles(tiles_info)
         self._set_vertex_tiles(vertices, tex_coords)
@@ -726,7 +1029,7 @@ class CompositeLayerVisual(TiledGeolocatedImageVisual):
                  texture_shape=(DEFAULT_TEXTURE_HEIGHT, DEFAULT_TEXTURE_WIDTH),
                  wrap_lon=False,
                  cmap='viridis', method='tiled', clim='auto', gamma=None,
-                 interpolation='nearest', **kwargs):
+                 interpolation='nearest', half_float=False, **kwargs):
         # projection properties to be filled in later
         self.cell_width = None
         self.cell_height = None
@@ -756,6 +1059,18 @@ class CompositeLayerVisual(TiledGeolocatedImageVisual):
 
         # What tiles have we used and can we use (each texture uses the same 'state')
         self.texture_state = TextureTileState(self.num_tex_tiles)
+        # last vertex layout built and last coordinates sent to the GPU, so that retiles only redo tiles that changed
+        self._tile_buffers = None
+        self._uploaded_coordinates = None
+        # bumped whenever the atlas is resized, tiles built for an older atlas are dropped
+        self.texture_generation = 0
+        # shared host cache of tiles and the workspace content each channel is taken from, see use_tile_cache
+        self._tile_cache = None
+        self._content_ids = None
+        # float16 atlases if asked for and the channels fit, decided again whenever the channels change
+        self._half_float = half_float
+        self._tile_dtype = np.float32
+        self._textures = None
 
         self.set_channels(data_arrays, shape=shape,
                           cell_width=cell_width, cell_height=cell_height,
@@ -811,11 +1126,7 @@ class CompositeLayerVisual(TiledGeolocatedImageVisual):
         self._need_colortransform_update = True
         self._need_clim_update = True
         self._need_interpolation_update = True
-        self._textures = [TextureAtlas2D(self.texture_shape, tile_shape=self.tile_shape,
-                                         interpolation=texture_interpolation,
-                                         format="LUMINANCE", internalformat="R32F",
-                                         ) for i in range(self.num_channels)
-        ]
+        self._textures = self._create_textures(texture_interpolation)
         self._subdiv_position = VertexBuffer()
         self._subdiv_texcoord = VertexBuffer()
 
@@ -835,7 +1146,7 @@ class CompositeLayerVisual(TiledGeolocatedImageVisual):
 
         # define _data_lookup_fn as None, will be setup in
         # self._build_interpolation()
-        self._data_lookup_fns = [Function(_rgb_texture_lookup) for i in range(self.num_channels)]
+        self._data_lookup_fns = self._create_lookup_fns()
 
         if isinstance(clim, str):
             if clim != 'auto':
@@ -871,6 +1182,17 @@ class CompositeLayerVisual(TiledGeolocatedImageVisual):
 
         self.freeze()
 
+    def _create_textures(self, texture_interpolation):
+        """one float texture atlas per channel, enhanced in the shader
+        """
+        return [TextureAtlas2D(self.texture_shape, tile_shape=self.tile_shape,
+                               interpolation=texture_interpolation,
+                               format="LUMINANCE", internalformat=self._internalformat,
+                               ) for i in range(self.num_channels)]
+
+    def _create_lookup_fns(self):
+        return [Function(_rgb_texture_lookup) for i in range(self.num_channels)]
+
     def set_channels(self, data_arrays, shape=None,
                      cell_width=None, cell_height=None,
                      origin_x=None, origin_y=None, **kwargs):
@@ -902,9 +1224,20 @@ class CompositeLayerVisual(TiledGeolocatedImageVisual):
             wrap_lon=self.wrap_lon
         )
 
+        tile_dtype = self._choose_tile_dtype(data_arrays)
+        if tile_dtype != self._tile_dtype:
+            self._tile_dtype = tile_dtype
+            if self._textures is not None:
+                for atlas in self._textures:
+                    atlas.set_internalformat(self._internalformat)
+                # tiles being built for the old format are dropped
+                self.texture_generation += 1
+
         # Reset texture state, if we change things to know which texture
         # don't need to be updated then this can be removed/changed
-        self.texture_state.reset()
+        with self.texture_state.lock:
+            self.texture_state.reset()
+        self._tile_buffers = None
         self._need_texture_upload = True
         self._need_vertex_update = True
         # Reset the tiling logic to force a retile
@@ -920,25 +1253,34 @@ class CompositeLayerVisual(TiledGeolocatedImageVisual):
         # Update kwargs to reflect the new spatial resolution of the overview image
         nfo["cell_width"] = self.cell_width * x_slice.step
         nfo["cell_height"] = self.cell_height * y_slice.step
-        # Tell the texture state that we are adding a tile that should never expire and should always exist
-        nfo["texture_tile_index"] = ttile_idx = self.texture_state.add_tile((0, 0, 0), expires=False)
+        overview_arrays = []
         for idx, data in enumerate(data_arrays):
             if data is not None:
                 _y_slice, _x_slice = self.calc.calc_overview_stride(image_shape=data.shape)
                 overview_data = data[_y_slice, _x_slice]
             else:
                 overview_data = None
-            self._textures[idx].set_tile_data(ttile_idx, self._normalize_data(overview_data))
+            overview_arrays.append(self._normalize_data(overview_data))
+        nfo["data"] = overview_arrays
+        self._upload_overview()
 
-        # Handle wrapping around the anti-meridian so there is a -180/180 continuous image
-        num_tiles = 1 if not self.wrap_lon else 2
-        tl = TESS_LEVEL * TESS_LEVEL
-        nfo["texture_coordinates"] = np.empty((6 * num_tiles * tl, 2), dtype=np.float32)
-        nfo["vertex_coordinates"] = np.empty((6 * num_tiles * tl, 2), dtype=np.float32)
-        factor_rez, offset_rez = self.calc.calc_tile_fraction(0, 0, pnt(np.int64(y_slice.step), np.int64(x_slice.step)))
-        nfo["texture_coordinates"][:6 * tl, :2] = self.calc.calc_texture_coordinates(ttile_idx, factor_rez, offset_rez, tessellation_level=TESS_LEVEL)
-        nfo["vertex_coordinates"][:6 * tl, :2] = self.calc.calc_vertex_coordinates(0, 0, y_slice.step, x_slice.step, factor_rez, offset_rez, tessellation_level=TESS_LEVEL)
-        self._set_vertex_tiles(nfo["vertex_coordinates"], nfo["texture_coordinates"])
+    def _atlases(self):
+        return self._textures
+
+    @property
+    def host_tile_bytes(self):
+        return int(self.tile_shape[0]) * int(self.tile_shape[1]) * 4 * self.num_channels
+
+    def _content_stride(self, chn_idx, stride):
+        factor = self._channel_factors[chn_idx]
+        return int(stride[0] / factor), int(stride[1] / factor)
+
+    def _channel_data(self, data):
+        return data
+
+    def _set_overview_data(self, ttile_idx, overview_arrays):
+        for idx, overview_data in enumerate(overview_arrays):
+            self._textures[idx].set_tile_data(ttile_idx, self._to_tile_dtype(overview_data))
 
     @property
     def gamma(self):
@@ -997,40 +1339,29 @@ class CompositeLayerVisual(TiledGeolocatedImageVisual):
             lookup_fn['texture'] = self._textures[idx]
         self._need_interpolation_update = False
 
-    def _build_texture_tiles(self, data, stride, tile_box):
-        """Prepare and organize strided data in to individual tiles with associated information.
-        """
-        data = [self._normalize_data(d) for d in data]
-
-        LOG.debug("Uploading texture data for %d tiles (%r)", (tile_box.b - tile_box.t) * (tile_box.r - tile_box.l), tile_box)
-        # Tiles start at upper-left so go from top to bottom
-        tiles_info = []
-        for tiy in range(tile_box.t, tile_box.b):
-            for tix in range(tile_box.l, tile_box.r):
-                already_in = (stride, tiy, tix) in self.texture_state
-                # Update the age if already in there
-                # Assume that texture_state does not change from the main thread if this is run in another
-                tex_tile_idx = self.texture_state.add_tile((stride, tiy, tix))
-                if already_in:
-                    # FIXME: we should make a list/set of the tiles we need to add before this
-                    continue
+    def _normalize_content(self, data):
+        return [self._normalize_data(d) for d in data]
+
+    def _build_texture_tile(self, data, stride, tiy, tix, tex_tile_idx):
+        # Assume we were given a total image worth of this stride
+        y_slice, x_slice = self.calc.calc_tile_slice(tiy, tix, stride)
+        textures_data = []
+        for chn_idx in range(self.num_channels):
+            # force a copy of the data from the content array (provided by the workspace) to a vispy-compatible contiguous float array
+            # this can be a potentially time-expensive operation since content array is often huge and always memory-mapped, so paging may occur
+            # we don't want this paging deferred until we're back in the GUI thread pushing data to OpenGL!
+            if data[chn_idx] is None:
+                # we need to fill the texture with NaNs instead of actual data
+                tile_data = None
+            else:
+                tile_data = self._extract_tile(chn_idx, data[chn_idx], stride, y_slice, x_slice)
+            textures_data.append(tile_data)
+        return stride, tiy, tix, tex_tile_idx, self._prepare_tile_data(textures_data)
 
-                # Assume we were given a total image worth of this stride
-                y_slice, x_slice = self.calc.calc_tile_slice(tiy, tix, stride)
-                textures_data = []
-                for chn_idx in range(self.num_channels):
-                    # force a copy of the data from the content array (provided by the workspace) to a vispy-compatible contiguous float array
-                    # this can be a potentially time-expensive operation since content array is often huge and always memory-mapped, so paging may occur
-                    # we don't want this paging deferred until we're back in the GUI thread pushing data to OpenGL!
-                    if data[chn_idx] is None:
-                        # we need to fill the texture with NaNs instead of actual data
-                        tile_data = None
-                    else:
-                        tile_data = np.array(data[chn_idx][y_slice, x_slice], dtype=np.float32)
-                    textures_data.append(tile_data)
-                tiles_info.append((stride, tiy, tix, tex_tile_idx, textures_data))
-
-        return tiles_info
+    def _prepare_tile_data(self, textures_data):
+        """last step of building a tile off the GUI thread, the result is handed to _set_texture_tiles
+        """
+        return textures_data
 
     def _set_texture_tiles(self, tiles_info):
         for tile_info in tiles_info:
@@ -1116,6 +1447,186 @@ class RGBCompositeLayerVisual(CompositeLayerVisual):
 RGBCompositeLayer = create_visual_node(RGBCompositeLayerVisual)
 
 
+def _fit_tile(data, shape):
+    """nearest-neighbor replicate a coarser channel tile, then crop or NaN-pad it to the given shape
+    """
+    if data.shape == shape:
+        return data
+    ry, rx = (int(np.ceil(s / float(d))) if d else 1 for s, d in zip(shape, data.shape))
+    if ry > 1 or rx > 1:
+        data = np.repeat(np.repeat(data, ry, axis=0), rx, axis=1)
+    fitted = np.full(shape, np.nan, dtype=np.float32)
+    h, w = min(shape[0], data.shape[0]), min(shape[1], data.shape[1])
+    fitted[:h, :w] = data[:h, :w]
+    return fitted
+
+
+def pack_rgba8(channels, clims, gammas, shape=None):
+    """Apply color limits and gamma to up to three channel tiles and pack them into one RGBA8 tile.
+
+    Matches the per-channel RGB shader: NaN or missing channels are black, and a pixel
+    is transparent only where every channel is NaN or missing.
+
+    :param channels: sequence of 2D float arrays or None, in r, g, b order
+    :param clims: (vmin, vmax) for each channel
+    :param gammas: gamma for each channel
+    :param shape: tile shape to use when all channels are None, otherwise the largest rows and columns of any channel
+    :return: (rows, cols, 4) uint8 array
+    """
+    shapes = [c.shape for c in channels if c is not None]
+    shape = (max(s[0] for s in shapes), max(s[1] for s in shapes)) if shapes else tuple(shape)
+    packed = np.zeros(shape + (4,), dtype=np.uint8)
+    valid = np.zeros(shape, dtype=bool)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        for idx, (data, (vmin, vmax), gamma) in enumerate(zip(channels, clims, gammas)):
+            if data is None:
+                continue
+            data = _fit_tile(np.asarray(data, dtype=np.float32), shape)
+            finite = ~np.isnan(data)
+            span = (vmax - vmin) or 1.
+            norm = (np.clip(data, min(vmin, vmax), max(vmin, vmax)) - vmin) / span
+            if gamma != 1.:
+                norm **= gamma
+            packed[..., idx] = np.where(finite, norm * 255. + 0.5, 0.)
+            valid |= finite
+    packed[..., 3] = valid * np.uint8(255)
+    return packed
+
+
+_packed_texture_lookup = """
+    vec4 texture_lookup(vec2 texcoord) {
+        if(texcoord.x < 0.0 || texcoord.x > 1.0 ||
+        texcoord.y < 0.0 || texcoord.y > 1.0) {
+            discard;
+        }
+        return texture2D($texture, texcoord);
+    }"""
+
+PACKED_RGB_FRAG_SHADER = """
+uniform vec2 image_size;
+uniform int method;  // 0=subdivide, 1=impostor
+uniform sampler2D u_texture;
+varying vec2 v_texcoord;
+
+vec4 map_local_to_tex(vec4 x) {
+    // Cast ray from 3D viewport to surface of image
+    // (if $transform does not affect z values, then this
+    // can be optimized as simply $transform.map(x) )
+    vec4 p1 = $transform(x);
+    vec4 p2 = $transform(x + vec4(0, 0, 0.5, 0));
+    p1 /= p1.w;
+    p2 /= p2.w;
+    vec4 d = p2 - p1;
+    float f = p2.z / d.z;
+    vec4 p3 = p2 - d * f;
+
+    // finally map local to texture coords
+    return vec4(p3.xy / image_size, 0, 1);
+}
+
+
+void main()
+{
+    vec2 texcoord;
+    if( method == 0 ) {
+        texcoord = v_texcoord;
+    }
+    else {
+        // vertex shader ouptuts clip coordinates;
+        // fragment shader maps to texture coordinates
+        texcoord = map_local_to_tex(vec4(v_texcoord, 0, 1)).xy;
+    }
+
+    // color limits, gamma and fill transparency were applied when the tile was packed
+    gl_FragColor = $get_data_1(texcoord);
+}
+"""  # noqa
+
+
+class PackedRGBCompositeLayerVisual(RGBCompositeLayerVisual):
+    """RGB composite with color limits and gamma applied on the CPU as each tile is built.
+
+    All three channels share a single RGBA8 texture atlas instead of one R32F atlas each,
+    a third of the texture memory and upload bandwidth, so more frames of an RGB loop stay resident.
+    Changing color limits or gamma re-packs the overview in place and drops the other tiles for retiling.
+    """
+    FRAG_SHADER = PACKED_RGB_FRAG_SHADER
+    packed = True
+
+    def __init__(self, *args, **kwargs):
+        # the overview is always resident, keep its float channels so it can be re-enhanced without the workspace
+        self._overview_arrays = None
+        self._overview_serial = None
+        # bumped whenever color limits or gamma change, tiles packed under an older serial are stale
+        self._enhancement_serial = 0
+        self._stale_tiles = False
+        super(PackedRGBCompositeLayerVisual, self).__init__(*args, **kwargs)
+
+    def _create_textures(self, texture_interpolation):
+        return [TextureAtlas2D(self.texture_shape, tile_shape=self.tile_shape,
+                               interpolation=texture_interpolation,
+                               format="RGBA", internalformat="RGBA8",
+                               )]
+
+    def _choose_tile_dtype(self, channels):
+        # channels are packed to 8 bits from float32 tiles, RGBA8 texels take as much room as float32 ones
+        return np.float32
+
+    def _create_lookup_fns(self):
+        return [Function(_packed_texture_lookup)]
+
+    @CompositeLayerVisual.gamma.setter
+    def gamma(self, gamma):
+        CompositeLayerVisual.gamma.fset(self, gamma)
+        self._invalidate_enhancement()
+
+    @CompositeLayerVisual.clim.setter
+    def clim(self, clim):
+        CompositeLayerVisual.clim.fset(self, clim)
+        self._invalidate_enhancement()
+
+    def _invalidate_enhancement(self):
+        self._enhancement_serial += 1
+        # forget every expiring tile so the next assessment retiles them with the new enhancement
+        with self.texture_state.lock:
+            for itile_idx in list(self.texture_state.itile_age):
+                self.texture_state.remove_tile(itile_idx)
+        self._latest_tile_box = None
+
+    def _set_overview_data(self, ttile_idx, overview_arrays):
+        self._overview_arrays = overview_arrays
+        self._overview_serial = self._enhancement_serial
+        self._textures[0].set_tile_data(ttile_idx, pack_rgba8(overview_arrays, self._clim, self._gamma, self.tile_shape))
+
+    def _prepare_tile_data(self, textures_data):
+        return self._enhancement_serial, pack_rgba8(textures_data, self._clim, self._gamma, self.tile_shape)
+
+    def _set_texture_tiles(self, tiles_info):
+        self._stale_tiles = False
+        with self.texture_state.lock:
+            for stride, tiy, tix, tex_tile_idx, (serial, packed) in tiles_info:
+                if serial != self._enhancement_serial:
+                    # enhancement changed while this tile was being built
+                    if (stride, tiy, tix) in self.texture_state:
+                        self.texture_state.remove_tile((stride, tiy, tix))
+                    self._stale_tiles = True
+                    continue
+                self._textures[0].set_tile_data(tex_tile_idx, packed)
+
+    def set_retiled(self, preferred_stride, tile_box, tiles_info, vertices, tex_coords):
+        super(PackedRGBCompositeLayerVisual, self).set_retiled(preferred_stride, tile_box, tiles_info, vertices, tex_coords)
+        if self._stale_tiles:
+            self._latest_tile_box = None
+
+    def _set_clim_vars(self):
+        # nothing to hand the shader, but the resident overview has to be re-packed
+        if self._overview_arrays is not None and self._overview_serial != self._enhancement_serial:
+            self._set_overview_data(self.overview_info["texture_tile_index"], self._overview_arrays)
+        self._need_clim_update = False
+
+PackedRGBCompositeLayer = create_visual_node(PackedRGBCompositeLayerVisual)
+
+
 class ShapefileLinesVisual(LineVisual):
     def __init__(self, filepath, double=False, **kwargs):
         LOG.debug("Using border shapefile '%s'", filepath)
@@ -1174,6 +1685,173 @@ class NEShapefileLinesVisual(ShapefileLinesVisual):
 NEShapefileLines = create_visual_node(NEShapefileLinesVisual)
 
 
+class tests(unittest.TestCase):
+
+    def test_texture_tile_lru(self):
+        state = TextureTileState(4)
+        self.assertEqual(state.add_tile((0, 0, 0), expires=False), 0)
+        self.assertEqual([state.add_tile((1, 0, n)) for n in range(3)], [1, 2, 3])
+        state.add_tile((1, 0, 0))  # refresh, (1, 0, 1) is now the oldest
+        self.assertEqual(state.add_tile((1, 1, 1)), 2)
+        self.assertNotIn((1, 0, 1), state)
+        self.assertEqual(state.remove_tile((1, 0, 2)), 3)
+        self.assertEqual(state.add_tile((1, 1, 2)), 3)
+        self.assertEqual(list(state.itile_age), [(1, 0, 0), (1, 1, 1), (1, 1, 2)])
+
+    def test_texture_tile_lru_benchmark(self):
+        from timeit import default_timer
+        num_tiles = 64 * 64
+        state = TextureTileState(num_tiles)
+        start = default_timer()
+        for n in range(num_tiles * 8):
+            state.add_tile((1, n % (num_tiles * 2), 0))
+        elapsed = default_timer() - start
+        LOG.info("%d texture tile assignments in %.3fs", num_tiles * 8, elapsed)
+        self.assertEqual(len(state.itile_cache), num_tiles)
+        # a linear scan per assignment takes tens of seconds here
+        self.assertLess(elapsed, 2.)
+
+    def test_incremental_tile_buffers(self):
+        from timeit import default_timer
+        calc = TileCalculator('test', (4096, 8192), pnt(x=-4096e3, y=2048e3), rez(dy=1e3, dx=1e3),
+                              tile_shape=(64, 64), texture_shape=(32, 64))
+        state = TextureTileState(32 * 64)
+        calculated = []
+        calc_tile_coordinates = calc.calc_tile_coordinates
+        calc.calc_tile_coordinates = lambda v, t, slots, *args, **kwargs: calculated.extend(slots) or calc_tile_coordinates(v, t, slots, *args, **kwargs)
+        stride = (1, 1)
+        tile_box = box(b=20, l=10, t=0, r=40)
+        for tiy in range(tile_box.t, tile_box.b):
+            for tix in range(tile_box.l, tile_box.r):
+                state.add_tile((stride, tiy, tix))
+        pending = set([(stride, 5, 20), (stride, 6, 21)])
+        start = default_timer()
+        full = build_tile_buffers(calc, state, stride, tile_box, pending=pending)
+        full_time = default_timer() - start
+        self.assertEqual(len(calculated), 20 * 30 - 2)
+        # one pending tile arrives and the view pans down and right by a tile
+        pending.discard((stride, 5, 20))
+        panned = box(b=21, l=11, t=1, r=41)
+        for tix in range(panned.l, panned.r):
+            state.add_tile((stride, 20, tix))
+        for tiy in range(panned.t, panned.b):
+            state.add_tile((stride, tiy, 40))
+        del calculated[:]
+        start = default_timer()
+        incremental = build_tile_buffers(calc, state, stride, panned, pending=pending, previous=full)
+        incremental_time = default_timer() - start
+        LOG.info("tile buffers for %d tiles: %.4fs full, %.4fs incremental", full.ttiles.shape[0], full_time, incremental_time)
+        self.assertEqual(len(calculated), 30 + 20 - 1 + 1)
+        expected = build_tile_buffers(calc, state, stride, panned, pending=pending)
+        np.testing.assert_array_equal(incremental.ttiles, expected.ttiles)
+        np.testing.assert_array_equal(incremental.vertices, expected.vertices)
+        np.testing.assert_array_equal(incremental.tex_coords, expected.tex_coords)
+
+    def test_cancelled_retile_releases_tiles(self):
+        from concurrent.futures import ThreadPoolExecutor
+
+        class _Retiler(object):
+            # just enough of an image layer to plan and deliver tiles
+            name = 'test'
+            _plan_texture_tiles = TiledGeolocatedImageVisual._plan_texture_tiles
+            retile_progressively = TiledGeolocatedImageVisual.retile_progressively
+
+            def __init__(self, num_tiles):
+                self.texture_state = TextureTileState(num_tiles)
+
+            def _normalize_content(self, data):
+                return data
+
+            def _build_texture_tile(self, data, stride, tiy, tix, tex_tile_idx):
+                return stride, tiy, tix, tex_tile_idx, None
+
+            def _build_vertex_tiles(self, preferred_stride, tile_box, pending=()):
+                return None, None
+
+        layer = _Retiler(32)
+        stride = (1, 1)
+        tile_box = box(b=4, l=0, t=0, r=4)
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            first = layer.retile_progressively(None, stride, tile_box, executor)
+            delivered = [t[:3] for t in next(first)[0]]
+            self.assertEqual(len(delivered), 1)
+            # a newer retile of the same view starts before the first one is closed
+            second = layer.retile_progressively(None, stride, tile_box, executor)
+            batches = [next(second)]
+            first.close()
+            batches += list(second)
+            rebuilt = [t[:3] for batch in batches for t in batch[0]]
+            self.assertEqual(sorted(rebuilt + delivered), sorted((stride, tiy, tix) for tiy in range(4) for tix in range(4)))
+            self.assertEqual(len(layer.texture_state.undelivered), 0)
+            self.assertEqual(len(layer.texture_state.itile_cache), 16)
+            # abandoned with nothing else to take over: its undelivered tiles are no longer in the atlas
+            moved = box(b=8, l=4, t=4, r=8)
+            third = layer.retile_progressively(None, stride, moved, executor)
+            next(third)
+            third.close()
+            self.assertEqual(len(layer.texture_state.itile_cache), 17)
+            fourth = [t[:3] for batch in layer.retile_progressively(None, stride, moved, executor) for t in batch[0]]
+            self.assertEqual(len(fourth), 15)
+
+    def test_prefetch_host_only(self):
+        from sift.view.tile_cache import HostTileCache
+
+        class _Prefetcher(object):
+            prefetch = TiledGeolocatedImageVisual.prefetch
+            _channel_data = TiledGeolocatedImageVisual._channel_data
+            _content_stride = TiledGeolocatedImageVisual._content_stride
+
+        layer = _Prefetcher()
+        layer.calc = TileCalculator('test', (256, 256), pnt(x=-128e3, y=128e3), rez(dy=1e3, dx=1e3),
+                                    tile_shape=(64, 64), texture_shape=(2, 2))
+        layer.texture_state = TextureTileState(4)
+        layer._tile_cache = HostTileCache()
+        layer._content_ids = ['a']
+        stride = (1, 1)
+        layer.texture_state.add_tile((stride, 0, 0))
+        data = np.zeros((256, 256), dtype=np.float32)
+        self.assertEqual(layer.prefetch(data, stride, box(b=2, l=0, t=0, r=2)), 3)
+        self.assertEqual(len(layer._tile_cache), 3)
+        # atlas tiles are left for the retile
+        self.assertEqual(list(layer.texture_state.itile_cache.keys()), [(stride, 0, 0)])
+
+    def test_pack_rgba8(self):
+        nan = np.nan
+        r = np.array([[0., 5., 10., nan]], dtype=np.float32)
+        g = np.array([[nan, -5., 20., nan]], dtype=np.float32)
+        packed = pack_rgba8([r, g, None], [(0., 10.), (0., 10.), (0., 1.)], [1., 1., 1.])
+        self.assertEqual(packed.dtype, np.uint8)
+        np.testing.assert_array_equal(packed[0, :, 0], [0, 128, 255, 0])
+        # clipped to the color limits, NaN is black
+        np.testing.assert_array_equal(packed[0, :, 1], [0, 0, 255, 0])
+        # missing channel is black
+        np.testing.assert_array_equal(packed[0, :, 2], [0, 0, 0, 0])
+        # transparent only where every channel is NaN or missing
+        np.testing.assert_array_equal(packed[0, :, 3], [255, 255, 255, 0])
+        # inverted color limits and gamma
+        inverted = pack_rgba8([r, None, None], [(10., 0.), (0., 1.), (0., 1.)], [1., 1., 1.])
+        np.testing.assert_array_equal(inverted[0, :3, 0], [255, 128, 0])
+        gamma = pack_rgba8([r, None, None], [(0., 10.), (0., 1.), (0., 1.)], [2., 1., 1.])
+        self.assertEqual(gamma[0, 1, 0], 64)
+        # nothing to pack
+        empty = pack_rgba8([None, None, None], [(0., 1.)] * 3, [1.] * 3, shape=(2, 3))
+        self.assertEqual(empty.shape, (2, 3, 4))
+        self.assertFalse(np.any(empty))
+
+    def test_pack_rgba8_shapes(self):
+        # a tall coarse channel and a wide fine one: the tile takes the largest rows and columns of either
+        tall = np.ones((4, 2), dtype=np.float32)
+        wide = np.ones((3, 6), dtype=np.float32)
+        packed = pack_rgba8([tall, wide, None], [(0., 1.)] * 3, [1.] * 3)
+        self.assertEqual(packed.shape, (4, 6, 4))
+        np.testing.assert_array_equal(packed[:, :, 3], 255)
+        # an edge tile of a channel at half the resolution is replicated, then cropped to the tile
+        fitted = _fit_tile(np.array([[1., 2., 5.], [3., 4., 6.]], dtype=np.float32), (3, 5))
+        np.testing.assert_array_equal(fitted, [[1., 1., 2., 2., 5.], [1., 1., 2., 2., 5.], [3., 3., 4., 4., 6.]])
+        same = np.zeros((2, 2), dtype=np.float32)
+        self.assertIs(_fit_tile(same, (2, 2)), same)
+
+
 def main():
     parser = argparse.ArgumentParser(
         description="PURPOSE",
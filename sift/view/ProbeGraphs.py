@@ -136,6 +136,7 @@ class ProbeGraphManager (QObject) :
         self.document.didChangeLayerName.connect(self.handleLayersChanged)
         self.document.didAddBasicLayer.connect(self.handleLayersChanged)
         self.document.didAddCompositeLayer.connect(self.handleLayersChanged)
+        self.document.didAddCompositeLayers.connect(self.handleLayersChanged)
         self.document.willPurgeLayer.connect(self.handleLayersChanged)
         self.document.didSwitchLayerSet.connect(self.handleLayersChanged)
 
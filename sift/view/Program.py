@@ -33,6 +33,20 @@ __docformat__ = 'reStructuredText'
 LOG = logging.getLogger(__name__)
 
 
+def _gl_takes_half_floats():
+    """True if this vispy hands float16 data to GL as is (GL_HALF_FLOAT), otherwise tiles of half-float atlases
+    are uploaded as float32 and only stored as 16 bits on the GPU
+    """
+    try:
+        from vispy.gloo.glir import GlirTexture
+        return np.dtype(np.float16) in getattr(GlirTexture, '_types', {})
+    except ImportError:
+        return False
+
+
+GL_TAKES_HALF_FLOATS = _gl_takes_half_floats()
+
+
 class TextureAtlas2D(Texture2D):
     """A 2D Texture Array structure implemented as a 2D Texture Atlas.
     """
@@ -48,11 +62,37 @@ class TextureAtlas2D(Texture2D):
         # Number of rows and columns to hold all of these tiles in one texture
         shape = (self.texture_shape[0] * self.tile_shape[0], self.texture_shape[1] * self.tile_shape[1])
         self.texture_size = shape
-        self._fill_array = np.tile(np.nan, self.tile_shape).astype(np.float32)
+        if format is not None and format.lower() == 'rgba':
+            # packed color tiles, fill is fully transparent
+            shape = shape + (4,)
+            self._fill_array = np.zeros(self.tile_shape + (4,), dtype=np.uint8)
+        else:
+            self._fill_array = self._float_fill(internalformat)
         # will add self.shape:
         super(TextureAtlas2D, self).__init__(None, format, resizable, interpolation,
                                              wrapping, shape, internalformat, resizeable)
 
+    def set_texture_shape(self, texture_shape):
+        """Change how many tiles the atlas holds, discarding its contents.
+        """
+        self.texture_shape = texture_shape
+        shape = (self.texture_shape[0] * self.tile_shape[0], self.texture_shape[1] * self.tile_shape[1])
+        self.texture_size = shape
+        if self._fill_array.ndim == 3:
+            shape = shape + (self._fill_array.shape[2],)
+        self.resize(shape)
+
+    def _float_fill(self, internalformat):
+        half = internalformat is not None and internalformat.lower() == 'r16f'
+        dtype = np.float16 if half and GL_TAKES_HALF_FLOATS else np.float32
+        return np.tile(np.nan, self.tile_shape).astype(dtype)
+
+    def set_internalformat(self, internalformat):
+        """Switch between 'r16f' and 'r32f' storage, discarding the contents.
+        """
+        self._fill_array = self._float_fill(internalformat)
+        self.resize(self.shape, internalformat=internalformat)
+
     def _tex_offset(self, idx):
         """Return the X, Y texture index offset for the 1D tile index.
 
@@ -77,11 +117,14 @@ class TextureAtlas2D(Texture2D):
                 # FIXME: This should be handled by the caller to expand the array to be NaN filled and aligned
                 # Assign a fill value, make sure to copy the data so that we don't overwrite the original
                 data_orig = data
-                data = np.zeros(self.tile_shape, dtype=data.dtype)
+                data = np.zeros(self.tile_shape + data.shape[2:], dtype=data.dtype)
                 # data = data.copy()
-                data[:] = np.nan
+                if data.dtype.kind == 'f':
+                    data[:] = np.nan
                 data[:tile_offset[0], :tile_offset[1]] = data_orig[:tile_offset[0], :tile_offset[1]]
         if DEBUG_IMAGE_TILE:
+            # tiles may be shared through the host tile cache, mark up a copy
+            data = data.copy()
             data[:5, :] = 1000.
             data[-5:, :] = 1000.
             data[:, :5] = 1000.
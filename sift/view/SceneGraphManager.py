@@ -33,9 +33,13 @@ from vispy.scene.visuals import Markers, Polygon, Compound, Line
 from vispy.geometry import Rect
 from sift.common import DEFAULT_ANIMATION_DELAY, INFO, KIND, TOOL, prez
 # from sift.control.layer_list import LayerStackListViewModel
-from sift.view.LayerRep import NEShapefileLines, TiledGeolocatedImage, RGBCompositeLayer
+from sift.view.LayerRep import NEShapefileLines, TiledGeolocatedImage, RGBCompositeLayer, PackedRGBCompositeLayer
 from sift.view.MapWidget import SIFTMainMapCanvas
 from sift.view.Cameras import PanZoomProbeCamera
+from sift.view.texture_budget import TextureBudget, DEFAULT_TEXTURE_BUDGET
+from sift.view.tile_cache import HostTileCache, DEFAULT_HOST_TILE_CACHE_BYTES
+from sift.view.preloader import FramePreloader, playback_order
+from sift.view.animation import FrameScheduler, format_stats, SKIP, HOLD
 from sift.view.Colormap import ALL_COLORMAPS
 from sift.model.document import DocLayerStack
 from sift.queue import TASK_DOING, TASK_PROGRESS
@@ -50,13 +54,19 @@ from uuid import UUID
 
 import os
 import sys
+import time
 import logging
+from concurrent.futures import ThreadPoolExecutor
 
 LOG = logging.getLogger(__name__)
 DATA_DIR = get_data_dir()
 DEFAULT_SHAPE_FILE = os.path.join(DATA_DIR, 'ne_50m_admin_0_countries', 'ne_50m_admin_0_countries.shp')
 DEFAULT_STATES_SHAPE_FILE = os.path.join(DATA_DIR, 'ne_50m_admin_1_states_provinces_lakes', 'ne_50m_admin_1_states_provinces_lakes.shp')
 DEFAULT_TEXTURE_SHAPE = (4, 16)
+PREFETCH_LEAD = 0.5  # seconds ahead of the camera to prepare tiles for
+PREFETCH_INTERVAL = 0.25  # minimum seconds between prefetch requests while the camera moves
+# copying tiles out of memory-mapped content and casting them releases the GIL, so retiles extract tiles in parallel
+TILE_EXTRACTION_THREADS = min(8, os.cpu_count() or 2)
 
 
 class Markers2(Markers):
@@ -162,7 +172,7 @@ class LayerSet(object):
      - Animation loop and frame order
      - Layer Order
     """
-    def __init__(self, parent, layers=None, layer_order=None, frame_order=None, frame_change_cb=None):
+    def __init__(self, parent, layers=None, layer_order=None, frame_order=None, frame_change_cb=None, animation_stats_cb=None):
         if layers is None and (layer_order is not None or frame_order is not None):
             raise ValueError("'layers' required when 'layer_order' or 'frame_order' is specified")
 
@@ -174,7 +184,13 @@ class LayerSet(object):
         self._frame_number = 0
         self._frame_change_cb = frame_change_cb
         self._animation_speed = DEFAULT_ANIMATION_DELAY  # milliseconds
-        self._animation_timer = app.Timer(self._animation_speed/1000.0, connect=self.next_frame)
+        self._animation_stats_cb = animation_stats_cb
+        # decides on each tick which frame is due, given whether the last one made it to the screen
+        self.frame_scheduler = FrameScheduler(self._animation_speed/1000.0)
+        self._animation_timer = app.Timer(self._animation_speed/1000.0, connect=self._animation_tick)
+        # hold off starting playback until the parent's preloader has every frame ready
+        self.wait_for_preload = False
+        self._start_when_ready = False
 
         if layers is not None:
             self.set_layers(layers)
@@ -205,12 +221,12 @@ class LayerSet(object):
     def animation_speed(self, milliseconds):
         if milliseconds <= 0:
             return
-        self._animation_timer.stop()
+        self._stop_timer()
         self._animation_speed = milliseconds
         self._animation_timer.interval = milliseconds/1000.0
         if self._frame_order:
             self._animating = True
-            self._animation_timer.start()
+            self._start_timer()
         if self._frame_change_cb is not None and self._frame_order:
             uuid = self._frame_order[self._frame_number]
             self._frame_change_cb((self._frame_number, len(self._frame_order), self._animating, uuid))
@@ -250,6 +266,8 @@ class LayerSet(object):
         self._frame_order = frame_order
         # FIXME: ticket #92: this is not a good idea
         self._frame_number = 0
+        if self.frame_scheduler.running:
+            self.frame_scheduler.rebase(0, len(frame_order))
         # LOG.debug('accepted new frame order of length {}'.format(len(frame_order)))
         # if self._frame_change_cb is not None and self._frame_order:
         #     uuid = self._frame_order[self._frame_number]
@@ -277,26 +295,68 @@ class LayerSet(object):
 
     @animating.setter
     def animating(self, animate):
+        if not animate:
+            self._start_when_ready = False
         if animate == self._animating:
             # Don't update anything if nothing about the animation has changed
             return
         elif self._animating and not animate:
             # We are currently, but don't want to be
             self._animating = False
-            self._animation_timer.stop()
+            self._stop_timer()
         elif not self._animating and animate and self._frame_order:
+            if self.wait_for_preload and not self.parent.preloader.all_ready:
+                LOG.info('waiting for animation frames to load before playing')
+                self._start_when_ready = True
+                return
             # We are not currently, but want to be
             self._animating = True
-            self._animation_timer.start()
+            self._start_timer()
             # TODO: Add a proper AnimationEvent to self.events
         if self._frame_change_cb is not None and self._frame_order:
             uuid = self._frame_order[self._frame_number]
             self._frame_change_cb((self._frame_number, len(self._frame_order), self._animating, uuid))
 
+    def _start_timer(self):
+        self.frame_scheduler.interval = self._animation_speed/1000.0
+        self.frame_scheduler.start(self._frame_number, len(self._frame_order))
+        self._animation_timer.start()
+
+    def _stop_timer(self):
+        self._animation_timer.stop()
+        if not self.frame_scheduler.running:
+            return
+        self.frame_scheduler.stop()
+        stats = self.frame_scheduler.stats
+        if stats['frames_shown'] + stats['frames_dropped'] > 1:
+            LOG.info('animation: {}'.format(format_stats(stats)))
+            if self._animation_stats_cb is not None:
+                self._animation_stats_cb(stats)
+
+    def _animation_tick(self, event=None):
+        frame = self.frame_scheduler.tick()
+        if frame is not None:
+            self.next_frame(frame_number=frame)
+
+    def frame_drawn(self, seconds):
+        """
+        the canvas finished drawing, taking seconds
+        """
+        if self._animating:
+            self.frame_scheduler.drawn(seconds)
+
     def toggle_animation(self, *args):
-        self.animating = not self._animating
+        self.animating = not (self._animating or self._start_when_ready)
         return self.animating
 
+    def frames_ready(self):
+        """
+        every frame is loaded, start playback if it was waiting for that
+        """
+        if self._start_when_ready:
+            self._start_when_ready = False
+            self.animating = True
+
     def _set_visible_node(self, node):
         """Set all nodes to invisible except for the `event.added` node.
         """
@@ -375,17 +435,24 @@ class SceneGraphManager(QObject):
 
     # FIXME: many more undocumented member variables
 
-    didRetilingCalcs = pyqtSignal(object, object, object, object, object, object)
+    didRetilingCalcs = pyqtSignal(object, object, object, object, object, object, object)  # ..., texture generation the tiles were built for
+    didFinishRetile = pyqtSignal(object, object, object, object)  # uuid, stride, tile_box, texture generation, all tiles delivered
+    didChangePreload = pyqtSignal(int, int)  # animation frames ready, frames being preloaded
     didChangeFrame = pyqtSignal(tuple)
+    didReportAnimation = pyqtSignal(dict)  # FrameScheduler.stats of playback that just stopped
     didChangeLayerVisibility = pyqtSignal(dict)  # similar to document didChangeLayerVisibility
     newPointProbe = pyqtSignal(str, tuple)
     newProbePolygon = pyqtSignal(object, object)
 
     def __init__(self, doc, workspace, queue,
                  border_shapefile=None, states_shapefile=None,
-                 parent=None, texture_shape=(4, 16), center=None):
+                 parent=None, texture_shape=(4, 16), center=None, packed_rgb=False,
+                 texture_budget=DEFAULT_TEXTURE_BUDGET, tile_cache_bytes=DEFAULT_HOST_TILE_CACHE_BYTES,
+                 half_float=False, wait_for_frames=False, hold_frames=False):
         super(SceneGraphManager, self).__init__(parent)
         self.didRetilingCalcs.connect(self._set_retiled)
+        self.didFinishRetile.connect(self._finished_retile)
+        self._last_prefetch = 0.
 
         # Parent should be the Qt widget that this GLCanvas belongs to
         self.document = doc
@@ -394,6 +461,17 @@ class SceneGraphManager(QObject):
         self.border_shapefile = border_shapefile or DEFAULT_SHAPE_FILE
         self.conus_states_shapefile = states_shapefile or DEFAULT_STATES_SHAPE_FILE
         self.texture_shape = texture_shape
+        # enhance RGB layers on the CPU into one RGBA8 texture instead of three float textures
+        self.packed_rgb = packed_rgb
+        # float16 texture atlases for layers whose values fit them
+        self.half_float = half_float
+        # GPU texture bytes shared by all image elements, handed out by priority
+        self.texture_budget = TextureBudget(texture_budget)
+        # tiles already copied out of workspace content, shared by all elements and retiles
+        self.tile_cache = HostTileCache(tile_cache_bytes)
+        # animation frames prepared ahead of playback for the current view
+        self.preloader = FramePreloader()
+        self._tile_pool = ThreadPoolExecutor(max_workers=TILE_EXTRACTION_THREADS, thread_name_prefix='tile')
         self.polygon_probes = {}
         self.point_probes = {}
 
@@ -401,7 +479,11 @@ class SceneGraphManager(QObject):
         self.composite_element_dependencies = {}
         self.colormaps = {}
         self.colormaps.update(ALL_COLORMAPS)
-        self.layer_set = LayerSet(self, frame_change_cb=self.frame_changed)
+        self.layer_set = LayerSet(self, frame_change_cb=self.frame_changed, animation_stats_cb=self.didReportAnimation.emit)
+        self.layer_set.wait_for_preload = wait_for_frames
+        # under load show every frame slowly rather than dropping frames to keep time
+        self.layer_set.frame_scheduler.policy = HOLD if hold_frames else SKIP
+        self._draw_started_at = None
         self._current_tool = None
 
         self._connect_doc_signals(self.document)
@@ -417,6 +499,23 @@ class SceneGraphManager(QObject):
 
         self.setup_initial_canvas(center)
         self.pending_polygon = PendingPolygon(self.main_map)
+        self.main_canvas.transforms.changed.connect(self.on_view_motion)
+        # time every draw of the scene, pending texture uploads are issued as part of it
+        self.main_canvas.events.draw.connect(self._draw_started, position='first')
+        self.main_canvas.events.draw.connect(self._draw_finished, position='last')
+
+    def _draw_started(self, event):
+        self._draw_started_at = time.perf_counter()
+
+    def _draw_finished(self, event):
+        if self._draw_started_at is not None:
+            self.layer_set.frame_drawn(time.perf_counter() - self._draw_started_at)
+            self._draw_started_at = None
+
+    def close(self):
+        """stop extracting tiles, used when the main window closes
+        """
+        self._tile_pool.shutdown(wait=False)
 
     def get_screenshot_array(self, frame_range=None):
         from vispy.gloo.util import _screenshot
@@ -448,6 +547,12 @@ class SceneGraphManager(QObject):
         self.didChangeFrame.emit(frame_info)
         is_animating = frame_info[2]
         if not is_animating:
+            # animation stopped or stepped by hand, give the frame being looked at its textures
+            if self.rebalance_textures():
+                self.on_view_change(None)
+            else:
+                # frames play from here now
+                self.preload_frames()
             # emit a signal equivalent to document's didChangeLayerVisibility,
             # except that visibility is being changed by animation interactions
             # only do this when we're not animating, however
@@ -754,6 +859,7 @@ class SceneGraphManager(QObject):
             element = self.image_elements.get(uuid, None)
             if element is not None:
                 self.image_elements[uuid].clim = clims
+                self._reassess_packed(uuid, element)
 
     def set_gamma(self, gamma, uuid):
         uuids = uuid
@@ -766,6 +872,15 @@ class SceneGraphManager(QObject):
             element = self.image_elements.get(uuid, None)
             if element is not None:
                 self.image_elements[uuid].gamma = gamma
+                self._reassess_packed(uuid, element)
+
+    def _reassess_packed(self, uuid, element):
+        """packed RGB elements bake color limits and gamma into their tiles, so retile after either changes
+        """
+        if getattr(element, 'packed', False):
+            need_retile, preferred_stride, tile_box = element.assess()
+            if need_retile:
+                self.start_retiling_task(uuid, preferred_stride, tile_box)
 
     def change_layers_colormap(self, change_dict):
         for uuid,cmapid in change_dict.items():
@@ -788,6 +903,16 @@ class SceneGraphManager(QObject):
         if not layer.is_valid:
             LOG.warning('unable to add an invalid layer, will try again later when layer changes')
             return
+        image = self._create_basic_element(layer, p)
+        image.determine_reference_points()
+        self.rebalance_textures()
+        self.on_view_change(None)
+
+    def _create_basic_element(self, layer, p:prez):
+        """
+        create the visual for a valid single-channel layer and add it to the layer set, without scheduling any tiling
+        """
+        uuid = layer.uuid
         overview_content = self.workspace.get_content(layer.uuid)
         image = TiledGeolocatedImage(
             overview_content,
@@ -806,13 +931,15 @@ class SceneGraphManager(QObject):
             wrap_lon=False,
             parent=self.main_map,
             projection=layer[INFO.PROJ],
+            half_float=self.half_float,
         )
         image.transform = PROJ4Transform(layer[INFO.PROJ], inverse=True)
         image.transform *= STTransform(translate=(0, 0, -50.0))
         self.image_elements[uuid] = image
+        self.texture_budget.register(uuid, image.tile_bytes, image.texture_shape)
+        image.use_tile_cache(self.tile_cache, [uuid])
         self.layer_set.add_layer(image)
-        image.determine_reference_points()
-        self.on_view_change(None)
+        return image
 
     def add_composite_layer(self, new_order:tuple, uuid:UUID, p:prez):
         layer = self.document[uuid]
@@ -821,34 +948,10 @@ class SceneGraphManager(QObject):
             LOG.info('unable to add an invalid layer, will try again later when layer changes')
             return
         if layer[INFO.KIND] == KIND.RGB:
-            dep_uuids = r,g,b = [c.uuid if c is not None else None for c in [layer.r, layer.g, layer.b]]
-            overview_content = list(self.workspace.get_content(cuuid) for cuuid in dep_uuids)
-            uuid = layer.uuid
-            LOG.debug("Adding composite layer to Scene Graph Manager with UUID: %s", uuid)
-            self.image_elements[uuid] = element = RGBCompositeLayer(
-                overview_content,
-                layer[INFO.ORIGIN_X],
-                layer[INFO.ORIGIN_Y],
-                layer[INFO.CELL_WIDTH],
-                layer[INFO.CELL_HEIGHT],
-                name=str(uuid),
-                clim=layer[INFO.CLIM],
-                gamma=p.gamma,
-                interpolation='nearest',
-                method='tiled',
-                cmap=self._find_colormap("grays"),
-                double=False,
-                texture_shape=DEFAULT_TEXTURE_SHAPE,
-                wrap_lon=False,
-                parent=self.main_map,
-                projection=layer[INFO.PROJ],
-            )
-            element.transform = PROJ4Transform(layer[INFO.PROJ], inverse=True)
-            element.transform *= STTransform(translate=(0, 0, -50.0))
-            self.composite_element_dependencies[uuid] = dep_uuids
-            self.layer_set.add_layer(element)
+            element = self._create_rgb_element(layer, p)
             if new_order:
                 self.layer_set.set_layer_order(new_order)
+            self.rebalance_textures()
             self.on_view_change(None)
             element.determine_reference_points()
             self.update()
@@ -857,6 +960,73 @@ class SceneGraphManager(QObject):
             # algebraic layer
             return self.add_basic_layer(new_order, uuid, p)
 
+    def _create_rgb_element(self, layer, p:prez):
+        """
+        create the visual for a valid RGB layer and add it to the layer set, without scheduling any tiling
+        """
+        dep_uuids = r,g,b = [c.uuid if c is not None else None for c in [layer.r, layer.g, layer.b]]
+        overview_content = list(self.workspace.get_content(cuuid) for cuuid in dep_uuids)
+        uuid = layer.uuid
+        LOG.debug("Adding composite layer to Scene Graph Manager with UUID: %s", uuid)
+        rgb_class = PackedRGBCompositeLayer if self.packed_rgb else RGBCompositeLayer
+        self.image_elements[uuid] = element = rgb_class(
+            overview_content,
+            layer[INFO.ORIGIN_X],
+            layer[INFO.ORIGIN_Y],
+            layer[INFO.CELL_WIDTH],
+            layer[INFO.CELL_HEIGHT],
+            name=str(uuid),
+            clim=layer[INFO.CLIM],
+            gamma=p.gamma,
+            interpolation='nearest',
+            method='tiled',
+            cmap=self._find_colormap("grays"),
+            double=False,
+            texture_shape=DEFAULT_TEXTURE_SHAPE,
+            wrap_lon=False,
+            parent=self.main_map,
+            projection=layer[INFO.PROJ],
+            half_float=self.half_float,
+        )
+        element.transform = PROJ4Transform(layer[INFO.PROJ], inverse=True)
+        element.transform *= STTransform(translate=(0, 0, -50.0))
+        self.composite_element_dependencies[uuid] = dep_uuids
+        self.texture_budget.register(uuid, element.tile_bytes, element.texture_shape)
+        element.use_tile_cache(self.tile_cache, dep_uuids)
+        self.layer_set.add_layer(element)
+        return element
+
+    def add_composite_layers(self, new_order:tuple, added:list):
+        """
+        create visuals for a batch of new composite layers, typically an animation loop, then schedule their tiles together
+        the first layer in the batch is the first animation frame, so its tiles are calculated on an interactive worker
+        and the rest in the background
+        :param added: [(uuid, prez), ...] in animation order
+        """
+        created = []
+        for uuid, p in added:
+            layer = self.document[uuid]
+            if not layer.is_valid:
+                LOG.info('unable to add an invalid layer, will try again later when layer changes')
+                continue
+            if layer[INFO.KIND] == KIND.RGB:
+                created.append((uuid, self._create_rgb_element(layer, p)))
+            elif layer[INFO.KIND] == KIND.COMPOSITE:
+                # algebraic layer
+                created.append((uuid, self._create_basic_element(layer, p)))
+            else:
+                self.add_composite_layer((), uuid, p)
+        if new_order:
+            self.layer_set.set_layer_order(new_order)
+        self.rebalance_textures()
+        for nth, (uuid, element) in enumerate(created):
+            need_retile, preferred_stride, tile_box = element.assess()
+            if need_retile:
+                self.start_retiling_task(uuid, preferred_stride, tile_box, interactive=(nth == 0))
+            element.determine_reference_points()
+        LOG.debug('added {} composite layers in one batch'.format(len(created)))
+        self.update()
+
     def change_composite_layer(self, new_order:tuple, uuid:UUID, presentation:prez, changes:dict):
         layer = self.document[uuid]
         if layer[INFO.KIND] == KIND.RGB:
@@ -868,6 +1038,7 @@ class SceneGraphManager(QObject):
                     overview_content = list(self.workspace.get_content(cuuid) for cuuid in dep_uuids)
                     self.composite_element_dependencies[layer.uuid] = dep_uuids
                     elem = self.image_elements[layer.uuid]
+                    elem.use_tile_cache(self.tile_cache, dep_uuids)
                     elem.set_channels(overview_content,
                                       cell_width=layer[INFO.CELL_WIDTH],
                                       cell_height=layer[INFO.CELL_HEIGHT],
@@ -921,12 +1092,17 @@ class SceneGraphManager(QObject):
             image_layer = self.image_elements[uuid_removed]
             image_layer.parent = None
             del self.image_elements[uuid_removed]
+            self.texture_budget.unregister(uuid_removed)
+            self.tile_cache.discard(uuid_removed)
+            self.preloader.forget(uuid_removed)
             LOG.info("layer {} purge from scenegraphmanager".format(uuid_removed))
         else:
             LOG.debug("Layer {} already purged from Scene Graph".format(uuid_removed))
 
     def _purge_layer(self, *args, **kwargs):
         res = self.purge_layer(*args, **kwargs)
+        if self.rebalance_textures():
+            self.on_view_change(None)
         # when purging the layer is the only operation being performed then update when we are done
         self.update()
         return res
@@ -934,6 +1110,25 @@ class SceneGraphManager(QObject):
     def change_layers_visibility(self, layers_changed:dict):
         for uuid, visible in layers_changed.items():
             self.set_layer_visible(uuid, visible)
+        if self.rebalance_textures():
+            self.on_view_change(None)
+
+    def rebalance_textures(self):
+        """
+        Share the texture budget among image elements: visible layers top-down first, then animation frames in play order.
+        Allocations are left alone while animating, see frame_changed.
+        :return: True if any atlas was resized and elements need reassessing
+        """
+        visible = [p.uuid for (p, l) in self.document.active_layer_order if p.visible]
+        frames = list(self.layer_set.frame_order or [])
+        current = self.layer_set.current_frame
+        frames = frames[current:] + frames[:current]
+        resized = False
+        for uuid, texture_shape in self.texture_budget.plan(visible + frames).items():
+            element = self.image_elements.get(uuid, None)
+            if element is not None:
+                resized = element.set_texture_shape(texture_shape) or resized
+        return resized
 
     def rebuild_new_layer_set(self, new_set_number:int, new_prez_order:DocLayerStack, new_anim_order:list):
         self.rebuild_all()
@@ -943,6 +1138,7 @@ class SceneGraphManager(QObject):
         document.didReorderLayers.connect(self._rebuild_layer_order)  # current layer set changed z/anim order
         document.didAddBasicLayer.connect(self.add_basic_layer)  # layer added to one or more layer sets
         document.didAddCompositeLayer.connect(self.add_composite_layer)  # layer derived from other layers (either basic or composite themselves)
+        document.didAddCompositeLayers.connect(self.add_composite_layers)  # batch of derived layers, e.g. an RGB loop
         document.didRemoveLayers.connect(self._remove_layer)  # layer removed from current layer set
         document.willPurgeLayer.connect(self._purge_layer)  # layer removed from document
         document.didSwitchLayerSet.connect(self.rebuild_new_layer_set)
@@ -983,6 +1179,10 @@ class SceneGraphManager(QObject):
 
     def _rebuild_frame_order(self, *args, **kwargs):
         res = self.rebuild_frame_order(*args, **kwargs)
+        if self.rebalance_textures():
+            self.on_view_change(None)
+        else:
+            self.preload_frames()
         # when purging the layer is the only operation being performed then update when we are done
         self.update()
         return res
@@ -1056,7 +1256,8 @@ class SceneGraphManager(QObject):
                 self.start_retiling_task(uuid, preferred_stride, tile_box)
 
         current_visible_layers = [p.uuid for (p,l) in self.document.active_layer_order if p.visible]
-        current_invisible_layers = set(self.image_elements.keys()) - set(current_visible_layers)
+        # animation frames are prepared in playback order by preload_frames
+        current_invisible_layers = set(self.image_elements.keys()) - set(current_visible_layers) - set(self.layer_set.frame_order or [])
 
         def _assess_if_active(uuid):
             element = self.image_elements.get(uuid, None)
@@ -1067,41 +1268,143 @@ class SceneGraphManager(QObject):
             _assess_if_active(uuid)
         for uuid in current_invisible_layers:
             _assess_if_active(uuid)
+        self.preload_frames(visible=current_visible_layers)
 
-    def start_retiling_task(self, uuid, preferred_stride, tile_box):
+    def preload_frames(self, visible=None):
+        """Prepare the tiles of the current view for the animation frames, as background work in playback order.
+
+        Frames are preloaded as long as the texture budget gives them room beyond their overview
+        and their tiles fit in the host tile cache along with the frames before them.
+        Visible frames are retiled by on_view_change already, they are only tracked here.
+        :param visible: UUIDs of visible layers, looked up if not given
+        """
+        if visible is None:
+            visible = [p.uuid for (p, l) in self.document.active_layer_order if p.visible]
+        visible = set(visible)
+        targets = []
+        host_bytes = 0
+        for uuid in playback_order(self.layer_set.frame_order, self.layer_set.current_frame):
+            element = self.image_elements.get(uuid, None)
+            if element is None or element.num_tex_tiles <= 1:
+                continue
+            need_retile, preferred_stride, tile_box = element.assess()
+            if tile_box is None:
+                continue
+            host_bytes += element.host_tile_bytes * (tile_box.b - tile_box.t) * (tile_box.r - tile_box.l)
+            if targets and host_bytes > self.tile_cache.max_bytes:
+                LOG.debug('preloading %d of %d frames, the rest would not fit in the host tile cache', len(targets), len(self.layer_set.frame_order))
+                break
+            targets.append((uuid, (preferred_stride, tile_box, element.texture_generation), not need_retile))
+        wanted = dict((uuid, target) for uuid, target, _ in targets)
+        for uuid in self.preloader.update(targets):
+            if uuid not in visible:
+                preferred_stride, tile_box, _ = wanted[uuid]
+                self.start_retiling_task(uuid, preferred_stride, tile_box, interactive=False)
+        self._preload_progressed()
+
+    def _preload_progressed(self):
+        ready, total = self.preloader.progress
+        self.didChangePreload.emit(ready, total)
+        if self.preloader.all_ready:
+            self.layer_set.frames_ready()
+
+    def _finished_retile(self, uuid, preferred_stride, tile_box, generation):
+        """Slot for retiles that delivered all their tiles, which makes animation frames ready for playback.
+        """
+        if self.preloader.finished(uuid, (preferred_stride, tile_box, generation)):
+            self._preload_progressed()
+
+    def start_retiling_task(self, uuid, preferred_stride, tile_box, interactive=True):
         LOG.debug("Scheduling retile for child with UUID: %s", uuid)
-        self.queue.add(str(uuid) + "_retile", self._retile_child(uuid, preferred_stride, tile_box), 'Retile calculations for image layer ' + str(uuid), interactive=True)
+        self.queue.add(str(uuid) + "_retile", self._retile_child(uuid, preferred_stride, tile_box), 'Retile calculations for image layer ' + str(uuid),
+                       interactive=interactive, replace=True)
 
-    def _retile_child(self, uuid, preferred_stride, tile_box):
-        LOG.debug("Retiling child with UUID: '%s'", uuid)
-        yield {TASK_DOING: 'Re-tiling', TASK_PROGRESS: 0.0}
+    def _strided_content(self, uuid, child, preferred_stride):
+        """content for a child at the given stride, a list of channels for composites
+        """
         if uuid not in self.composite_element_dependencies:
-            child = self.image_elements[uuid]
             data = self.workspace.get_content(uuid, lod=preferred_stride)
-            yield {TASK_DOING: 'Re-tiling', TASK_PROGRESS: 0.5}
-            # FIXME: Use LOD instead of stride and provide the lod to the workspace
-            data = data[::preferred_stride[0], ::preferred_stride[1]]
-            tiles_info, vertices, tex_coords = child.retile(data, preferred_stride, tile_box)
-            yield {TASK_DOING: 'Re-tiling', TASK_PROGRESS: 1.0}
-            self.didRetilingCalcs.emit(uuid, preferred_stride, tile_box, tiles_info, vertices, tex_coords)
-        else:
-            child = self.image_elements[uuid]
-            data = [self.workspace.get_content(d_uuid, lod=preferred_stride) for d_uuid in self.composite_element_dependencies[uuid]]
-            yield {TASK_DOING: 'Re-tiling', TASK_PROGRESS: 0.5}
             # FIXME: Use LOD instead of stride and provide the lod to the workspace
-            data = [d[::int(preferred_stride[0] / factor), ::int(preferred_stride[1] / factor)] if d is not None else None for factor, d in zip(child._channel_factors, data)]
-            tiles_info, vertices, tex_coords = child.retile(data, preferred_stride, tile_box)
-            yield {TASK_DOING: 'Re-tiling', TASK_PROGRESS: 1.0}
-            self.didRetilingCalcs.emit(uuid, preferred_stride, tile_box, tiles_info, vertices, tex_coords)
-        self.workspace.bgnd_task_complete()  # FUTURE: consider a threading context manager for this??
+            return data[::preferred_stride[0], ::preferred_stride[1]]
+        data = [self.workspace.get_content(d_uuid, lod=preferred_stride) for d_uuid in self.composite_element_dependencies[uuid]]
+        # FIXME: Use LOD instead of stride and provide the lod to the workspace
+        return [d[::int(preferred_stride[0] / factor), ::int(preferred_stride[1] / factor)] if d is not None else None for factor, d in zip(child._channel_factors, data)]
 
-    def _set_retiled(self, uuid, preferred_stride, tile_box, tiles_info, vertices, tex_coords):
+    def _retile_child(self, uuid, preferred_stride, tile_box):
+        LOG.debug("Retiling child with UUID: '%s'", uuid)
+        batches = None
+        # a newer retile of this layer closes this generator at a yield, cancelling the remaining extraction
+        try:
+            yield {TASK_DOING: 'Re-tiling', TASK_PROGRESS: 0.0}
+            child = self.image_elements[uuid]
+            generation = child.texture_generation
+            data = self._strided_content(uuid, child, preferred_stride)
+            yield {TASK_DOING: 'Re-tiling', TASK_PROGRESS: 0.1}
+            # deliver tiles as they are extracted, the ones in the middle of the view first
+            batches = child.retile_progressively(data, preferred_stride, tile_box, self._tile_pool)
+            for tiles_info, vertices, tex_coords, done in batches:
+                self.didRetilingCalcs.emit(uuid, preferred_stride, tile_box, tiles_info, vertices, tex_coords, generation)
+                yield {TASK_DOING: 'Re-tiling', TASK_PROGRESS: 0.1 + 0.9 * done}
+                if child.texture_generation != generation:
+                    LOG.debug('atlas of %s resized during retile, abandoning' % uuid)
+                    break
+            else:
+                # queued after the last batch, so it arrives once every tile is in place
+                self.didFinishRetile.emit(uuid, preferred_stride, tile_box, generation)
+            LOG.debug("host tile cache: %r", self.tile_cache.stats)
+        finally:
+            if batches is not None:
+                # hand back atlas tiles planned for tiles that were never delivered
+                batches.close()
+            self.workspace.bgnd_task_complete()  # FUTURE: consider a threading context manager for this??
+
+    def on_view_motion(self, event=None):
+        """While the camera pans or zooms, copy tiles for where it is heading into the host tile cache at low priority,
+        so that retiling after the view settles does not have to page in the content.
+        """
+        now = time.monotonic()
+        if now - self._last_prefetch < PREFETCH_INTERVAL:
+            return
+        pan, zoom = self.pz_camera.predict_motion(PREFETCH_LEAD)
+        if pan == (0., 0.) and zoom == 1.:
+            return
+        self._last_prefetch = now
+        for p, _ in self.document.active_layer_order:
+            element = self.image_elements.get(p.uuid, None) if p.visible else None
+            if element is None:
+                continue
+            try:
+                preferred_stride, tile_box = element.predict_tiles(pan, zoom)
+            except ValueError:
+                continue
+            self.queue.add(str(p.uuid) + "_prefetch", self._prefetch_child(p.uuid, preferred_stride, tile_box),
+                           'Prefetch tiles for image layer ' + str(p.uuid), interactive=False, replace=True)
+
+    def _prefetch_child(self, uuid, preferred_stride, tile_box):
+        try:
+            yield {TASK_DOING: 'Prefetching tiles', TASK_PROGRESS: 0.0}
+            child = self.image_elements.get(uuid, None)
+            if child is not None:
+                # host side only: page in the content here, the retile assigns atlas tiles and uploads
+                data = self._strided_content(uuid, child, preferred_stride)
+                copied = child.prefetch(data, preferred_stride, tile_box)
+                if copied:
+                    LOG.debug("prefetched %d tiles for %s", copied, uuid)
+            yield {TASK_DOING: 'Prefetching tiles', TASK_PROGRESS: 1.0}
+        finally:
+            self.workspace.bgnd_task_complete()
+
+    def _set_retiled(self, uuid, preferred_stride, tile_box, tiles_info, vertices, tex_coords, generation):
         """Slot to take data from background thread and apply it to the layer living in the image layer.
         """
         child = self.image_elements.get(uuid, None)
         if child is None:
             LOG.warning('unable to find uuid %s in image_elements' % uuid)
             return
+        if child.texture_generation != generation:
+            # atlas was resized by the texture budget while this was calculated, it has been reassessed since
+            LOG.debug('dropping retile of %s built for an older texture atlas' % uuid)
+            return
         child.set_retiled(preferred_stride, tile_box, tiles_info, vertices, tex_coords)
         child.update()
 
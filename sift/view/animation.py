@@ -0,0 +1,261 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+animation.py
+~~~~~~~~~~~~
+
+PURPOSE
+Decide which animation frame to show on each timer tick, and account for what playback actually achieved.
+A frame is not advanced past until it has been drawn. With the SKIP policy frames follow the wall clock,
+frames whose time has passed are dropped and counted; with HOLD every frame is shown and the loop slows down instead.
+
+REFERENCES
+
+
+REQUIRES
+
+
+:author: R.K.Garcia <rayg@ssec.wisc.edu>
+:copyright: 2017 by University of Wisconsin Regents, see AUTHORS for more details
+:license: GPLv3, see LICENSE for more details
+"""
+import logging
+import time
+import unittest
+
+LOG = logging.getLogger(__name__)
+
+SKIP = 'skip'  # keep to the wall clock, dropping late frames
+HOLD = 'hold'  # show every frame, stretching the loop under load
+
+
+class FrameScheduler(object):
+    """
+    Frames are counted in a sequence from the start of playback, frame index is sequence modulo the number of frames.
+    tick() is called by the animation timer, drawn() once the frame it asked for is on screen.
+    """
+
+    def __init__(self, interval, policy=SKIP, clock=time.monotonic):
+        """
+        :param interval: seconds per frame
+        :param policy: SKIP or HOLD
+        :param clock: function returning seconds
+        """
+        self.interval = interval
+        self.policy = policy
+        self._clock = clock
+        self._num_frames = 1
+        self._first_frame = 0
+        self._start = None
+        self._seq = 0  # sequence number of the frame last asked for
+        self._requested_at = None  # when the frame last asked for was asked for, None once drawn
+        self._reset_stats()
+
+    def _reset_stats(self):
+        self.frames_shown = 0
+        self.frames_dropped = 0
+        self.ticks_held = 0
+        self._draw_total = 0.
+        self._draw_max = 0.
+        self._latency_total = 0.
+        self._first_shown_at = None
+        self._last_shown_at = None
+
+    @property
+    def running(self):
+        return self._start is not None
+
+    def start(self, frame, num_frames):
+        """
+        begin playback at frame, which is considered on screen already
+        """
+        self._reset_stats()
+        self.rebase(frame, num_frames)
+
+    def rebase(self, frame, num_frames):
+        """
+        continue playback from frame, e.g. after the frame order or interval changed, keeping the statistics
+        """
+        self._start = self._clock()
+        self._first_frame = frame
+        self._num_frames = max(1, num_frames)
+        self._seq = 0
+        self._requested_at = None
+
+    def stop(self):
+        self._start = None
+
+    def tick(self):
+        """
+        :return: index of the frame to show now, or None to leave the screen as it is
+        """
+        if self._start is None:
+            return None
+        if self._requested_at is not None:
+            # the last frame has not been drawn yet, piling more on would only queue up work
+            self.ticks_held += 1
+            return None
+        now = self._clock()
+        if self.policy == HOLD:
+            seq = self._seq + 1
+        else:
+            # timer ticks jitter, a frame is due from half an interval before its time
+            seq = int((now - self._start) / self.interval + 0.5)
+            if seq <= self._seq:
+                # woke up early
+                return None
+            self.frames_dropped += seq - self._seq - 1
+        self._seq = seq
+        self._requested_at = now
+        return (self._first_frame + seq) % self._num_frames
+
+    def drawn(self, draw_seconds):
+        """
+        a frame was drawn, taking draw_seconds including texture uploads
+        draws of anything but the frame asked for by tick() are ignored
+        """
+        if self._requested_at is None:
+            return
+        now = self._clock()
+        self._latency_total += now - self._requested_at
+        self._draw_total += draw_seconds
+        self._draw_max = max(self._draw_max, draw_seconds)
+        if self._first_shown_at is None:
+            self._first_shown_at = now
+        self._last_shown_at = now
+        self.frames_shown += 1
+        self._requested_at = None
+
+    @property
+    def stats(self):
+        """
+        :return: dict of requested and achieved seconds per frame, frames shown and dropped, ticks held,
+                 mean and max draw seconds and mean seconds from tick to drawn
+        """
+        shown = self.frames_shown
+        achieved = None
+        if shown > 1:
+            achieved = (self._last_shown_at - self._first_shown_at) / (shown - 1)
+        return {
+            'requested_interval': self.interval,
+            'achieved_interval': achieved,
+            'frames_shown': shown,
+            'frames_dropped': self.frames_dropped,
+            'ticks_held': self.ticks_held,
+            'mean_draw': self._draw_total / shown if shown else 0.,
+            'max_draw': self._draw_max,
+            'mean_latency': self._latency_total / shown if shown else 0.,
+        }
+
+
+def format_stats(stats):
+    """
+    one line summary of FrameScheduler.stats
+    """
+    achieved = stats['achieved_interval']
+    return '{:.0f} ms per frame requested, {} achieved; {} of {} frames dropped, draw {:.0f} ms mean {:.0f} ms worst'.format(
+        stats['requested_interval'] * 1000.,
+        '{:.0f} ms'.format(achieved * 1000.) if achieved is not None else 'none',
+        stats['frames_dropped'], stats['frames_dropped'] + stats['frames_shown'],
+        stats['mean_draw'] * 1000., stats['max_draw'] * 1000.)
+
+
+class tests(unittest.TestCase):
+
+    def setUp(self):
+        self.now = 0.
+
+    def clock(self):
+        return self.now
+
+    def _run(self, scheduler, draw_seconds, ticks):
+        shown = []
+        for _ in range(ticks):
+            self.now += scheduler.interval
+            frame = scheduler.tick()
+            if frame is not None:
+                shown.append(frame)
+                # drawing finishes this long after the tick
+                self.now += draw_seconds
+                scheduler.drawn(draw_seconds)
+                self.now -= draw_seconds
+        return shown
+
+    def test_keeps_up(self):
+        sched = FrameScheduler(0.03, clock=self.clock)
+        sched.start(2, 4)
+        self.assertEqual(self._run(sched, 0.01, 6), [3, 0, 1, 2, 3, 0])
+        stats = sched.stats
+        self.assertEqual((stats['frames_shown'], stats['frames_dropped'], stats['ticks_held']), (6, 0, 0))
+        self.assertAlmostEqual(stats['achieved_interval'], 0.03)
+        self.assertEqual(format_stats(stats), '30 ms per frame requested, 30 ms achieved; 0 of 6 frames dropped, draw 10 ms mean 10 ms worst')
+
+    def test_jitter(self):
+        # a tick arriving a little early still shows the next frame rather than waiting a whole interval
+        sched = FrameScheduler(0.03, clock=self.clock)
+        sched.start(0, 10)
+        self.now = 0.029
+        self.assertEqual(sched.tick(), 1)
+        sched.drawn(0.001)
+        self.now = 0.061
+        self.assertEqual(sched.tick(), 2)
+        self.assertEqual(sched.frames_dropped, 0)
+
+    def test_skip_under_load(self):
+        # frames take two and a half ticks to draw: every tick that lands mid-draw is held and late frames are dropped
+        sched = FrameScheduler(0.03, clock=self.clock)
+        sched.start(0, 10)
+        shown = []
+        pending = None
+        for _ in range(9):
+            self.now += sched.interval
+            if pending is not None and self.now >= pending:
+                sched.drawn(0.075)
+                pending = None
+            frame = sched.tick()
+            if frame is not None:
+                shown.append(frame)
+                pending = self.now + 0.075
+        self.assertEqual(shown, [1, 4, 7])
+        stats = sched.stats
+        self.assertEqual((stats['frames_shown'], stats['frames_dropped'], stats['ticks_held']), (2, 4, 6))
+        self.assertAlmostEqual(stats['achieved_interval'], 0.09)
+
+    def test_hold_under_load(self):
+        sched = FrameScheduler(0.03, policy=HOLD, clock=self.clock)
+        sched.start(0, 10)
+        shown = []
+        pending = None
+        for _ in range(9):
+            self.now += sched.interval
+            if pending is not None and self.now >= pending:
+                sched.drawn(0.075)
+                pending = None
+            frame = sched.tick()
+            if frame is not None:
+                shown.append(frame)
+                pending = self.now + 0.075
+        self.assertEqual(shown, [1, 2, 3])
+        self.assertEqual(sched.stats['frames_dropped'], 0)
+
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(
+        description="PURPOSE",
+        epilog="",
+        fromfile_prefix_chars='@')
+    parser.add_argument('-v', '--verbose', dest='verbosity', action="count", default=0,
+                        help='each occurrence increases verbosity 1 level through ERROR-WARNING-INFO-DEBUG')
+    args = parser.parse_args()
+
+    levels = [logging.ERROR, logging.WARN, logging.INFO, logging.DEBUG]
+    logging.basicConfig(level=levels[min(3, args.verbosity)])
+
+    unittest.main(argv=[__file__])
+    return 0
+
+
+if __name__ == '__main__':
+    import sys
+    sys.exit(main())
@@ -117,8 +117,10 @@ class CreateAlgebraicDialog(QtGui.QDialog):
         info = {
             INFO.SHORT_NAME: new_name,
         }
+        resolution = 'coarsest' if self.ui.coarsest_check.isChecked() else 'finest'
 
-        self.doc.create_algebraic_composite(operations=operations, namespace=namespace, info=info)
+        self.doc.create_algebraic_composite(operations=operations, namespace=namespace, info=info,
+                                            resolution=resolution)
 
     def done(self, r):
         if r == QtGui.QDialog.Accepted:
@@ -0,0 +1,153 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+preloader.py
+~~~~~~~~~~~~
+
+PURPOSE
+Bookkeeping for preparing animation frames ahead of playback.
+Frames are prepared in playback order starting from the current frame;
+a frame is ready once the tiles of the current view have been delivered to its textures.
+Playback can wait until every frame being preloaded is ready.
+
+REFERENCES
+
+
+REQUIRES
+
+
+:author: R.K.Garcia <rayg@ssec.wisc.edu>
+:copyright: 2017 by University of Wisconsin Regents, see AUTHORS for more details
+:license: GPLv3, see LICENSE for more details
+"""
+import logging
+import unittest
+
+LOG = logging.getLogger(__name__)
+
+
+def playback_order(frame_order, current):
+    """
+    frames in the order they will be shown, starting with the current one
+    """
+    frame_order = list(frame_order or [])
+    if not frame_order:
+        return []
+    current %= len(frame_order)
+    return frame_order[current:] + frame_order[:current]
+
+
+class FramePreloader(object):
+    """
+    Tracks which frames hold the tiles of the view they are wanted for.
+    A target is anything comparable identifying what a frame should hold, e.g. (stride, tile box, atlas generation).
+    """
+
+    def __init__(self):
+        self._targets = {}  # uuid: target the frame is being prepared for
+        self._ready = set()  # uuids holding their target
+        self._order = []  # uuids being preloaded, in playback order
+
+    def update(self, targets):
+        """
+        replace the frames being preloaded
+        :param targets: [(uuid, target, resident), ...] in playback order; resident if the frame already holds target
+        :return: uuids needing preparation, in playback order
+        """
+        previous = self._targets
+        self._targets = {}
+        self._order = []
+        todo = []
+        for uuid, target, resident in targets:
+            self._targets[uuid] = target
+            self._order.append(uuid)
+            if previous.get(uuid) == target:
+                # resident or on its way already
+                continue
+            if resident:
+                self._ready.add(uuid)
+            else:
+                self._ready.discard(uuid)
+                todo.append(uuid)
+        self._ready &= set(self._targets.keys())
+        return todo
+
+    def finished(self, uuid, target):
+        """
+        a frame was given all the tiles of target
+        :return: True if that made the frame ready
+        """
+        if self._targets.get(uuid) != target or uuid in self._ready:
+            return False
+        self._ready.add(uuid)
+        return True
+
+    def forget(self, uuid):
+        self._targets.pop(uuid, None)
+        self._ready.discard(uuid)
+        if uuid in self._order:
+            self._order.remove(uuid)
+
+    def is_ready(self, uuid):
+        return uuid in self._ready
+
+    @property
+    def progress(self):
+        """
+        :return: (frames ready, frames being preloaded)
+        """
+        return len(self._ready), len(self._order)
+
+    @property
+    def all_ready(self):
+        return len(self._ready) == len(self._order)
+
+
+class tests(unittest.TestCase):
+
+    def test_playback_order(self):
+        self.assertEqual(playback_order(['a', 'b', 'c', 'd'], 2), ['c', 'd', 'a', 'b'])
+        self.assertEqual(playback_order([], 3), [])
+
+    def test_readiness(self):
+        pre = FramePreloader()
+        todo = pre.update([('a', 1, True), ('b', 1, False), ('c', 1, False)])
+        self.assertEqual(todo, ['b', 'c'])
+        self.assertEqual(pre.progress, (1, 3))
+        # still on its way, not scheduled again
+        self.assertEqual(pre.update([('a', 1, True), ('b', 1, True), ('c', 1, False)]), [])
+        self.assertFalse(pre.finished('b', 2))
+        self.assertTrue(pre.finished('b', 1))
+        self.assertFalse(pre.finished('b', 1))
+        # the view moved, c is wanted elsewhere and its old retile no longer counts
+        self.assertEqual(pre.update([('a', 1, True), ('b', 1, True), ('c', 2, False)]), ['c'])
+        self.assertFalse(pre.finished('c', 1))
+        self.assertFalse(pre.all_ready)
+        self.assertTrue(pre.finished('c', 2))
+        self.assertTrue(pre.all_ready)
+        pre.forget('a')
+        self.assertEqual(pre.progress, (2, 2))
+        pre.update([('b', 1, True)])
+        self.assertEqual(pre.progress, (1, 1))
+
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(
+        description="PURPOSE",
+        epilog="",
+        fromfile_prefix_chars='@')
+    parser.add_argument('-v', '--verbose', dest='verbosity', action="count", default=0,
+                        help='each occurrence increases verbosity 1 level through ERROR-WARNING-INFO-DEBUG')
+    args = parser.parse_args()
+
+    levels = [logging.ERROR, logging.WARN, logging.INFO, logging.DEBUG]
+    logging.basicConfig(level=levels[min(3, args.verbosity)])
+
+    unittest.main(argv=[__file__])
+    return 0
+
+
+if __name__ == '__main__':
+    import sys
+    sys.exit(main())
@@ -0,0 +1,158 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+texture_budget.py
+~~~~~~~~~~~~~~~~~
+
+PURPOSE
+Share a global GPU texture memory budget among image layers.
+Every layer keeps one atlas tile for its overview; the remainder of the budget
+is handed out in priority order (visible layers, then upcoming animation frames),
+each layer getting at most its full texture atlas.
+
+REFERENCES
+
+
+REQUIRES
+
+
+:author: R.K.Garcia <rayg@ssec.wisc.edu>
+:copyright: 2017 by University of Wisconsin Regents, see AUTHORS for more details
+:license: GPLv3, see LICENSE for more details
+"""
+import logging
+import unittest
+
+LOG = logging.getLogger(__name__)
+
+DEFAULT_TEXTURE_BUDGET = 1024 * 1024 * 1024  # bytes of texture memory for all image layers together
+
+
+def texture_shape_for_tiles(num_tiles, full_shape):
+    """
+    largest atlas shape (rows, cols) in tiles holding no more than num_tiles, and no larger than full_shape
+    """
+    rows, cols = full_shape
+    num_tiles = max(1, min(num_tiles, rows * cols))
+    if num_tiles < cols:
+        return 1, num_tiles
+    return num_tiles // cols, cols
+
+
+class TextureBudget(object):
+    """
+    Bookkeeper for the texture atlases of all image layers.
+    Layers register the size of one atlas tile and their preferred atlas shape;
+    plan() decides how many tiles each layer may hold.
+    """
+
+    def __init__(self, budget_bytes=DEFAULT_TEXTURE_BUDGET):
+        self.budget_bytes = budget_bytes
+        self._layers = {}  # uuid: (bytes per tile, full atlas shape in tiles)
+        self._shapes = {}  # uuid: currently granted atlas shape in tiles
+
+    def register(self, uuid, tile_bytes, full_shape):
+        """
+        add a layer, initially granted its full atlas until the next plan()
+        """
+        self._layers[uuid] = (tile_bytes, tuple(full_shape))
+        self._shapes[uuid] = tuple(full_shape)
+
+    def unregister(self, uuid):
+        self._layers.pop(uuid, None)
+        self._shapes.pop(uuid, None)
+
+    def __contains__(self, uuid):
+        return uuid in self._layers
+
+    def texture_shape(self, uuid):
+        return self._shapes[uuid]
+
+    @property
+    def used_bytes(self):
+        return sum(self._layers[u][0] * s[0] * s[1] for u, s in self._shapes.items())
+
+    def plan(self, priority):
+        """
+        redistribute the budget
+        :param priority: layer UUIDs most important first; registered layers not listed come last
+        :return: {uuid: new atlas shape} for layers whose allocation changed
+        """
+        listed = set()
+        order = []
+        for uuid in priority:
+            if uuid in self._layers and uuid not in listed:
+                listed.add(uuid)
+                order.append(uuid)
+        # unlisted layers holding the most tiles keep them first, to limit reallocation
+        unlisted = [u for u in self._layers.keys() if u not in listed]
+        order += sorted(unlisted, key=lambda u: -self._shapes[u][0] * self._shapes[u][1])
+
+        # everybody keeps their overview tile
+        remaining = self.budget_bytes - sum(tile_bytes for tile_bytes, _ in self._layers.values())
+        if remaining < 0:
+            LOG.warning('texture budget of {} bytes cannot hold the overviews of {} layers'.format(self.budget_bytes, len(self._layers)))
+        changes = {}
+        for uuid in order:
+            tile_bytes, full_shape = self._layers[uuid]
+            extra = 0
+            if remaining > 0 and tile_bytes > 0:
+                extra = min(full_shape[0] * full_shape[1] - 1, int(remaining // tile_bytes))
+            shape = texture_shape_for_tiles(1 + extra, full_shape)
+            remaining -= (shape[0] * shape[1] - 1) * tile_bytes
+            if shape != self._shapes[uuid]:
+                changes[uuid] = shape
+                self._shapes[uuid] = shape
+        if changes:
+            LOG.debug('texture budget reallocated {} layers, {} of {} bytes in use'.format(len(changes), self.used_bytes, self.budget_bytes))
+        return changes
+
+
+class tests(unittest.TestCase):
+
+    def test_shape_for_tiles(self):
+        self.assertEqual(texture_shape_for_tiles(64, (4, 16)), (4, 16))
+        self.assertEqual(texture_shape_for_tiles(100, (4, 16)), (4, 16))
+        self.assertEqual(texture_shape_for_tiles(40, (4, 16)), (2, 16))
+        self.assertEqual(texture_shape_for_tiles(5, (4, 16)), (1, 5))
+        self.assertEqual(texture_shape_for_tiles(0, (4, 16)), (1, 1))
+
+    def test_plan_by_priority(self):
+        mb = 1024 * 1024
+        # room for 100 overviews, one full atlas and one more row of tiles
+        budget = TextureBudget(budget_bytes=(100 + 63 + 15) * mb)
+        for n in range(100):
+            budget.register(n, mb, (4, 16))
+        self.assertEqual(budget.used_bytes, 100 * 64 * mb)
+        budget.plan([5, 6])
+        self.assertEqual(budget.texture_shape(5), (4, 16))
+        self.assertEqual(budget.texture_shape(6), (1, 16))
+        self.assertEqual(budget.texture_shape(0), (1, 1))
+        self.assertLessEqual(budget.used_bytes, budget.budget_bytes)
+        changes = budget.plan([6])
+        self.assertEqual(changes, {6: (4, 16), 5: (1, 16)})
+        budget.unregister(6)
+        self.assertEqual(budget.plan([5])[5], (4, 16))
+        self.assertLessEqual(budget.used_bytes, budget.budget_bytes)
+
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(
+        description="PURPOSE",
+        epilog="",
+        fromfile_prefix_chars='@')
+    parser.add_argument('-v', '--verbose', dest='verbosity', action="count", default=0,
+                        help='each occurrence increases verbosity 1 level through ERROR-WARNING-INFO-DEBUG')
+    args = parser.parse_args()
+
+    levels = [logging.ERROR, logging.WARN, logging.INFO, logging.DEBUG]
+    logging.basicConfig(level=levels[min(3, args.verbosity)])
+
+    unittest.main(argv=[__file__])
+    return 0
+
+
+if __name__ == '__main__':
+    import sys
+    sys.exit(main())
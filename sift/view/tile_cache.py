@@ -0,0 +1,163 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+tile_cache.py
+~~~~~~~~~~~~~
+
+PURPOSE
+Host memory cache of image tiles already copied out of workspace content,
+shared by all image layers so that retiling after a pan or zoom does not page the content in again.
+
+Tiles are keyed by (content id, stride applied to the content, row range, column range),
+so the same region of the same content is shared by a basic layer and the RGB layers built on it.
+
+REFERENCES
+
+
+REQUIRES
+
+
+:author: R.K.Garcia <rayg@ssec.wisc.edu>
+:copyright: 2017 by University of Wisconsin Regents, see AUTHORS for more details
+:license: GPLv3, see LICENSE for more details
+"""
+import logging
+import threading
+import unittest
+from collections import OrderedDict
+
+import numpy as np
+
+LOG = logging.getLogger(__name__)
+
+DEFAULT_HOST_TILE_CACHE_BYTES = 512 * 1024 * 1024
+
+
+class HostTileCache(object):
+    """
+    thread-safe least-recently-used cache of float32 tiles, bounded by total bytes
+    cached tiles are read-only, they may be shared by several layers at once
+    """
+
+    def __init__(self, max_bytes=DEFAULT_HOST_TILE_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._tiles = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._tiles)
+
+    @staticmethod
+    def key(content_id, content_stride, y_slice, x_slice):
+        return content_id, tuple(int(s) for s in content_stride), y_slice.start, y_slice.stop, x_slice.start, x_slice.stop
+
+    def tile(self, content_id, content_stride, data, y_slice, x_slice):
+        """
+        tile data[y_slice, x_slice] as float32, from the cache if possible
+        :param content_id: identifies the content data was strided from
+        :param content_stride: (y, x) stride data was taken from the content with
+        :param data: strided content, typically a memory map
+        """
+        key = self.key(content_id, content_stride, y_slice, x_slice)
+        with self._lock:
+            tile = self._tiles.get(key)
+            if tile is not None:
+                self._tiles.move_to_end(key)
+                self.hits += 1
+                return tile
+            self.misses += 1
+        # copy outside the lock, this is where the content gets paged in
+        tile = np.array(data[y_slice, x_slice], dtype=np.float32)
+        tile.flags.writeable = False
+        self._put(key, tile)
+        return tile
+
+    def _put(self, key, tile):
+        if tile.nbytes > self.max_bytes:
+            return
+        with self._lock:
+            old = self._tiles.pop(key, None)
+            if old is not None:
+                self.nbytes -= old.nbytes
+            self._tiles[key] = tile
+            self.nbytes += tile.nbytes
+            while self.nbytes > self.max_bytes:
+                _, dropped = self._tiles.popitem(last=False)
+                self.nbytes -= dropped.nbytes
+                self.evictions += 1
+
+    def discard(self, content_id):
+        """
+        forget every tile of a content, e.g. when its layer is purged
+        """
+        with self._lock:
+            for key in [k for k in self._tiles.keys() if k[0] == content_id]:
+                self.nbytes -= self._tiles.pop(key).nbytes
+
+    def clear(self):
+        with self._lock:
+            self._tiles.clear()
+            self.nbytes = 0
+
+    @property
+    def stats(self):
+        """
+        :return: dict of hits, misses, evictions, hit_rate, tiles and nbytes
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': float(self.hits) / lookups if lookups else 0.,
+                'tiles': len(self._tiles),
+                'nbytes': self.nbytes,
+            }
+
+
+class tests(unittest.TestCase):
+
+    def test_hits_and_eviction(self):
+        data = np.arange(64 * 64, dtype=np.float64).reshape((64, 64))
+        cache = HostTileCache(max_bytes=2 * 16 * 16 * 4)
+        a = cache.tile('a', (1, 1), data, slice(0, 16), slice(0, 16))
+        self.assertEqual(a.dtype, np.float32)
+        self.assertFalse(a.flags.writeable)
+        self.assertIs(cache.tile('a', (1, 1), data, slice(0, 16), slice(0, 16)), a)
+        # same slices of a different stride or content are different tiles
+        b = cache.tile('a', (2, 2), data[::2, ::2], slice(0, 16), slice(0, 16))
+        self.assertEqual(b[1, 1], data[2, 2])
+        cache.tile('b', (1, 1), data, slice(0, 16), slice(0, 16))
+        stats = cache.stats
+        self.assertEqual((stats['hits'], stats['misses'], stats['evictions'], stats['tiles']), (1, 3, 1, 2))
+        self.assertLessEqual(cache.nbytes, cache.max_bytes)
+        cache.discard('b')
+        self.assertEqual(len(cache), 1)
+        self.assertEqual(cache.nbytes, 16 * 16 * 4)
+
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(
+        description="PURPOSE",
+        epilog="",
+        fromfile_prefix_chars='@')
+    parser.add_argument('-v', '--verbose', dest='verbosity', action="count", default=0,
+                        help='each occurrence increases verbosity 1 level through ERROR-WARNING-INFO-DEBUG')
+    args = parser.parse_args()
+
+    levels = [logging.ERROR, logging.WARN, logging.INFO, logging.DEBUG]
+    logging.basicConfig(level=levels[min(3, args.verbosity)])
+
+    unittest.main(argv=[__file__])
+    return 0
+
+
+if __name__ == '__main__':
+    import sys
+    sys.exit(main())
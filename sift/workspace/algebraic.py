@@ -0,0 +1,620 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+PURPOSE
+Lazily evaluated content for algebraic layers
+ An algebraic product is stored as its expression and symbol table only; pixels are computed
+ for the rows and columns actually requested (typically one strided tile at a time) and kept
+ in a bounded cache of computed tiles
+ Inputs at a coarser resolution than the result are index-mapped instead of being repeated in memory
+ Expressions made of arithmetic and elementwise numpy functions are lowered to a single fused numba ufunc;
+ anything else is run with exec as before
+ Tiles are evaluated single-threaded since callers already spread them over threads; only bulk evaluation uses the
+ multithreaded target, one caller at a time, as numba's workqueue threading layer aborts on concurrent use
+
+REFERENCES
+
+REQUIRES
+ numpy, numba
+
+:author: R.K.Garcia <rkgarcia@wisc.edu>
+:copyright: 2017 by University of Wisconsin Regents, see AUTHORS for more details
+:license: GPLv3, see LICENSE for more details
+"""
+import sys
+import ast
+import logging, unittest
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Mapping, Tuple
+
+import numba as nb
+import numpy as np
+
+LOG = logging.getLogger(__name__)
+
+DEFAULT_TILE_CACHE_BYTES = 256 * 1024 ** 2  # computed tiles kept per algebraic layer
+
+# serializes calls into 'parallel' target kernels
+_PARALLEL_LOCK = threading.Lock()
+
+
+def compile_expression(operations: str):
+    """
+    compile a block of algebraic layer code
+    :param operations: python code whose last statement assigns the result, e.g. 'result = B14 - B13'
+    :return: (code object, name of result variable)
+    """
+    try:
+        ops_ast = ast.parse(operations, mode='exec')
+        ops = compile(ops_ast, '<string>', 'exec')
+        result_name = ops_ast.body[-1].targets[0].id
+    except (SyntaxError, IndexError, AttributeError):
+        raise ValueError("Invalid syntax or operations in algebraic layer")
+    return ops, result_name
+
+
+class _Canonicalize(ast.NodeTransformer):
+    """
+    rename symbols after the products they are bound to, and assigned names after their order of assignment
+    """
+    def __init__(self, namespace):
+        self.namespace = namespace
+        self.assigned = {}
+
+    def visit_Name(self, node):
+        if isinstance(node.ctx, ast.Store):
+            name = self.assigned.setdefault(node.id, '_t{}'.format(len(self.assigned)))
+        elif node.id in self.assigned:
+            name = self.assigned[node.id]
+        elif node.id in self.namespace:
+            name = '_p{}'.format(str(self.namespace[node.id]).replace('-', ''))
+        else:
+            name = node.id
+        return ast.copy_location(ast.Name(id=name, ctx=node.ctx), node)
+
+    def visit_Assign(self, node):
+        # evaluate the right hand side first so that 'x = x * 2' refers to the input
+        node.value = self.visit(node.value)
+        node.targets = [self.visit(t) for t in node.targets]
+        return node
+
+
+def content_key(operations: str, namespace: Mapping, resolution: str = 'finest') -> str:
+    """
+    normalize an algebraic layer request into a key identifying its content
+    the key ignores formatting and the choice of symbol and variable names, so 'result = x - y' with x=B14, y=B13
+    gives the same key as 'diff = b14 - b13' with b14=B14, b13=B13
+    :param namespace: {symbol: input product UUID}
+    :return: hex digest
+    """
+    from hashlib import sha1
+    tree = _Canonicalize(namespace).visit(ast.parse(operations, mode='exec'))
+    text = '{}\n{}'.format(resolution, ast.dump(tree, annotate_fields=False, include_attributes=False))
+    return sha1(text.encode('utf-8')).hexdigest()
+
+
+# numpy functions which can be called elementwise on scalars inside a fused kernel
+KERNEL_FUNCTIONS = {
+    'abs', 'absolute', 'fabs', 'sqrt', 'square', 'exp', 'expm1', 'log', 'log10', 'log2', 'log1p',
+    'sin', 'cos', 'tan', 'arcsin', 'arccos', 'arctan', 'arctan2', 'hypot', 'deg2rad', 'rad2deg', 'radians', 'degrees',
+    'minimum', 'maximum', 'fmin', 'fmax', 'power', 'floor', 'ceil', 'trunc', 'isnan', 'isfinite', 'isinf',
+}
+KERNEL_CONSTANTS = {'nan', 'NaN', 'inf', 'pi', 'e'}
+_BINOPS = {ast.Add: '+', ast.Sub: '-', ast.Mult: '*', ast.Div: '/', ast.Pow: '**', ast.Mod: '%', ast.FloorDiv: '//'}
+_UNARYOPS = {ast.USub: '-', ast.UAdd: '+'}
+_CMPOPS = {ast.Lt: '<', ast.LtE: '<=', ast.Gt: '>', ast.GtE: '>=', ast.Eq: '==', ast.NotEq: '!='}
+_NUMPY_NAMES = {'np', 'numpy'}
+
+
+class _NotLowerable(Exception):
+    pass
+
+
+def _literal(node):
+    """
+    :return: (True, value) if node is a literal, else (False, None)
+    before Python 3.8 literals parse as ast.Num and ast.NameConstant rather than ast.Constant
+    """
+    if isinstance(node, ast.Constant):
+        return True, node.value
+    if sys.version_info < (3, 8):
+        if isinstance(node, ast.Num):
+            return True, node.n
+        if isinstance(node, ast.NameConstant):
+            return True, node.value
+    return False, None
+
+
+class _Lowering(object):
+    """
+    translate the statements of an algebraic code block into one scalar python expression
+    temporaries are substituted into later statements so the whole block becomes a single kernel
+    """
+    def __init__(self):
+        self.inputs = []  # symbol names in order of first use, these become kernel arguments
+        self.temps = {}  # assigned name: lowered expression text
+
+    def arg(self, name):
+        if name not in self.inputs:
+            self.inputs.append(name)
+        return '_a{}'.format(self.inputs.index(name))
+
+    def emit(self, node):
+        is_literal, value = _literal(node)
+        if is_literal:
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                return repr(float(value))
+            raise _NotLowerable(ast.dump(node))
+        if isinstance(node, ast.Name):
+            if node.id in self.temps:
+                return self.temps[node.id]
+            if node.id in _NUMPY_NAMES:
+                raise _NotLowerable(node.id)
+            return self.arg(node.id)
+        if isinstance(node, ast.Attribute):
+            if isinstance(node.value, ast.Name) and node.value.id in _NUMPY_NAMES and node.attr in KERNEL_CONSTANTS:
+                return 'np.{}'.format(node.attr)
+            raise _NotLowerable(ast.dump(node))
+        if isinstance(node, ast.BinOp) and type(node.op) in _BINOPS:
+            return '({} {} {})'.format(self.emit(node.left), _BINOPS[type(node.op)], self.emit(node.right))
+        if isinstance(node, ast.UnaryOp) and type(node.op) in _UNARYOPS:
+            return '({}{})'.format(_UNARYOPS[type(node.op)], self.emit(node.operand))
+        if isinstance(node, ast.Compare) and len(node.ops) == 1 and type(node.ops[0]) in _CMPOPS:
+            return '({} {} {})'.format(self.emit(node.left), _CMPOPS[type(node.ops[0])], self.emit(node.comparators[0]))
+        if isinstance(node, ast.Call) and not node.keywords:
+            args = [self.emit(x) for x in node.args]
+            func = node.func
+            if isinstance(func, ast.Name) and func.id == 'abs' and len(args) == 1:
+                return 'abs({})'.format(args[0])
+            if isinstance(func, ast.Attribute) and isinstance(func.value, ast.Name) and func.value.id in _NUMPY_NAMES:
+                if func.attr == 'where' and len(args) == 3:
+                    return '({1} if {0} else {2})'.format(*args)
+                if func.attr in KERNEL_FUNCTIONS:
+                    return 'np.{}({})'.format(func.attr, ', '.join(args))
+        raise _NotLowerable(ast.dump(node))
+
+    def lower(self, operations):
+        body = ast.parse(operations, mode='exec').body
+        expr = None
+        for stmt in body:
+            if not (isinstance(stmt, ast.Assign) and len(stmt.targets) == 1 and isinstance(stmt.targets[0], ast.Name)):
+                raise _NotLowerable(ast.dump(stmt))
+            expr = self.temps[stmt.targets[0].id] = self.emit(stmt.value)
+        if expr is None:
+            raise _NotLowerable(operations)
+        return expr
+
+
+class ExpressionKernel(object):
+    """
+    algebraic code block compiled into one numba ufunc
+    evaluates in a single pass over the inputs without full-size temporaries
+    """
+    def __init__(self, operations: str, target: str = 'cpu'):
+        """
+        :param target: numba vectorize target; 'cpu' is safe to call from any number of threads,
+                       'parallel' uses all cores and is called by one thread at a time
+        """
+        lowering = _Lowering()
+        expr = lowering.lower(operations)
+        self.target = target
+        self.inputs = tuple(lowering.inputs)
+        args = ', '.join('_a{}'.format(i) for i in range(len(self.inputs)))
+        self.source = 'def _kernel({}):\n    return {}\n'.format(args, expr)
+        ns = {'np': np}
+        exec(compile(self.source, '<algebraic kernel>', 'exec'), ns)
+        sigs = ['{0}({1})'.format(t, ', '.join([t] * len(self.inputs))) for t in ('float32', 'float64')]
+        self._ufunc = nb.vectorize(sigs, target=target)(ns['_kernel'])
+
+    def __call__(self, namespace: Mapping[str, np.ndarray]) -> np.ndarray:
+        args = [np.asarray(namespace[name]) for name in self.inputs]
+        dtype = np.float64 if any(a.dtype == np.float64 for a in args) else np.float32
+        args = [a.astype(dtype, copy=False) for a in args]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            if self.target != 'parallel':
+                return self._ufunc(*args)
+            with _PARALLEL_LOCK:
+                return self._ufunc(*args)
+
+
+@lru_cache(maxsize=64)
+def compile_kernel(operations: str, target: str = 'cpu'):
+    """
+    compiled kernels are kept and shared by every evaluation of the same code block
+    :return: ExpressionKernel for the code block, or None if it uses constructs which cannot be fused
+    """
+    try:
+        kernel = ExpressionKernel(operations, target)
+    except _NotLowerable as unsupported:
+        LOG.debug("algebraic expression will be interpreted, cannot fuse {}".format(unsupported))
+        return None
+    except Exception:
+        LOG.warning("failed to compile algebraic expression, it will be interpreted", exc_info=True)
+        return None
+    if not kernel.inputs:
+        return None
+    return kernel
+
+
+def evaluate_expression(operations: str, namespace: Mapping[str, np.ndarray], target: str = 'cpu'):
+    """
+    evaluate an algebraic code block over a namespace of arrays, preferring a fused compiled kernel
+    :return: the value assigned to the result variable
+    """
+    ops, result_name = compile_expression(operations)
+    kernel = compile_kernel(operations, target)
+    if kernel is not None and all(name in namespace for name in kernel.inputs):
+        return kernel(namespace)
+    ns = dict(namespace)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        exec(ops, None, ns)
+    if result_name not in ns:
+        raise RuntimeError("Unable to retrieve result '{}' from code execution".format(result_name))
+    return ns[result_name]
+
+
+class TileCache(object):
+    """
+    thread-safe least-recently-used cache of computed arrays, bounded by total bytes
+    """
+    def __init__(self, max_bytes: int = DEFAULT_TILE_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self._tiles = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._tiles)
+
+    def get(self, key):
+        with self._lock:
+            tile = self._tiles.get(key)
+            if tile is not None:
+                self._tiles.move_to_end(key)
+            return tile
+
+    def put(self, key, tile: np.ndarray):
+        if tile.nbytes > self.max_bytes:
+            return
+        with self._lock:
+            old = self._tiles.pop(key, None)
+            if old is not None:
+                self.nbytes -= old.nbytes
+            self._tiles[key] = tile
+            self.nbytes += tile.nbytes
+            while self.nbytes > self.max_bytes:
+                _, dropped = self._tiles.popitem(last=False)
+                self.nbytes -= dropped.nbytes
+
+    def clear(self):
+        with self._lock:
+            self._tiles.clear()
+            self.nbytes = 0
+
+
+def _axis_selector(rng: range, factor: int):
+    """
+    translate a range of output indices into an index expression on one axis of an input
+    :param factor: positive if the input is that many times coarser than the output, negative if finer
+    :return: a slice (a view, no copy) where possible, otherwise an index array replicating coarse cells
+    """
+    if factor < 0 and rng.step > 0:
+        return slice(rng.start * -factor, rng.stop * -factor, rng.step * -factor)
+    if factor == 1 and rng.step > 0:
+        return slice(rng.start, rng.stop, rng.step)
+    if factor < 0:
+        return np.arange(rng.start, rng.stop, rng.step) * -factor
+    return np.arange(rng.start, rng.stop, rng.step) // factor
+
+
+def _axis_factor(out_size: int, in_size: int):
+    """
+    :return: integer factor for _axis_selector, or None if one size is not a multiple of the other
+    """
+    if in_size <= out_size:
+        f = out_size // in_size if in_size else 0
+        return f if f and f * in_size == out_size else None
+    f = in_size // out_size if out_size else 0
+    return -f if f and f * out_size == in_size else None
+
+
+class AlgebraicContent(object):
+    """
+    expression over a namespace of 2D input arrays, evaluated on demand for regions of the full-resolution result
+    stands in for ActiveContent in the workspace; .data is an AlgebraicArray covering the whole result
+    """
+    dtype = np.dtype(np.float32)
+
+    def __init__(self, operations: str, inputs: Mapping[str, np.ndarray], shape: Tuple[int, int] = None,
+                 cache_bytes: int = DEFAULT_TILE_CACHE_BYTES, target: str = 'cpu'):
+        """
+        :param operations: algebraic layer code block
+        :param inputs: {symbol: 2D array-like}; arrays may be memmaps at any integer multiple or fraction of the result resolution
+        :param shape: shape of the result, defaulting to the largest input
+        :param cache_bytes: budget for computed tiles
+        :param target: numba target for the fused kernel, tiles are typically evaluated from several threads at once
+        """
+        self.operations = operations
+        self.target = target
+        compile_expression(operations)  # fail early on bad syntax
+        self._inputs = dict(inputs)
+        self.shape = tuple(shape or max((v.shape for v in self._inputs.values()), default=(0, 0)))
+        self._factors = {}
+        for name, v in self._inputs.items():
+            f0, f1 = _axis_factor(self.shape[0], v.shape[0]), _axis_factor(self.shape[1], v.shape[1])
+            if f0 is None or f1 is None:
+                raise ValueError("input '{}' shape {} is not an integer multiple or fraction of result shape {}".format(name, v.shape, self.shape))
+            self._factors[name] = (f0, f1)
+        self.cache = TileCache(cache_bytes)
+
+    @property
+    def data(self):
+        return AlgebraicArray(self, range(self.shape[0]), range(self.shape[1]))
+
+    def _namespace(self, rows: range, cols: range):
+        ns = {}
+        for name, v in self._inputs.items():
+            f0, f1 = self._factors[name]
+            ys, xs = _axis_selector(rows, f0), _axis_selector(cols, f1)
+            # index one axis at a time so that two index arrays select a block rather than a diagonal
+            ns[name] = v[ys][:, xs]
+        return ns
+
+    def evaluate(self, rows: range, cols: range, cache: bool = True, target: str = None) -> np.ndarray:
+        """
+        compute (or fetch from the tile cache) the result for the given output rows and columns
+        :param cache: keep the result in the tile cache; bulk evaluation passes False to leave display tiles in place
+        :param target: numba target overriding the content's own, for bulk evaluation
+        :return: read-only float32 array of shape (len(rows), len(cols))
+        """
+        key = (rows, cols)
+        tile = self.cache.get(key)
+        if tile is not None:
+            return tile
+        zult = evaluate_expression(self.operations, self._namespace(rows, cols), target or self.target)
+        if isinstance(zult, np.ma.MaskedArray):
+            zult = np.ma.filled(zult.astype(np.float32), np.nan)
+        zult = np.asarray(zult, dtype=np.float32)
+        shape = (len(rows), len(cols))
+        if zult.shape != shape:
+            zult = np.broadcast_to(zult, shape).copy()
+        zult.flags.writeable = False
+        if cache:
+            self.cache.put(key, zult)
+        return zult
+
+
+def evaluate_into(content: AlgebraicContent, out: np.ndarray, chunk_bytes: int, target: str = None):
+    """
+    evaluate all of an algebraic content into an output array in row blocks of about chunk_bytes
+    peak memory is bounded by the block size rather than the image size
+    :param target: numba target for the row blocks, 'parallel' spreads each block over all cores
+    :return: generator yielding fraction completed after each block
+    """
+    rows, cols = content.shape
+    chunk_rows = max(1, chunk_bytes // max(1, cols * content.dtype.itemsize))
+    for r0 in range(0, rows, chunk_rows):
+        r1 = min(rows, r0 + chunk_rows)
+        out[r0:r1] = content.evaluate(range(r0, r1), range(cols), cache=False, target=target)
+        yield float(r1) / rows
+
+
+def materialize_to_file(operations: str, inputs: Mapping[str, Tuple[str, str, Tuple[int, int]]],
+                        shape: Tuple[int, int], out_path: str, chunk_bytes: int):
+    """
+    process pool entry point: evaluate an algebraic layer from input files into a new flat float32 file
+    each worker process compiles a given expression once and reuses the kernel for every time step it is handed
+    :param inputs: {symbol: (path, dtype, shape)} of input memmap files
+    :return: out_path
+    """
+    arrays = {name: np.memmap(path, dtype=dtype, mode='r', shape=tuple(shp)) for name, (path, dtype, shp) in inputs.items()}
+    content = AlgebraicContent(operations, arrays, shape=shape, cache_bytes=0, target='cpu')
+    with open(out_path, 'wb+') as fp:
+        out = np.memmap(fp, dtype=np.float32, mode='w+', shape=tuple(shape))
+    for _ in evaluate_into(content, out, chunk_bytes):
+        pass
+    out.flush()
+    del out
+    return out_path
+
+
+class AlgebraicArray(object):
+    """
+    read-only, array-like strided view of an AlgebraicContent
+    basic slicing composes views without computing anything; numpy conversion evaluates only the viewed region
+    """
+    ndim = 2
+
+    def __init__(self, content: AlgebraicContent, rows: range, cols: range):
+        self._content = content
+        self._rows = rows
+        self._cols = cols
+
+    @property
+    def dtype(self):
+        return self._content.dtype
+
+    @property
+    def shape(self):
+        return len(self._rows), len(self._cols)
+
+    @property
+    def size(self):
+        return len(self._rows) * len(self._cols)
+
+    @property
+    def nbytes(self):
+        return self.size * self.dtype.itemsize
+
+    def __len__(self):
+        return len(self._rows)
+
+    def __repr__(self):
+        return "<AlgebraicArray {} rows={} cols={}>".format(self.shape, self._rows, self._cols)
+
+    def __array__(self, dtype=None, copy=None):
+        zult = self._content.evaluate(self._rows, self._cols)
+        return zult if dtype is None else zult.astype(dtype)
+
+    def astype(self, dtype):
+        return np.array(self, dtype=dtype)
+
+    def _block(self, ys, xs):
+        """
+        evaluate the bounding block of integer index arrays, returning (block, ys, xs relative to the block)
+        """
+        ys, xs = np.asarray(ys), np.asarray(xs)
+        if ys.size == 0 or xs.size == 0:
+            return np.empty((0, 0), dtype=self.dtype), ys, xs
+        ys = np.where(ys < 0, ys + len(self._rows), ys)
+        xs = np.where(xs < 0, xs + len(self._cols), xs)
+        y0, y1, x0, x1 = ys.min(), ys.max() + 1, xs.min(), xs.max() + 1
+        block = self._content.evaluate(self._rows[y0:y1], self._cols[x0:x1])
+        return block, ys - y0, xs - x0
+
+    def __getitem__(self, index):
+        key = index if isinstance(index, tuple) else (index,)
+        if any(k is Ellipsis for k in key):
+            at = key.index(Ellipsis)
+            key = key[:at] + (slice(None),) * (2 - len(key) + 1) + key[at + 1:]
+        key = key + (slice(None),) * (2 - len(key))
+        if len(key) != 2:
+            raise IndexError("too many indices for 2D algebraic content")
+        ky, kx = key
+        scalar_types = (int, np.integer)
+        if isinstance(ky, (slice,) + scalar_types) and isinstance(kx, (slice,) + scalar_types):
+            rows = self._rows[ky] if isinstance(ky, slice) else range(self._rows[ky], self._rows[ky] + 1)
+            cols = self._cols[kx] if isinstance(kx, slice) else range(self._cols[kx], self._cols[kx] + 1)
+            view = AlgebraicArray(self._content, rows, cols)
+            if isinstance(ky, slice) and isinstance(kx, slice):
+                return view
+            zult = np.asarray(view)
+            return zult[0 if isinstance(ky, scalar_types) else slice(None),
+                        0 if isinstance(kx, scalar_types) else slice(None)]
+        if not isinstance(ky, slice) and not isinstance(kx, slice):
+            ky, kx = np.asarray(ky), np.asarray(kx)
+            if ky.dtype.kind in 'iu' and kx.dtype.kind in 'iu':
+                block, ys, xs = self._block(ky, kx)
+                return block[ys, xs]
+        # boolean masks and mixed fancy indexing evaluate the whole view
+        return np.asarray(self)[index]
+
+
+class tests(unittest.TestCase):
+
+    def setUp(self):
+        self.a = np.arange(64, dtype=np.float32).reshape(8, 8)
+        self.b = np.arange(16, dtype=np.float32).reshape(4, 4)  # half resolution
+        self.content = AlgebraicContent('result = a - b', {'a': self.a, 'b': self.b})
+        self.expected = self.a - np.repeat(np.repeat(self.b, 2, axis=0), 2, axis=1)
+
+    def test_views(self):
+        data = self.content.data
+        self.assertEqual(data.shape, (8, 8))
+        self.assertEqual(len(self.content.cache), 0)
+        tile = data[::2, 1::3][1:, :]
+        self.assertEqual(tile.shape, (3, 3))
+        self.assertEqual(len(self.content.cache), 0)  # slicing does not evaluate
+        np.testing.assert_array_equal(np.asarray(tile), self.expected[::2, 1::3][1:, :])
+        self.assertEqual(len(self.content.cache), 1)
+        self.assertEqual(data[5, 3], self.expected[5, 3])
+        np.testing.assert_array_equal(data[2], self.expected[2])
+        np.testing.assert_array_equal(np.asarray(data), self.expected)
+
+    def test_coarsest(self):
+        content = AlgebraicContent('result = a - b', {'a': self.a, 'b': self.b}, shape=self.b.shape)
+        np.testing.assert_array_equal(np.asarray(content.data), self.a[::2, ::2] - self.b)
+        np.testing.assert_array_equal(np.asarray(content.data[1::2, :3]), (self.a[::2, ::2] - self.b)[1::2, :3])
+        with self.assertRaises(ValueError):
+            AlgebraicContent('result = a', {'a': self.a}, shape=(3, 8))
+
+    def test_content_key(self):
+        from uuid import uuid1
+        b14, b13 = uuid1(), uuid1()
+        key = content_key('result = x - y', {'x': b14, 'y': b13})
+        self.assertEqual(key, content_key('diff  =  b14-b13', {'b14': b14, 'b13': b13}))
+        self.assertNotEqual(key, content_key('result = x - y', {'x': b13, 'y': b14}))
+        self.assertNotEqual(key, content_key('result = x - y', {'x': b14, 'y': b13}, resolution='coarsest'))
+        self.assertEqual(content_key('t = x * 2\nx = t + y', {'x': b14, 'y': b13}),
+                         content_key('a = p * 2\nq = a + r', {'p': b14, 'r': b13}))
+
+    def test_materialize(self):
+        from tempfile import TemporaryDirectory
+        import os
+        with TemporaryDirectory() as tmp:
+            inputs = {}
+            for name, v in (('a', self.a), ('b', self.b)):
+                path = os.path.join(tmp, name + '.data')
+                v.tofile(path)
+                inputs[name] = (path, 'float32', v.shape)
+            out_path = materialize_to_file('result = a - b', inputs, (8, 8), os.path.join(tmp, 'out.data'), 4 * 8 * 3)
+            result = np.fromfile(out_path, dtype=np.float32).reshape(8, 8)
+            np.testing.assert_array_equal(result, self.expected)
+
+    def test_fancy(self):
+        ys, xs = np.array([1, 6, 3]), np.array([7, 0, 2])
+        np.testing.assert_array_equal(self.content.data[ys, xs], self.expected[ys, xs])
+        mask = self.expected > 10
+        np.testing.assert_array_equal(self.content.data[mask], self.expected[mask])
+
+    def test_kernel(self):
+        ops = 'd = a - b\nresult = np.where(np.isnan(d), -1, d / (a + b + np.nan * 0))'
+        kernel = compile_kernel(ops)
+        self.assertIsNotNone(kernel)
+        self.assertEqual(kernel.inputs, ('a', 'b'))
+        a = np.array([1, 0, np.nan, 2], dtype=np.float32)
+        b = np.array([1, 0, 1, -2], dtype=np.float32)
+        ns = {'a': a, 'b': b}
+        expected = dict(ns)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            exec(ops, None, expected)
+        np.testing.assert_array_equal(kernel(ns), expected['result'])
+        self.assertEqual(kernel(ns).dtype, np.float32)
+        self.assertIsNone(compile_kernel('result = np.ma.masked_less(a, 0)'))
+        # numeric literals are fused whatever node type the running python parses them to
+        scaled = compile_kernel('result = (a - b) / 100.')
+        self.assertIsNotNone(scaled)
+        np.testing.assert_allclose(scaled(ns), (a - b) / 100.)
+        np.testing.assert_array_equal(evaluate_expression('result = np.ma.masked_less(a, 0)', ns), a)
+
+    def test_threads(self):
+        from concurrent.futures import ThreadPoolExecutor
+        content = AlgebraicContent('result = (a - b) / 2.', {'a': self.a, 'b': self.b}, cache_bytes=0)
+        tiles = [(range(r, r + 2), range(c, c + 4)) for r in range(0, 8, 2) for c in range(0, 8, 4)] * 8
+        with ThreadPoolExecutor(8) as pool:
+            zult = list(pool.map(lambda rc: content.evaluate(*rc), tiles))
+        for (rows, cols), tile in zip(tiles, zult):
+            np.testing.assert_array_equal(tile, self.expected[rows.start:rows.stop, cols.start:cols.stop] / 2.)
+        out = np.empty((8, 8), dtype=np.float32)
+        for _ in evaluate_into(content, out, 4 * 8 * 3, target='parallel'):
+            pass
+        np.testing.assert_array_equal(out, self.expected / 2.)
+
+    def test_cache_budget(self):
+        content = AlgebraicContent('result = a * 2', {'a': self.a}, cache_bytes=2 * 4 * 8)
+        for row in range(4):
+            np.asarray(content.data[row:row + 1, :])
+        self.assertEqual(len(content.cache), 2)
+        self.assertLessEqual(content.cache.nbytes, 2 * 4 * 8)
+
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(
+        description="test lazily evaluated algebraic content",
+        epilog="",
+        fromfile_prefix_chars='@')
+    parser.add_argument('-v', '--verbose', dest='verbosity', action="count", default=0,
+                        help='each occurrence increases verbosity 1 level through ERROR-WARNING-INFO-DEBUG')
+    args = parser.parse_args()
+
+    levels = [logging.ERROR, logging.WARN, logging.INFO, logging.DEBUG]
+    logging.basicConfig(level=levels[min(3, args.verbosity)])
+    unittest.main(argv=sys.argv[:1])
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -19,16 +19,106 @@ REQUIRES
 :copyright: 2017 by University of Wisconsin Regents, see AUTHORS for more details
 :license: GPLv3, see LICENSE for more details
 """
-import os, sys
+import os, sys, re
 import logging, unittest
 from abc import ABC, abstractmethod, abstractproperty
-from typing import Union, Set, List, Iterable
-from .metadatabase import Product, Metadatabase, Resource
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from datetime import datetime, timedelta
+from typing import Union, Set, List, Iterable, Mapping, Tuple, Callable, Optional
+from uuid import uuid1
+from sift.common import INFO, KIND, PLATFORM, INSTRUMENT
+from .metadatabase import Product, Metadatabase, Resource, ProductsFromResources
 from sqlalchemy.orm import Session
-from .goesr_pug import PugL1bTools
 
 LOG = logging.getLogger(__name__)
 
+HUNTER_THREADS = 8  # directory listing is I/O bound, so threads overlap well despite the GIL
+SQL_IN_CHUNK = 500  # stay well below sqlite's bound-parameter limit in IN() clauses
+
+# skim result: (importer class as "module:qualname", product info dictionary)
+skim_result = Tuple[str, Mapping]
+
+
+#
+# filename conventions
+#
+
+# e.g. OR_ABI-L1b-RadF-M3C01_G16_s20171231200382_e20171231211149_c20171231211192.nc
+RE_ABI = re.compile(r'OR_ABI-L(?:1b|2)-(?:Rad|CMIP)(F|C|M1|M2)-M(\d)C(\d\d)_G(\d\d)'
+                    r'_s(\d{13})(\d)_e(\d{13})(\d)_c\d+\.nc4?$')
+# e.g. HS_H08_20150714_0030_B10_FLDK_R20.merc.tif
+RE_AHI = re.compile(r'HS_H(\d\d)_(\d{8})_(\d{4})_B(\d\d)_([A-Za-z0-9]+).*\.tif{1,2}$')
+
+# ABI filename scene letter to the scene_id attribute used inside the files
+ABI_SCENES = {
+    'F': 'Full Disk',
+    'C': 'CONUS',
+    'M1': 'Mesoscale',
+    'M2': 'Mesoscale',
+}
+
+AHI_GTIFF_OBS_DURATION = timedelta(seconds=60)  # matches the GeoTIFF importer default
+
+
+def _abi_time(yyyyjjjhhmmss, tenths):
+    return datetime.strptime(yyyyjjjhhmmss, '%Y%j%H%M%S') + timedelta(seconds=int(tenths) / 10.0)
+
+
+def skim_abi_filename(filename) -> Optional[skim_result]:
+    """
+    classify a GOES-R ABI netCDF file by its name alone
+    scheduled time is approximated by the start time to the minute; the importer refines it from file content
+    :param filename: base name of the file
+    :return: (importer, info) or None if the name does not follow the ABI convention
+    """
+    m = RE_ABI.match(filename)
+    if m is None:
+        return None
+    scene, _, band, goes, start, start_tenths, end, end_tenths = m.groups()
+    obs_time = _abi_time(start, start_tenths)
+    try:
+        platform = PLATFORM('G{}'.format(goes))
+    except ValueError:
+        platform = 'G{}'.format(goes)
+    return 'sift.workspace.importer:GoesRPUGImporter', {
+        INFO.SHORT_NAME: 'B{:02d}'.format(int(band)),
+        INFO.DATASET_NAME: filename,
+        INFO.KIND: KIND.IMAGE,
+        INFO.PLATFORM: platform,
+        INFO.INSTRUMENT: INSTRUMENT.ABI,
+        INFO.BAND: int(band),
+        INFO.SCENE: ABI_SCENES[scene],
+        INFO.SCHED_TIME: obs_time.replace(second=0, microsecond=0),
+        INFO.OBS_TIME: obs_time,
+        INFO.OBS_DURATION: _abi_time(end, end_tenths) - obs_time,
+    }
+
+
+def skim_ahi_filename(filename) -> Optional[skim_result]:
+    """
+    classify an AHI GeoTIFF file by its name alone, using the same convention as the GeoTIFF importer
+    :param filename: base name of the file
+    :return: (importer, info) or None if the name does not follow the AHI convention
+    """
+    m = RE_AHI.match(filename)
+    if m is None:
+        return None
+    plat, yyyymmdd, hhmm, bb, scene = m.groups()
+    when = datetime.strptime(yyyymmdd + hhmm, '%Y%m%d%H%M')
+    return 'sift.workspace.importer:GeoTiffImporter', {
+        INFO.SHORT_NAME: 'B{}'.format(bb),
+        INFO.DATASET_NAME: filename,
+        INFO.KIND: KIND.IMAGE,
+        INFO.PLATFORM: PLATFORM('Himawari-{}'.format(int(plat))),
+        INFO.INSTRUMENT: INSTRUMENT.AHI,
+        INFO.BAND: int(bb),
+        INFO.SCENE: scene,
+        INFO.SCHED_TIME: when,
+        INFO.OBS_TIME: when,
+        INFO.OBS_DURATION: AHI_GTIFF_OBS_DURATION,
+    }
+
+
 class aHunter(ABC):
     """
     Hunter scans one or locations for metadata
@@ -50,83 +140,194 @@ class aHunter(ABC):
         """
 
     @abstractmethod
-    def hunt_dir(self, S: Session, dir_path:str) -> int:
+    def hunt_dir(self, S: Session, dir_path:str, recurse_levels: Optional[int] = 0) -> int:
         return 0
 
     @abstractmethod
     def hunt_file(self, S: Session, file_path:str) -> int:
         return 0
 
-    def hunt_seq(self, S: Session, seq: Iterable[str]) -> int:
+    def hunt_seq(self, S: Session, seq: Iterable[str], recurse_levels: Optional[int] = 0) -> int:
         found = 0
         for path in seq:
             if os.path.isfile(path):
                 found += self.hunt_file(S, path)
             elif os.path.isdir(path):
-                found += self.hunt_dir(S, path)
+                found += self.hunt_dir(S, path, recurse_levels)
             else:
                 raise ValueError('Unknown content: {}'.format(path))
         return found
 
-    def hunt(self, directory_glob_path: Union[str, Iterable[str]], recurse_levels: int = 0) -> int:
+    def hunt(self, directory_glob_path: Union[str, Iterable[str]], recurse_levels: Optional[int] = 0) -> int:
         """
         scan a file or a directory for metadata, and update the metadatabase
         Args:
             directory_or_file_path:
-            recurse_levels:
+            recurse_levels: how many levels of subdirectories to descend, None for no limit
 
         Returns:
             count (int): number of products found
         """
         S = self._DB.session()
-        if isinstance(directory_glob_path, str):
-            if os.path.isfile(directory_glob_path):
-                found = self.hunt_file(S, directory_glob_path)
-            elif os.path.isdir(directory_glob_path):
-                found = self.hunt_dir(S, directory_glob_path)
-        else:
-            found = self.hunt_seq(S, directory_glob_path)
-        if found:
-            S.commit()
+        try:
+            if isinstance(directory_glob_path, str):
+                directory_glob_path = [directory_glob_path]
+            found = self.hunt_seq(S, directory_glob_path, recurse_levels)
+            if found:
+                S.commit()
+        except:
+            S.rollback()
+            raise
+        finally:
+            S.close()
+        return found
 
 
-class GoesRHunter(aHunter):
+class aFilenameHunter(aHunter):
+    """
+    Hunter which classifies files by name alone and never opens them
+    Directories are listed in parallel using os.scandir, and new files are registered with bulk inserts,
+    leaving the importer to fill in the remaining metadata if and when the user asks for the content
+    """
+    SKIMMERS: Tuple[Callable[[str], Optional[skim_result]]] = ()
 
-    def get_metadata(self, dest_uuid, source_path=None, source_uri=None, cache_path=None, **kwargs):
+    def __init__(self, db: Metadatabase, threads=HUNTER_THREADS):
+        super(aFilenameHunter, self).__init__(db)
+        self._threads = threads
 
-        d = {}
-        # nc = nc4.Dataset(source_path)
-        pug = PugL1bTools(source_path)
+    def skim(self, filename) -> Optional[skim_result]:
+        """
+        :param filename: base name of a file
+        :return: (importer, info) from the first skimmer recognizing the name, else None
+        """
+        for skimmer in self.SKIMMERS:
+            zult = skimmer(filename)
+            if zult is not None:
+                return zult
+        return None
+
+    def _scan_dir(self, dir_path):
+        """
+        list a single directory, classifying its files
+        :return: ([(path, mtime, importer, info), ...], [subdirectory, ...])
+        """
+        files, subdirs = [], []
+        try:
+            with os.scandir(dir_path) as entries:
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        subdirs.append(entry.path)
+                        continue
+                    zult = self.skim(entry.name)
+                    if zult is None or not entry.is_file():
+                        continue
+                    importer, info = zult
+                    files.append((entry.path, entry.stat().st_mtime, importer, info))
+        except OSError as oops:
+            LOG.warning('unable to scan {}: {}'.format(dir_path, oops))
+        return files, subdirs
+
+    def scan(self, dir_path, recurse_levels: Optional[int] = 0):
+        """
+        walk a directory tree listing directories concurrently
+        :param dir_path: top directory
+        :param recurse_levels: how many levels of subdirectories to descend, None for no limit
+        :return: list of (path, mtime, importer, info) for recognized files
+        """
+        found = []
+        with ThreadPoolExecutor(max_workers=self._threads) as pool:
+            pending = {pool.submit(self._scan_dir, os.path.abspath(dir_path)): 0}
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    level = pending.pop(future)
+                    files, subdirs = future.result()
+                    found.extend(files)
+                    if recurse_levels is None or level < recurse_levels:
+                        for subdir in subdirs:
+                            pending[pool.submit(self._scan_dir, subdir)] = level + 1
+        return found
+
+    @staticmethod
+    def _chunks(seq, n=SQL_IN_CHUNK):
+        seq = list(seq)
+        for i in range(0, len(seq), n):
+            yield seq[i:i + n]
 
-        d.update(self._metadata_for_abi_path(pug))
-        d[INFO.UUID] = dest_uuid
-        d[INFO.DATASET_NAME] = os.path.split(source_path)[-1]
-        d[INFO.PATHNAME] = source_path
-        d[INFO.KIND] = KIND.IMAGE
+    def register(self, S: Session, found) -> int:
+        """
+        bulk-insert Resources and Products for files not already in the metadatabase
+        :param S: session to insert with, caller commits
+        :param found: sequence of (path, mtime, importer, info) from scan()
+        :return: number of new products registered
+        """
+        by_path = dict((path, (mtime, importer, info)) for path, mtime, importer, info in found)
+        for paths in self._chunks(by_path.keys()):
+            for (path,) in S.query(Resource.path).filter(Resource.path.in_(paths)):
+                del by_path[path]
+        if not by_path:
+            return 0
+
+        now = datetime.utcnow()
+        S.execute(Resource.__table__.insert(), [
+            {'format': importer, 'path': path, 'mtime': datetime.utcfromtimestamp(mtime), 'atime': now}
+            for path, (mtime, importer, info) in by_path.items()])
+        resource_ids = {}
+        for paths in self._chunks(by_path.keys()):
+            resource_ids.update(S.query(Resource.path, Resource.id).filter(Resource.path.in_(paths)))
+
+        products = {}
+        for path, (_, _, info) in by_path.items():
+            extras = dict((k, v) for k, v in info.items() if k not in Product.INFO_TO_FIELD)
+            uuid_str = str(uuid1())
+            products[uuid_str] = (resource_ids[path], {
+                'uuid_str': uuid_str,
+                'atime': now,
+                'name': info[INFO.SHORT_NAME],
+                'platform': getattr(info[INFO.PLATFORM], 'value', info[INFO.PLATFORM]),
+                'instrument': info[INFO.INSTRUMENT].value,
+                'band': info[INFO.BAND],
+                'scene': info[INFO.SCENE],
+                'sched_time': info[INFO.SCHED_TIME],
+                'obs_time': info[INFO.OBS_TIME],
+                'obs_duration': info[INFO.OBS_DURATION],
+                'extras': extras,
+            })
+        S.execute(Product.__table__.insert(), [row for _, row in products.values()])
+        assoc = []
+        for uuid_strs in self._chunks(products.keys()):
+            for uuid_str, product_id in S.query(Product.uuid_str, Product.id).filter(Product.uuid_str.in_(uuid_strs)):
+                assoc.append({'product_id': product_id, 'resource_id': products[uuid_str][0]})
+        S.execute(ProductsFromResources.insert(), assoc)
+        LOG.info('registered {} new products'.format(len(assoc)))
+        return len(assoc)
+
+    def hunt_dir(self, S: Session, dir_path:str, recurse_levels: Optional[int] = 0) -> int:
+        found = self.scan(dir_path, recurse_levels)
+        LOG.debug('{} recognized files in {}'.format(len(found), dir_path))
+        return self.register(S, found)
 
-        d[INFO.PROJ] = pug.proj4_string
-        # get nadir-meter-ish projection coordinate vectors to be used by proj4
-        y,x = pug.proj_y, pug.proj_x
-        d[INFO.ORIGIN_X] = x[0]
-        d[INFO.ORIGIN_Y] = y[0]
+    def hunt_file(self, S: Session, file_path:str) -> int:
+        zult = self.skim(os.path.basename(file_path))
+        if zult is None:
+            return 0
+        importer, info = zult
+        file_path = os.path.abspath(file_path)
+        return self.register(S, [(file_path, os.stat(file_path).st_mtime, importer, info)])
 
-        midyi, midxi = int(y.shape[0] / 2), int(x.shape[0] / 2)
-        # PUG states radiance at index [0,0] extends between coordinates [0,0] to [1,1] on a quadrille
-        # centers of pixels are therefore at +0.5, +0.5
-        # for a (e.g.) H x W image this means [H/2,W/2] coordinates are image center
-        # for now assume all scenes are even-dimensioned (e.g. 5424x5424)
-        # given that coordinates are evenly spaced in angular -> nadir-meters space,
-        # technically this should work with any two neighbor values
-        d[INFO.CELL_WIDTH] = x[midxi+1] - x[midxi]
-        d[INFO.CELL_HEIGHT] = y[midyi+1] - y[midyi]
 
-        shape = pug.shape
-        d[INFO.SHAPE] = shape
-        generate_guidebook_metadata(d)
-        LOG.debug(repr(d))
-        return d
+class GoesRHunter(aFilenameHunter):
+    """
+    GOES-R ABI netCDF files following the standard L1b/L2 CMI naming
+    """
+    SKIMMERS = (skim_abi_filename,)
 
 
+class ABI_AHI_Hunter(aFilenameHunter):
+    """
+    GOES-R ABI netCDF and Himawari AHI GeoTIFF files, classified in a single walk
+    """
+    SKIMMERS = (skim_abi_filename, skim_ahi_filename)
 
 
 PATH_TEST_DATA = os.environ.get('TEST_DATA', os.path.expanduser("~/Data/test_files/thing.dat"))
@@ -135,8 +336,44 @@ class tests(unittest.TestCase):
     def setUp(self):
         pass
 
-    def test_something(self):
-        pass
+    def test_skim(self):
+        res, info = skim_abi_filename('OR_ABI-L1b-RadF-M3C01_G16_s20171231200382_e20171231211149_c20171231211192.nc')
+        self.assertTrue(res.endswith('GoesRPUGImporter'))
+        self.assertEqual(info[INFO.PLATFORM], PLATFORM.GOES_16)
+        self.assertEqual(info[INFO.BAND], 1)
+        self.assertEqual(info[INFO.SCENE], 'Full Disk')
+        self.assertEqual(info[INFO.OBS_TIME], datetime(2017, 5, 3, 12, 0, 38, 200000))
+        self.assertEqual(info[INFO.SCHED_TIME], datetime(2017, 5, 3, 12, 0))
+        res, info = skim_ahi_filename('HS_H08_20150714_0030_B10_FLDK_R20.merc.tif')
+        self.assertTrue(res.endswith('GeoTiffImporter'))
+        self.assertEqual(info[INFO.PLATFORM], PLATFORM.HIMAWARI_8)
+        self.assertEqual(info[INFO.SHORT_NAME], 'B10')
+        self.assertIsNone(skim_ahi_filename('HS_H08_20150714_0030_B10_FLDK_R20_S0110.DAT'))
+
+    def test_hunt(self):
+        from tempfile import TemporaryDirectory
+        names = ['HS_H08_20150714_{:04d}_B{:02d}_FLDK_R20.merc.tif'.format(hhmm, band)
+                 for hhmm in (0, 10, 20) for band in (13, 14)]
+        with TemporaryDirectory() as tmp:
+            for i, name in enumerate(names):
+                subdir = os.path.join(tmp, 'case', str(i % 2))
+                os.makedirs(subdir, exist_ok=True)
+                open(os.path.join(subdir, name), 'wb').close()
+            open(os.path.join(tmp, 'README'), 'wb').close()
+            mdb = Metadatabase('sqlite://', create_tables=True)
+            hunter = ABI_AHI_Hunter(mdb)
+            self.assertEqual(hunter.hunt(tmp, recurse_levels=0), 0)
+            self.assertEqual(hunter.hunt(tmp, recurse_levels=None), len(names))
+            self.assertEqual(hunter.hunt(tmp, recurse_levels=None), 0)
+            s = mdb.session()
+            prods = s.query(Product).filter_by(_band=14).order_by(Product.obs_time).all()
+            self.assertEqual(len(prods), 3)
+            self.assertEqual(prods[0].info[INFO.PLATFORM], PLATFORM.HIMAWARI_8)
+            self.assertEqual(prods[0].info[INFO.KIND], KIND.IMAGE)
+            self.assertTrue(prods[0].path.endswith(names[1]))
+            formats = set(f for (f,) in s.execute('SELECT format FROM resources_v1'))
+            self.assertEqual(formats, {'sift.workspace.importer:GeoTiffImporter'})
+            s.close()
 
 
 def _debug(type, value, tb):
@@ -174,8 +411,9 @@ def main():
         unittest.main()
         return 0
 
-    for pn in args.inputs:
-        pass
+    mdb = Metadatabase('sqlite://', create_tables=True)
+    found = ABI_AHI_Hunter(mdb).hunt(args.inputs, recurse_levels=None)
+    print('{} products found'.format(found))
 
     return 0
 
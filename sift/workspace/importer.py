@@ -193,6 +193,14 @@ class aSingleFileWithSingleProductImporter(aImporter):
         if len(res.product):
             zult = list(res.product)
             LOG.debug('pre-existing products {}'.format(repr(zult)))
+            for prod in zult:
+                if INFO.SHAPE not in prod.info:
+                    # registered from its filename by a collector hunter; fill in what only the file can tell us
+                    LOG.debug('completing skimmed product metadata for {}'.format(self.source_path))
+                    meta = self.product_metadata()
+                    meta.pop(INFO.UUID, None)
+                    prod.update(meta)
+                    self._S.commit()
             return zult
 
         # else probe the file and add product metadata, without importing content
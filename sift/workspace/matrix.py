@@ -40,10 +40,12 @@ __docformat__ = 'reStructuredText'
 
 import os, sys
 import logging, unittest, argparse
+from bisect import bisect_left
 from datetime import timedelta, datetime
 from collections import namedtuple
 from enum import Enum
 from PyQt4.QtCore import QObject, pyqtSignal
+from sift.common import INFO
 
 LOG = logging.getLogger(__name__)
 
@@ -69,6 +71,53 @@ row_info = namedtuple('row_info', ('product_name', 'timestep_count'))
 
 product_info = namedtuple('product_info', ('product_name', 'time', 'state', 'path', 'variable', 'slice'))
 
+cell_info = namedtuple('cell_info', ('row', 'column', 'uuid'))  # row key tuple, column time, product UUID
+
+# a row holds one product over time: same platform, instrument, scene, kind, and name
+ROW_KEYS = (INFO.PLATFORM, INFO.INSTRUMENT, INFO.SCENE, INFO.KIND, INFO.SHORT_NAME, INFO.STANDARD_NAME)
+# rows sharing these are channels of the same observation
+GROUP_KEYS = ROW_KEYS[:3]
+
+
+def _sortable(key):
+    "row keys mix enums, strings and None; order them by their text"
+    return tuple('' if x is None else str(getattr(x, 'value', x)) for x in key)
+
+
+class _OrderedCells(object):
+    """
+    UUIDs kept sorted by a key, with O(1) position lookup
+    insertion and removal re-number only the cells after the change, which is O(1) when appending in order
+    """
+    __slots__ = ('keys', 'uuids', 'pos')
+
+    def __init__(self):
+        self.keys = []
+        self.uuids = []
+        self.pos = {}
+
+    def __len__(self):
+        return len(self.uuids)
+
+    def _renumber(self, start):
+        for i in range(start, len(self.uuids)):
+            self.pos[self.uuids[i]] = i
+
+    def insert(self, key, uuid):
+        i = bisect_left(self.keys, key)
+        self.keys.insert(i, key)
+        self.uuids.insert(i, uuid)
+        self._renumber(i)
+
+    def remove(self, uuid):
+        i = self.pos.pop(uuid)
+        del self.keys[i]
+        del self.uuids[i]
+        self._renumber(i)
+
+    def neighbor(self, uuid, delta):
+        return self.uuids[(self.pos[uuid] + delta) % len(self.uuids)]
+
 
 class DataAdjacencyMatrix(QObject):
     """
@@ -77,9 +126,28 @@ class DataAdjacencyMatrix(QObject):
     - transitions data on demand into layers
     - manages default presentation on a per-product basis
     - allows re-ordering of products, resulting in z-order scenegraph changes
+
+    Rows are products (ROW_KEYS), columns are scheduled times within column_time_epsilon of one another.
+    The index is updated incrementally: additions and removals are announced as deltas,
+    and only changing column_time_epsilon rebuilds it.
     """
-    def __init__(self, initial_search_paths=[]):
+    didAddProducts = pyqtSignal(list)  # [cell_info, ...] for products added to the matrix
+    didRemoveProducts = pyqtSignal(list)  # [cell_info, ...] for products removed from the matrix
+    didChangeShape = pyqtSignal(tuple)  # (rows, columns) after rows or columns were created or dropped
+    didRebuild = pyqtSignal()  # every cell may have moved, e.g. after a new column_time_epsilon
+
+    def __init__(self, initial_search_paths=[], column_time_epsilon=timedelta(0)):
         super(DataAdjacencyMatrix, self).__init__()
+        self._time_epsilon = column_time_epsilon
+        self._clear()
+
+    def _clear(self):
+        self._where = {}  # uuid: (row key, sched_time, column time)
+        self._row_keys = _OrderedCells()  # row keys in display order; "uuids" here are the row keys
+        self._rows = {}  # row key: _OrderedCells by (column time, uuid)
+        self._column_times = []  # sorted column times
+        self._columns = {}  # column time: {group key: _OrderedCells by (row sort key, uuid)}
+        self._column_counts = {}  # column time: number of products
 
     def add_search_paths(self, *paths):
         pass
@@ -92,10 +160,10 @@ class DataAdjacencyMatrix(QObject):
         """
         :return: timedelta that determines whether two or more columns are actually from the same time or not
         """
-        return timedelta(0)
+        return self._time_epsilon
 
     @column_time_epsilon.setter
-    def _(self, td):
+    def column_time_epsilon(self, td):
         self._time_epsilon = td
         self._rebuild()
 
@@ -104,19 +172,169 @@ class DataAdjacencyMatrix(QObject):
         """
         :return: tuple of (products, timesteps)
         """
-        return (0,0)
+        return (len(self._rows), len(self._column_times))
+
+    def __len__(self):
+        return len(self._where)
+
+    def __contains__(self, uuid):
+        return uuid in self._where
 
     def column_info(self, column):
         """
         :param column: 0..n-1 column to get summary information on
         :return: column_info namedtuple
         """
+        when = self._column_times[column]
+        return column_info(when, self._column_counts[when])
 
     def row_info(self, row):
         """
-        :param column: 0..n-1 column to get summary information on
-        :return: column_info namedtuple
+        :param row: 0..n-1 row to get summary information on
+        :return: row_info namedtuple
         """
+        key = self._row_keys.uuids[row]
+        return row_info(key[ROW_KEYS.index(INFO.SHORT_NAME)], len(self._rows[key]))
+
+    def row_key(self, row):
+        return self._row_keys.uuids[row]
+
+    def cell(self, row, column):
+        """
+        :return: UUID of the product at (row, column), or None
+        """
+        key, when = self._row_keys.uuids[row], self._column_times[column]
+        cells = self._columns[when].get(key[:len(GROUP_KEYS)])
+        if cells is None:
+            return None
+        for uuid in cells.uuids:
+            if self._where[uuid][0] == key:
+                return uuid
+        return None
+
+    def _column_for(self, when):
+        """
+        find the column a scheduled time belongs to, creating one if none is within epsilon
+        :return: column time, whether the column is new
+        """
+        times = self._column_times
+        i = bisect_left(times, when)
+        near = [t for t in times[max(0, i - 1):i + 1] if abs(t - when) <= self._time_epsilon]
+        if near:
+            return min(near, key=lambda t: abs(t - when)), False
+        times.insert(i, when)
+        self._columns[when] = {}
+        self._column_counts[when] = 0
+        return when, True
+
+    def _insert(self, uuid, info):
+        when = info.get(INFO.SCHED_TIME)
+        if when is None:
+            return None, False
+        key = tuple(info.get(k) for k in ROW_KEYS)
+        column, reshaped = self._column_for(when)
+        if key not in self._rows:
+            self._rows[key] = _OrderedCells()
+            self._row_keys.insert(_sortable(key), key)
+            reshaped = True
+        self._rows[key].insert((column, str(uuid)), uuid)
+        self._columns[column].setdefault(key[:len(GROUP_KEYS)], _OrderedCells()).insert((_sortable(key), str(uuid)), uuid)
+        self._column_counts[column] += 1
+        self._where[uuid] = (key, when, column)
+        return cell_info(key, column, uuid), reshaped
+
+    def _delete(self, uuid):
+        key, _, column = self._where.pop(uuid)
+        reshaped = False
+        row = self._rows[key]
+        row.remove(uuid)
+        if not len(row):
+            del self._rows[key]
+            self._row_keys.remove(key)
+            reshaped = True
+        group = key[:len(GROUP_KEYS)]
+        cells = self._columns[column][group]
+        cells.remove(uuid)
+        if not len(cells):
+            del self._columns[column][group]
+        self._column_counts[column] -= 1
+        if not self._column_counts[column]:
+            del self._column_counts[column]
+            del self._columns[column]
+            self._column_times.remove(column)
+            reshaped = True
+        return cell_info(key, column, uuid), reshaped
+
+    def add(self, infos):
+        """
+        index products, replacing any previous entries for the same UUIDs
+        products without a scheduled time are ignored
+        :param infos: iterable of info mappings with at least INFO.UUID and INFO.SCHED_TIME
+        :return: list of cell_info for products which were indexed
+        """
+        removed, added, reshaped = [], [], False
+        for info in infos:
+            uuid = info[INFO.UUID]
+            if uuid in self._where:
+                cell, r = self._delete(uuid)
+                removed.append(cell)
+                reshaped |= r
+            cell, r = self._insert(uuid, info)
+            reshaped |= r
+            if cell is not None:
+                added.append(cell)
+        self._announce(removed, added, reshaped)
+        return added
+
+    update = add
+
+    def remove(self, uuids):
+        """
+        drop products from the index; unknown UUIDs are ignored
+        :param uuids: iterable of UUIDs
+        """
+        removed, reshaped = [], False
+        for uuid in uuids:
+            if uuid in self._where:
+                cell, r = self._delete(uuid)
+                removed.append(cell)
+                reshaped |= r
+        self._announce(removed, [], reshaped)
+
+    def _announce(self, removed, added, reshaped):
+        if removed:
+            self.didRemoveProducts.emit(removed)
+        if added:
+            self.didAddProducts.emit(added)
+        if reshaped:
+            self.didChangeShape.emit(self.shape)
+
+    def time_siblings(self, uuid):
+        """
+        :return: (time-ordered UUIDs in the same row, index of uuid in that list)
+        """
+        row = self._rows[self._where[uuid][0]]
+        return list(row.uuids), row.pos[uuid]
+
+    def channel_siblings(self, uuid):
+        """
+        :return: (UUIDs of the same observation group in the same column in row order, index of uuid in that list)
+        """
+        key, _, column = self._where[uuid]
+        cells = self._columns[column][key[:len(GROUP_KEYS)]]
+        return list(cells.uuids), cells.pos[uuid]
+
+    def neighbor(self, uuid, delta=1, bandwise=False):
+        """
+        O(1) step through time (or bands, with bandwise) from a product, wrapping at either end
+        :param uuid: product to step from
+        :param delta: steps to take, negative to go back in time or band
+        :param bandwise: step through the column instead of the row
+        :return: UUID of the neighboring product, which is uuid itself if it has no siblings
+        """
+        key, _, column = self._where[uuid]
+        cells = self._columns[column][key[:len(GROUP_KEYS)]] if bandwise else self._rows[key]
+        return cells.neighbor(uuid, delta)
 
     def _rebuild(self, do_signal=True):
         """
@@ -124,16 +342,55 @@ class DataAdjacencyMatrix(QObject):
         :param do_signal: whether or not to propagate a Qt refresh signal
         :return: True if dimensionality changed
         """
+        shape = self.shape
+        # re-insert in time order so the earliest time of each cluster anchors its column
+        entries = sorted(((when, str(uuid), uuid, key) for uuid, (key, when, _) in self._where.items()),
+                         key=lambda x: x[:2])
+        self._clear()
+        for when, _, uuid, key in entries:
+            info = dict(zip(ROW_KEYS, key))
+            info[INFO.SCHED_TIME] = when
+            self._insert(uuid, info)
+        if do_signal:
+            self.didRebuild.emit()
+        return shape != self.shape
 
 
 class tests(unittest.TestCase):
-    data_file = os.environ.get('TEST_DATA', os.path.expanduser("~/Data/test_files/thing.dat"))
 
-    def setUp(self):
-        pass
-
-    def test_something(self):
-        pass
+    def _info(self, band, minute, second=0, scene='Full Disk'):
+        from uuid import uuid1
+        return {INFO.UUID: uuid1(), INFO.PLATFORM: 'G16', INFO.INSTRUMENT: 'ABI', INFO.SCENE: scene,
+                INFO.KIND: 'IMAGE', INFO.SHORT_NAME: 'B{:02d}'.format(band), INFO.STANDARD_NAME: None,
+                INFO.SCHED_TIME: datetime(2017, 5, 3, 12, minute, second)}
+
+    def test_neighbors(self):
+        dam = DataAdjacencyMatrix()
+        infos = [self._info(band, minute) for minute in (0, 15, 30) for band in (2, 1, 3)]
+        added = []
+        dam.didAddProducts.connect(added.extend)
+        dam.add(infos)
+        self.assertEqual(len(added), 9)
+        self.assertEqual(dam.shape, (3, 3))
+        b1 = [x[INFO.UUID] for x in infos if x[INFO.SHORT_NAME] == 'B01']
+        self.assertEqual(dam.time_siblings(b1[1]), (b1, 1))
+        self.assertEqual(dam.neighbor(b1[2], 1), b1[0])
+        self.assertEqual(dam.neighbor(b1[0], -1), b1[2])
+        b2_at_0 = infos[0][INFO.UUID]
+        self.assertEqual(dam.neighbor(b1[0], 1, bandwise=True), b2_at_0)
+        self.assertEqual(dam.row_info(0), row_info('B01', 3))
+        self.assertEqual(dam.cell(1, 0), b2_at_0)
+        dam.remove([b1[1]])
+        self.assertEqual(dam.neighbor(b1[0], 1), b1[2])
+        self.assertEqual(dam.column_info(1).product_count, 2)
+
+    def test_epsilon(self):
+        dam = DataAdjacencyMatrix()
+        dam.add([self._info(1, 0, 0), self._info(2, 0, 38), self._info(1, 15, 0)])
+        self.assertEqual(dam.shape, (2, 3))
+        dam.column_time_epsilon = timedelta(seconds=60)
+        self.assertEqual(dam.shape, (2, 2))
+        self.assertEqual(dam.column_info(0), column_info(datetime(2017, 5, 3, 12, 0, 0), 2))
 
 
 def _debug(type, value, tb):
@@ -13,12 +13,17 @@ OVERVIEW
 Resource : a file containing products, somewhere in the filesystem, or a resource on a remote system we can access (openDAP etc)
  |_ Product* : product stored in a resource
      |_ Content* : workspace cache content corresponding to a product, may be one of many available views (e.g. projections)
-     |   |_ ContentKeyValue* : additional information on content
-     |_ ProductKeyValue* : additional information on product
+     |   |_ extras : additional information on content, as a JSON blob
+     |_ extras : additional information on product, as a JSON blob
      |_ SymbolKeyValue* : if product is derived from other products, symbol table for that expression is in this kv table
+DirectoryStamp : generation stamp used to skip re-validating directories which have not changed
+product_footprints : R*Tree of product lon/lat bounding boxes and observation times, keyed by Product.id
 
 A typical baseline product will have two content: and overview (lod==0) and a native resolution (lod>0)
 
+Frequently queried metadata (schedule time, band, platform, instrument, scene, shape) are typed columns
+on Product so that sibling searches can be done in SQL and info assembly does not need to unpickle anything.
+
 
 REQUIRES
 SQLAlchemy with SQLite
@@ -31,19 +36,25 @@ __author__ = 'rayg'
 __docformat__ = 'reStructuredText'
 
 import os, sys
+import json, base64, pickle
 import logging, unittest, argparse
+from importlib import import_module
 from datetime import datetime, timedelta
-from sift.common import INFO
+from enum import Enum
+import numpy as np
+from sift.common import INFO, KIND, PLATFORM, INSTRUMENT, COMPOSITE_TYPE, TOOL
 from functools import reduce
 from uuid import UUID
 from collections import ChainMap, MutableMapping, Iterable
 from typing import Mapping
 
 from sqlalchemy import Table, Column, Integer, String, UnicodeText, Unicode, ForeignKey, DateTime, Interval, PickleType, Float, create_engine
+from sqlalchemy import MetaData, select, and_, or_, event
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.types import TypeDecorator
+from sqlalchemy.ext.mutable import MutableDict
 from sqlalchemy.orm import Session, relationship, sessionmaker, backref, scoped_session
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm.collections import attribute_mapped_collection
-from sqlalchemy.ext.associationproxy import association_proxy
 
 LOG = logging.getLogger(__name__)
 
@@ -85,6 +96,121 @@ LOG = logging.getLogger(__name__)
 
 
 
+# ============
+# Column Types
+
+# enumerations which may show up as keys or values in info dictionaries
+_JSON_ENUMS = dict((cls.__name__, cls) for cls in (INFO, KIND, PLATFORM, INSTRUMENT, COMPOSITE_TYPE, TOOL))
+_JSON_DATETIME_FORMAT = '%Y-%m-%dT%H:%M:%S.%f'
+
+
+def _json_encode(o):
+    """
+    convert a metadata key or value to something json can represent, tagging non-json types
+    """
+    if o is None or isinstance(o, (bool, int, float, str)):
+        return o
+    if isinstance(o, Enum) and type(o).__name__ in _JSON_ENUMS:
+        return {'__enum__': type(o).__name__, 'name': o.name}
+    if isinstance(o, np.generic):
+        return o.item()
+    if isinstance(o, datetime):
+        return {'__datetime__': o.strftime(_JSON_DATETIME_FORMAT)}
+    if isinstance(o, timedelta):
+        return {'__timedelta__': o.total_seconds()}
+    if isinstance(o, UUID):
+        return {'__uuid__': str(o)}
+    if isinstance(o, tuple):
+        return {'__tuple__': [_json_encode(x) for x in o]}
+    if isinstance(o, list):
+        return [_json_encode(x) for x in o]
+    if isinstance(o, np.ndarray):
+        return {'__ndarray__': _json_encode(o.tolist()), 'dtype': str(o.dtype)}
+    if isinstance(o, Mapping):
+        return {'__dict__': [[_json_encode(k), _json_encode(v)] for k, v in o.items()]}
+    LOG.debug('falling back to pickle for metadata value of type {}'.format(type(o)))
+    return {'__pickle__': base64.b64encode(pickle.dumps(o)).decode('ascii')}
+
+
+def _json_decode(o):
+    """
+    inverse of _json_encode
+    """
+    if isinstance(o, list):
+        return [_json_decode(x) for x in o]
+    if not isinstance(o, dict):
+        return o
+    if '__enum__' in o:
+        return _JSON_ENUMS[o['__enum__']][o['name']]
+    if '__datetime__' in o:
+        return datetime.strptime(o['__datetime__'], _JSON_DATETIME_FORMAT)
+    if '__timedelta__' in o:
+        return timedelta(seconds=o['__timedelta__'])
+    if '__uuid__' in o:
+        return UUID(o['__uuid__'])
+    if '__tuple__' in o:
+        return tuple(_json_decode(x) for x in o['__tuple__'])
+    if '__ndarray__' in o:
+        return np.array(_json_decode(o['__ndarray__']), dtype=o['dtype'])
+    if '__dict__' in o:
+        return dict((_json_decode(k), _json_decode(v)) for k, v in o['__dict__'])
+    if '__pickle__' in o:
+        return pickle.loads(base64.b64decode(o['__pickle__']))
+    raise ValueError('unknown tagged value in metadata blob: {}'.format(repr(o)))
+
+
+class InfoBlob(TypeDecorator):
+    """
+    compact JSON storage for the metadata dictionary items which do not have their own column
+    keys may be INFO enums or strings, so the dictionary is stored as a list of [key, value] pairs
+    """
+    impl = UnicodeText
+
+    def process_bind_param(self, value, dialect):
+        if value is None:
+            return None
+        return json.dumps([[_json_encode(k), _json_encode(v)] for k, v in value.items()], separators=(',', ':'))
+
+    def process_result_value(self, value, dialect):
+        if value is None:
+            return None
+        return dict((_json_decode(k), _json_decode(v)) for k, v in json.loads(value))
+
+
+class ImporterClass(TypeDecorator):
+    """
+    store an importer class by its dotted module path instead of pickling it
+    """
+    impl = String
+
+    def process_bind_param(self, value, dialect):
+        if value is None or isinstance(value, str):
+            return value
+        return '{}:{}'.format(value.__module__, value.__qualname__)
+
+    def process_result_value(self, value, dialect):
+        if value is None:
+            return None
+        modname, _, clsname = value.partition(':')
+        try:
+            return getattr(import_module(modname), clsname)
+        except (ImportError, AttributeError):
+            LOG.warning('unable to find importer class {}'.format(value))
+            return None
+
+
+def _enum_or_str(enum_cls, value):
+    """
+    convert a string column value back to its enumeration, leaving non-standard names as strings
+    """
+    if value is None:
+        return None
+    try:
+        return enum_cls(value)
+    except ValueError:
+        return value
+
+
 # =================
 # Database Entities
 
@@ -92,9 +218,9 @@ Base = declarative_base()
 
 # resources can have multiple products in them
 # products may require multiple resourcse (e.g. separate GEO; tiled imagery)
-ProductsFromResources = Table('product_resource_assoc_v0', Base.metadata,
-                              Column('product_id', Integer, ForeignKey('products_v0.id')),
-                              Column('resource_id', Integer, ForeignKey('resources_v0.id')))
+ProductsFromResources = Table('product_resource_assoc_v1', Base.metadata,
+                              Column('product_id', Integer, ForeignKey('products_v1.id')),
+                              Column('resource_id', Integer, ForeignKey('resources_v1.id')))
 
 
 
@@ -103,12 +229,12 @@ class Resource(Base):
     held metadata regarding a file that we can access and import data into the workspace from
     resources are external to the workspace, but the workspace can keep track of them in its database
     """
-    __tablename__ = 'resources_v0'
+    __tablename__ = 'resources_v1'
     # identity information
     id = Column(Integer, primary_key=True)
 
     # primary handler
-    format = Column(PickleType)  # classname, class or callable which can pull this data into workspace from storage
+    format = Column(ImporterClass)  # importer class which can pull this data into workspace from storage
 
     # {scheme}://{path}/{name}?{query}, default is just an absolute path in filesystem
     scheme = Column(Unicode, nullable=True)  # uri scheme for the content (the part left of ://), assume file:// by default
@@ -139,12 +265,23 @@ class Resource(Base):
 class ChainRecordWithDict(MutableMapping):
     """
     allow Product database entries and key-value table to act as a coherent dictionary
+    fields listed in optional_keys are only present in the mapping when they are not None
     """
-    def __init__(self, obj, field_keys, more):
-        self._obj, self._field_keys, self._more = obj, field_keys, more
+    def __init__(self, obj, field_keys, optional_keys=()):
+        self._obj, self._field_keys, self._optional_keys = obj, field_keys, frozenset(optional_keys)
+
+    @property
+    def _more(self):
+        return self._obj._kwinfo
+
+    def _present_field_keys(self):
+        for k, fieldname in self._field_keys.items():
+            if k in self._optional_keys and getattr(self._obj, fieldname) is None:
+                continue
+            yield k
 
     def keys(self):
-        return set(self._more.keys()) | set(self._field_keys.keys())
+        return set(self._more.keys()) | set(self._present_field_keys())
 
     def items(self):
         for k in self.keys():
@@ -174,7 +311,10 @@ class ChainRecordWithDict(MutableMapping):
         fieldname = self._field_keys.get(key)
         if fieldname is not None:
             assert(isinstance(fieldname, str))
-            return getattr(self._obj, fieldname)
+            value = getattr(self._obj, fieldname)
+            if value is None and key in self._optional_keys:
+                raise KeyError(key)
+            return value
         return self._more[key]
 
     def __repr__(self):
@@ -190,6 +330,9 @@ class ChainRecordWithDict(MutableMapping):
             self._more[key] = value
 
     def __delitem__(self, key):
+        if key in self._optional_keys:
+            setattr(self._obj, self._field_keys[key], None)
+            return
         if key in self._field_keys:
             raise KeyError('cannot remove key {}'.format(key))
         del self._more[key]
@@ -204,9 +347,10 @@ class Product(Base):
     A StoredProduct has zero or more ProductKeyValue pairs with additional metadata
     A File's format allows data to be imported to the workspace
     A StoredProduct's kind determines how its cached data is transformed to different representations for display
-    additional information is stored in a key-value table addressable as product[key:str]
+    frequently queried metadata has typed columns; additional information is stored in a JSON blob
+    both are addressable as product.info[key]
     """
-    __tablename__ = 'products_v0'
+    __tablename__ = 'products_v1'
 
     # identity information
     id = Column(Integer, primary_key=True)
@@ -229,14 +373,22 @@ class Product(Base):
     # cached metadata provided by the file format handler
     name = Column(String, nullable=False)  # product identifier eg "B01", "B02"  # resource + shortname should be sufficient to identify the data
 
-    # platform = Column(String)  # platform or satellite name e.g. "GOES-16", "Himawari-8"; should match PLATFORM enum
+    # frequently queried identification, typed so that sibling searches can be done in SQL
+    _platform = Column('platform', String, nullable=True, index=True)  # PLATFORM enum value e.g. "G16", "Himawari-8"
+    _instrument = Column('instrument', String, nullable=True, index=True)  # INSTRUMENT enum value e.g. "ABI", "AHI"
+    _band = Column('band', Integer, nullable=True, index=True)  # band number for multispectral instruments
+    scene = Column(String, nullable=True, index=True)  # standard scene identifier e.g. "FLDK"
     # standard_name = Column(String, nullable=True)
     #
     # times
     # display_time = Column(DateTime)  # normalized instantaneous scheduled observation time e.g. 20170122T2310
+    sched_time = Column(DateTime, nullable=True, index=True)  # normalized scheduled observation time
     obs_time = Column(DateTime, nullable=False)  # actual observation time start
     obs_duration = Column(Interval, nullable=False)  # duration of the observation
 
+    # data shape as imported, (rows, cols) or (rows, cols, levels)
+    rows, cols, levels = Column(Integer, nullable=True), Column(Integer, nullable=True), Column(Integer, nullable=True)
+
     # native resolution information - see Content for projection details at different LODs
     # resolution = Column(Integer, nullable=True)  # meters max resolution, e.g. 500, 1000, 2000, 4000
 
@@ -248,11 +400,8 @@ class Product(Base):
     # link to workspace cache files representing this data, not lod=0 is overview
     content = relationship("Content", backref=backref("product"), cascade="all", order_by=lambda: Content.lod)
 
-    # link to key-value further information
-    # this provides dictionary style access to key-value pairs
-    _key_values = relationship("ProductKeyValue", collection_class=attribute_mapped_collection('key'), cascade="all, delete-orphan")
-    _kwinfo = association_proxy("_key_values", "value",
-                                 creator=lambda key, value: ProductKeyValue(key=key, value=value))
+    # further information not warranting its own column
+    _extras = Column('extras', MutableDict.as_mutable(InfoBlob), nullable=True)
 
     # derived / algebraic layers have a symbol table and an expression
     # typically Content objects for algebraic layers cache calculation output
@@ -264,6 +413,48 @@ class Product(Base):
     def __init__(self, *args, **kwargs):
         super(Product, self).__init__(*args, **kwargs)
 
+    @property
+    def _kwinfo(self):
+        if self._extras is None:
+            self._extras = {}
+        return self._extras
+
+    @property
+    def platform(self):
+        return _enum_or_str(PLATFORM, self._platform)
+
+    @platform.setter
+    def platform(self, value):
+        self._platform = value.value if isinstance(value, PLATFORM) else value
+
+    @property
+    def instrument(self):
+        return _enum_or_str(INSTRUMENT, self._instrument)
+
+    @instrument.setter
+    def instrument(self, value):
+        self._instrument = value.value if isinstance(value, INSTRUMENT) else value
+
+    @property
+    def band(self):
+        return self._band
+
+    @band.setter
+    def band(self, value):
+        self._band = int(value) if value is not None else None
+
+    @property
+    def shape(self):
+        if self.rows is None:
+            return None
+        rcl = reduce( lambda a,b: a + [b] if b else a, [self.rows, self.cols, self.levels], [])
+        return tuple(rcl)
+
+    @shape.setter
+    def shape(self, value):
+        rcl = tuple(int(x) for x in value) + (None, None, None) if value is not None else (None, None, None)
+        self.rows, self.cols, self.levels = rcl[:3]
+
     @classmethod
     def _separate_fields_and_keys(cls, mapping):
         fields = {}
@@ -317,7 +508,7 @@ class Product(Base):
         :return: mapping merging INFO-compatible database fields with key-value dictionary access pattern
         """
         if self._info is None:
-            self._info = ChainRecordWithDict(self, self.INFO_TO_FIELD, self._kwinfo)
+            self._info = ChainRecordWithDict(self, self.INFO_TO_FIELD, self.OPTIONAL_INFO)
         return self._info
 
     def update(self, d, only_keyvalues=False, only_fields=False):
@@ -404,33 +595,43 @@ class Product(Base):
         INFO.CELL_WIDTH: 'cell_width',
         INFO.CELL_HEIGHT: 'cell_height',
         INFO.ORIGIN_X: 'origin_x',
-        INFO.ORIGIN_Y: 'origin_y'
+        INFO.ORIGIN_Y: 'origin_y',
+        INFO.SCHED_TIME: 'sched_time',
+        INFO.PLATFORM: 'platform',
+        INFO.INSTRUMENT: 'instrument',
+        INFO.BAND: 'band',
+        INFO.SCENE: 'scene',
+        INFO.SHAPE: 'shape',
     }
 
+    # typed columns which not every product has; these are absent from .info when None
+    OPTIONAL_INFO = (INFO.SCHED_TIME, INFO.PLATFORM, INFO.INSTRUMENT, INFO.BAND, INFO.SCENE, INFO.SHAPE)
+
     def touch(self, when=None):
         self.atime = when = when or datetime.utcnow()
         [x.touch(when) for x in self.resource]
 
-class ProductKeyValue(Base):
-    """
-    key-value pairs associated with a product
-    """
-    __tablename__ = 'product_key_values_v0'
-    product_id = Column(ForeignKey(Product.id), primary_key=True)
-    key = Column(PickleType, primary_key=True)  # FUTURE: can this be a string? for now need pickling of INFO/PLATFORM Enum
-    # relationship: .product
-    value = Column(PickleType)
 
 class SymbolKeyValue(Base):
     """
     derived layers have a symbol table which becomes namespace used by expression
     """
-    __tablename__ = 'algebraic_symbol_key_values_v0'
+    __tablename__ = 'algebraic_symbol_key_values_v1'
     product_id = Column(ForeignKey(Product.id), primary_key=True)
     key = Column(Unicode, primary_key=True)
     # relationship: .product
     value = Column(PickleType, nullable=True)  # UUID object typically
 
+class AlgebraicKey(Base):
+    """
+    normalized (expression, input products) key of an algebraic product, so equivalent requests reuse it
+    """
+    __tablename__ = 'algebraic_content_keys_v1'
+    key = Column(String, primary_key=True)  # see sift.workspace.algebraic.content_key
+    product_id = Column(ForeignKey(Product.id), nullable=False, index=True)
+    product = relationship(Product, backref=backref("algebraic_keys", cascade="all, delete-orphan"))
+
+
 class Content(Base):
     """
     represent flattened product data files in cache (i.e. cache content)
@@ -439,11 +640,11 @@ class Content(Base):
     images will typically have rows>0 cols>0 levels=None (implied levels=1)
     profiles may have rows>0 cols=None (implied cols=1) levels>0
     a given product may have several Content for different projections
-    additional information is stored in a key-value table addressable as content[key:str]
+    additional information is stored in a JSON blob addressable as content.info[key]
     """
     # _array = None  # when attached, this is a np.memmap
 
-    __tablename__ = 'contents_v0'
+    __tablename__ = 'contents_v1'
     id = Column(Integer, primary_key=True)
     product_id = Column(Integer, ForeignKey(Product.id))
 
@@ -487,11 +688,8 @@ class Content(Base):
     x_path = Column(String, nullable=True)  # if needed, x location cache path relative to workspace
     z_path = Column(String, nullable=True)  # if needed, z location cache path relative to workspace
 
-    # link to key-value further information; primarily a hedge in case specific information has to be squirreled away for later consideration for main content table
-    # this provides dictionary style access to key-value pairs
-    _key_values = relationship("ContentKeyValue", collection_class=attribute_mapped_collection('key'), cascade="all, delete-orphan")
-    _kwinfo = association_proxy("_key_values", "value",
-                                 creator=lambda key, value: ContentKeyValue(key=key, value=value))
+    # further information; primarily a hedge in case specific information has to be squirreled away for later consideration for main content table
+    _extras = Column('extras', MutableDict.as_mutable(InfoBlob), nullable=True)
 
     INFO_TO_FIELD = {
         INFO.CELL_HEIGHT: 'cell_height',
@@ -506,7 +704,13 @@ class Content(Base):
 
     def __init__(self, *args, **kwargs):
         super(Content, self).__init__(*args, **kwargs)
-        self._info = ChainRecordWithDict(self, self.INFO_TO_FIELD, self._kwinfo)
+        self._info = ChainRecordWithDict(self, self.INFO_TO_FIELD)
+
+    @property
+    def _kwinfo(self):
+        if self._extras is None:
+            self._extras = {}
+        return self._extras
 
     @classmethod
     def _separate_fields_and_keys(cls, mapping):
@@ -565,7 +769,7 @@ class Content(Base):
         :return: mapping merging INFO-compatible database fields with key-value dictionary access pattern
         """
         if self._info is None:
-            self._info = ChainRecordWithDict(self, self.INFO_TO_FIELD, self._kwinfo)
+            self._info = ChainRecordWithDict(self, self.INFO_TO_FIELD)
         return self._info
 
     def update(self, d, only_keyvalues=False, only_fields=False):
@@ -633,14 +837,79 @@ class Content(Base):
     #         self._array = None
 
 
-class ContentKeyValue(Base):
+class DirectoryStamp(Base):
+    """
+    generation stamp for a directory holding resources or content, recorded when its entries were last validated
+    if a directory's mtime still matches its stamp, no files have been added or removed and its entries can be skipped
+    """
+    __tablename__ = 'directory_stamps_v1'
+    path = Column(Unicode, primary_key=True)  # absolute directory path
+    mtime = Column(Float, nullable=False)  # st_mtime of the directory at the time of validation
+    validated = Column(DateTime, nullable=False)  # when the validation took place
+
+
+# spatiotemporal index of product footprints
+# this is an SQLite R*Tree virtual table rather than a declarative entity, so it has its own MetaData
+# longitudes are degrees east; footprints crossing the antimeridian extend past 180
+# times are seconds since the epoch; the R*Tree stores 32-bit floats and rounds bounds outward by up to a few minutes,
+# so it only prefilters on time and queries re-check the observation interval exactly
+FOOTPRINTS = Table('product_footprints_v1', MetaData(),
+                   Column('id', Integer, primary_key=True),  # Product.id
+                   Column('min_lon', Float), Column('max_lon', Float),
+                   Column('min_lat', Float), Column('max_lat', Float),
+                   Column('min_t', Float), Column('max_t', Float))
+_FOOTPRINT_COLUMNS = 'id, min_lon, max_lon, min_lat, max_lat, min_t, max_t'
+_EPOCH = datetime(1970, 1, 1)
+FOOTPRINT_SAMPLES = 33  # grid points per side sampled when projecting a footprint
+
+
+def _epoch_seconds(when):
+    return (when - _EPOCH).total_seconds()
+
+
+def _indexed_interval(obs_time, obs_duration, sched_time):
+    """
+    time interval indexed for a product: its observation, stretched to include its schedule time if it has one
+    """
+    start, end = obs_time, obs_time + obs_duration
+    if sched_time is not None:
+        start, end = min(start, sched_time), max(end, sched_time)
+    return start, end
+
+
+def footprint_for_grid(proj4, origin_x, origin_y, cell_width, cell_height, rows, cols, samples=FOOTPRINT_SAMPLES):
     """
-    key-value pairs associated with a product
+    lon/lat bounding box of a projected grid, from a coarse lattice of points across it
+    interior points are included so that full-disk images, whose edges are off the earth, still get a footprint
+    :return: (west, south, east, north) in degrees, with east > 180 for grids crossing the antimeridian; None if nothing is on the earth
     """
-    __tablename__ = 'content_key_values_v0'
-    product_id = Column(ForeignKey(Content.id), primary_key=True)
-    key = Column(PickleType, primary_key=True)  # FUTURE: can this be a string?
-    value = Column(PickleType)
+    from pyproj import Proj
+    if None in (proj4, origin_x, origin_y, cell_width, cell_height, rows, cols):
+        return None
+    ys = origin_y + cell_height * np.linspace(0, rows, samples)
+    xs = origin_x + cell_width * np.linspace(0, cols, samples)
+    x, y = np.meshgrid(xs, ys)
+    with np.errstate(invalid='ignore'):
+        lon, lat = Proj(proj4)(x.ravel(), y.ravel(), inverse=True)
+    lon, lat = np.asarray(lon), np.asarray(lat)
+    good = np.isfinite(lon) & np.isfinite(lat) & (np.abs(lat) <= 90.0) & (np.abs(lon) <= 720.0)
+    if not np.any(good):
+        return None
+    lon = (lon[good] + 180.0) % 360.0 - 180.0
+    lat = lat[good]
+    west, east = lon.min(), lon.max()
+    if east - west > 180.0:
+        # probably spans the antimeridian; measure it going east from the western edge instead
+        shifted = np.where(lon < 0.0, lon + 360.0, lon)
+        if shifted.max() - shifted.min() < east - west:
+            west, east = shifted.min(), shifted.max()
+    return float(west), float(lat.min()), float(east), float(lat.max())
+
+
+@event.listens_for(Product, 'after_delete')
+def _drop_footprint(mapper, connection, product):
+    "keep the footprint index from outliving its product, since product ids can be reused"
+    connection.execute(FOOTPRINTS.delete().where(FOOTPRINTS.c.id == product.id))
 
 
 # singleton instance
@@ -678,11 +947,51 @@ class Metadatabase(object):
         if create_tables:
             LOG.info("creating database tables")
             Base.metadata.create_all(self.engine)
+            self._create_footprint_index()
         self.connection = self.engine.connect()
         # http://docs.sqlalchemy.org/en/latest/orm/contextual.html
         self.session_factory = sessionmaker(bind=self.engine)
         self.SessionRegistry = scoped_session(self.session_factory)  # thread-local session registry
 
+    def _create_footprint_index(self):
+        try:
+            self.engine.execute('CREATE VIRTUAL TABLE IF NOT EXISTS {} USING rtree({})'.format(
+                FOOTPRINTS.name, _FOOTPRINT_COLUMNS))
+        except OperationalError:
+            LOG.warning('R*Tree is not available, footprint queries will scan a plain table')
+            FOOTPRINTS.create(self.engine, checkfirst=True)
+
+    # tables of the previous schema, dependents first; their rows are not migrated
+    LEGACY_TABLES = ('product_resource_assoc_v0', 'product_key_values_v0', 'content_key_values_v0',
+                     'algebraic_symbol_key_values_v0', 'contents_v0', 'products_v0', 'resources_v0')
+    LEGACY_CONTENT_PATHS = ('path', 'coverage_path', 'sparsity_path', 'y_path', 'x_path', 'z_path')
+
+    def legacy_content_paths(self):
+        """
+        :return: cache file paths, relative to the workspace, held only by content in the previous schema
+        """
+        if 'contents_v0' not in self.engine.table_names():
+            return []
+        legacy = Table('contents_v0', MetaData(), autoload=True, autoload_with=self.engine)
+        columns = [legacy.c[name] for name in self.LEGACY_CONTENT_PATHS if name in legacy.c]
+        current = set()
+        for row in self.engine.execute(select([Content.__table__.c[name] for name in self.LEGACY_CONTENT_PATHS])):
+            current.update(row)
+        paths = set()
+        for row in self.engine.execute(select(columns)):
+            paths.update(row)
+        return sorted(pn for pn in paths - current if pn)
+
+    def drop_legacy_tables(self):
+        """
+        drop tables of the previous schema, call once their content files are gone (see legacy_content_paths)
+        """
+        present = set(self.engine.table_names())
+        for name in self.LEGACY_TABLES:
+            if name in present:
+                LOG.info("dropping table {} of an older workspace inventory".format(name))
+                self.engine.execute('DROP TABLE {}'.format(name))
+
     def session(self):
         return self.session_factory()
 
@@ -701,6 +1010,109 @@ class Metadatabase(object):
     # high-level functions
     #
 
+    # INFO keys which can be matched and ordered on using indexed Product columns
+    QUERYABLE = {
+        INFO.SHORT_NAME: Product.name,
+        INFO.SCHED_TIME: Product.sched_time,
+        INFO.OBS_TIME: Product.obs_time,
+        INFO.PLATFORM: Product._platform,
+        INFO.INSTRUMENT: Product._instrument,
+        INFO.BAND: Product._band,
+        INFO.SCENE: Product.scene,
+    }
+
+    @classmethod
+    def _column_value(cls, key, value):
+        if isinstance(value, Enum) and key in (INFO.PLATFORM, INFO.INSTRUMENT):
+            return value.value
+        if isinstance(value, np.generic):
+            return value.item()
+        return value
+
+    @staticmethod
+    def set_footprint(session, product: Product, bounds):
+        """
+        record or replace the footprint of a product in the spatiotemporal index
+        :param product: product with obs_time and obs_duration; sched_time, if present, also falls within the indexed interval
+        :param bounds: (west, south, east, north) from footprint_for_grid, or None to drop the product from the index
+        """
+        session.flush()
+        session.execute(FOOTPRINTS.delete().where(FOOTPRINTS.c.id == product.id))
+        if bounds is None:
+            return
+        start, end = _indexed_interval(product.obs_time, product.obs_duration, product.sched_time)
+        west, south, east, north = bounds
+        session.execute(FOOTPRINTS.insert().values(
+            id=product.id, min_lon=west, max_lon=east, min_lat=south, max_lat=north,
+            min_t=_epoch_seconds(start), max_t=_epoch_seconds(end)))
+
+    @staticmethod
+    def _footprint_ids(region=None, time_range=None):
+        """
+        R*Tree query for products whose footprint intersects a lon/lat box and whose observation overlaps a time range
+        a box with west > east crosses the antimeridian
+        """
+        conditions = []
+        if region is not None:
+            west, south, east, north = region
+            # one range query each side of the antimeridian
+            spans = [(west, east)] if west <= east else [(west, 180.0), (-180.0, east)]
+            # footprints are stored with east past 180 when they cross the antimeridian, so try a turn either way too
+            lons = [and_(FOOTPRINTS.c.max_lon >= w + shift, FOOTPRINTS.c.min_lon <= e + shift)
+                    for w, e in spans for shift in (-360.0, 0.0, 360.0)]
+            conditions += [or_(*lons), FOOTPRINTS.c.max_lat >= south, FOOTPRINTS.c.min_lat <= north]
+        if time_range is not None:
+            start, end = time_range
+            if start is not None:
+                conditions.append(FOOTPRINTS.c.max_t >= _epoch_seconds(start))
+            if end is not None:
+                conditions.append(FOOTPRINTS.c.min_t <= _epoch_seconds(end))
+        return select([FOOTPRINTS.c.id]).where(and_(*conditions))
+
+    def product_uuids_where(self, session, match=None, bands=None, time_range=None,
+                            order_by=(INFO.SCHED_TIME, INFO.SHORT_NAME), region=None):
+        """
+        find products using indexed columns, without loading Product entities
+        :param session: session to query with
+        :param match: {INFO key: value} required values, e.g. {INFO.PLATFORM: PLATFORM.GOES_16, INFO.SCENE: 'FLDK'}; None matches a missing value
+        :param bands: collection of band numbers, any of which are acceptable
+        :param time_range: (start, end) inclusive range of schedule times; either may be None
+                           with a region, products whose indexed observation interval overlaps it match instead,
+                           so products without a schedule time are found too
+        :param order_by: sequence of INFO keys to sort on
+        :param region: (west, south, east, north) degrees; only products with an indexed footprint intersecting it match;
+                       west > east for a region crossing the antimeridian
+        :return: list of product UUIDs in requested order
+        """
+        q = session.query(Product.uuid_str)
+        overlapping = None
+        if region is not None:
+            q = q.filter(Product.id.in_(self._footprint_ids(region, time_range)))
+            # the footprint index has roughly filtered on observation time, the overlap is checked exactly below
+            overlapping, time_range = time_range, None
+        for key, value in (match or {}).items():
+            col = self.QUERYABLE[key]
+            value = self._column_value(key, value)
+            q = q.filter(col.is_(None) if value is None else col == value)
+        if bands is not None:
+            q = q.filter(Product._band.in_([int(b) for b in bands if b is not None]))
+        if time_range is not None:
+            start, end = time_range
+            if start is not None:
+                q = q.filter(Product.sched_time >= start)
+            if end is not None:
+                q = q.filter(Product.sched_time <= end)
+        q = q.order_by(*[self.QUERYABLE[key] for key in order_by])
+        if overlapping is None:
+            return [UUID(u) for (u,) in q.all()]
+        start, end = overlapping
+        zult = []
+        for u, obs_time, obs_duration, sched_time in q.add_columns(Product.obs_time, Product.obs_duration, Product.sched_time):
+            t0, t1 = _indexed_interval(obs_time, obs_duration, sched_time)
+            if (start is None or t1 >= start) and (end is None or t0 <= end):
+                zult.append(UUID(u))
+        return zult
+
 
 
 
@@ -788,6 +1200,101 @@ class tests(unittest.TestCase):
         self.assertEqual(q.info['key'], p.info['key'])
         # self.assertEqual(q.obs_time, nextwhen)
 
+    def test_typed_fields(self):
+        from uuid import uuid1
+        mdb = Metadatabase('sqlite://', create_tables=True)
+        s = mdb.session()
+        when = datetime.utcnow()
+        p = Product.from_info({
+            INFO.UUID: uuid1(), INFO.SHORT_NAME: 'B13', INFO.OBS_TIME: when, INFO.OBS_DURATION: timedelta(minutes=10),
+            INFO.SCHED_TIME: when, INFO.PLATFORM: PLATFORM.HIMAWARI_8, INFO.INSTRUMENT: INSTRUMENT.AHI,
+            INFO.BAND: np.int64(13), INFO.SCENE: 'FLDK', INFO.SHAPE: (5500, 5500),
+            INFO.KIND: KIND.IMAGE, INFO.CLIM: (180., 330.), 'custom': [1, 2.5, 'three'],
+        })
+        p.atime = when
+        s.add(p)
+        s.commit()
+        s.expire_all()
+        q = s.query(Product).filter_by(_platform=PLATFORM.HIMAWARI_8.value, _band=13, scene='FLDK').one()
+        self.assertIs(q.platform, PLATFORM.HIMAWARI_8)
+        self.assertIs(q.info[INFO.INSTRUMENT], INSTRUMENT.AHI)
+        self.assertEqual(q.info[INFO.SHAPE], (5500, 5500))
+        self.assertEqual(q.info[INFO.SCHED_TIME], when)
+        self.assertIs(q.info[INFO.KIND], KIND.IMAGE)
+        self.assertEqual(q.info[INFO.CLIM], (180., 330.))
+        self.assertEqual(q.info['custom'], [1, 2.5, 'three'])
+        q.info[INFO.CLIM] = (200., 300.)
+        s.commit()
+        s.expire_all()
+        self.assertEqual(q.info[INFO.CLIM], (200., 300.))
+        r = Product(uuid_str=str(uuid1()), atime=when, name='B00', obs_time=when, obs_duration=timedelta(minutes=5))
+        self.assertEqual(mdb.product_uuids_where(s, {INFO.PLATFORM: PLATFORM.HIMAWARI_8, INFO.SCENE: 'FLDK'}, bands=[13, 14]), [q.uuid])
+        self.assertEqual(mdb.product_uuids_where(s, {INFO.SCENE: None}), [])
+        self.assertEqual(mdb.product_uuids_where(s, time_range=(when + timedelta(minutes=1), None)), [])
+        self.assertNotIn(INFO.BAND, r.info)
+        self.assertIsNone(r.info.get(INFO.SHAPE))
+
+    def test_footprints(self):
+        from uuid import uuid1
+        mdb = Metadatabase('sqlite://', create_tables=True)
+        s = mdb.session()
+        when = datetime(2017, 5, 3, 12, 0)
+        # himawari-8 full disk, edges are off the earth and it crosses the antimeridian
+        geos = '+proj=geos +lon_0=140.7 +h=35785863 +a=6378137.0 +b=6356752.3 +units=m +no_defs'
+        fldk = footprint_for_grid(geos, -5500000., 5500000., 2000., -2000., 5500, 5500)
+        self.assertGreater(fldk[2], 180.0)
+        self.assertLess(fldk[0], 140.7)
+        merc = footprint_for_grid('+proj=merc +datum=WGS84', 0., 1000000., 1000., -1000., 100, 100)
+        self.assertAlmostEqual(merc[0], 0.0)
+        self.assertAlmostEqual(merc[2], 0.898, places=2)
+        prods = []
+        for minutes, bounds in ((0, fldk), (10, fldk), (0, merc)):
+            p = Product(uuid_str=str(uuid1()), atime=when, name='B13', sched_time=when + timedelta(minutes=minutes),
+                        obs_time=when + timedelta(minutes=minutes), obs_duration=timedelta(minutes=10))
+            s.add(p)
+            mdb.set_footprint(s, p, bounds)
+            prods.append(p)
+        s.commit()
+        guam = (144.0, 13.0, 145.5, 14.0)
+        self.assertEqual(mdb.product_uuids_where(s, region=guam), [prods[0].uuid, prods[1].uuid])
+        # observation intervals overlapping the range, to the second despite the R*Tree rounding times outward
+        self.assertEqual(mdb.product_uuids_where(s, region=guam, time_range=(when + timedelta(minutes=10, seconds=1), None)),
+                         [prods[1].uuid])
+        self.assertEqual(mdb.product_uuids_where(s, region=guam, time_range=(None, when + timedelta(minutes=9, seconds=59))),
+                         [prods[0].uuid])
+        self.assertEqual(mdb.product_uuids_where(s, region=(-170.0, 0.0, -165.0, 5.0)), [prods[0].uuid, prods[1].uuid])
+        self.assertEqual(mdb.product_uuids_where(s, region=(0.1, 8.5, 0.2, 8.6)), [prods[2].uuid])
+        # regions crossing the antimeridian
+        self.assertEqual(mdb.product_uuids_where(s, region=(175.0, 0.0, -175.0, 5.0)), [prods[0].uuid, prods[1].uuid])
+        self.assertEqual(mdb.product_uuids_where(s, region=(-10.0, 8.5, -5.0, 8.6)), [])
+        # no schedule time, found by its observation interval
+        unscheduled = Product(uuid_str=str(uuid1()), atime=when, name='B14', obs_time=when + timedelta(minutes=20),
+                              obs_duration=timedelta(minutes=10))
+        s.add(unscheduled)
+        mdb.set_footprint(s, unscheduled, merc)
+        s.commit()
+        self.assertEqual(mdb.product_uuids_where(s, region=(0.1, 8.5, 0.2, 8.6), time_range=(when + timedelta(minutes=25), None),
+                                                 order_by=(INFO.OBS_TIME,)), [unscheduled.uuid])
+        s.delete(prods[0])
+        s.commit()
+        self.assertEqual(s.execute(FOOTPRINTS.count()).scalar(), 3)
+
+    def test_legacy_tables(self):
+        mdb = Metadatabase('sqlite://', create_tables=True)
+        self.assertEqual(mdb.legacy_content_paths(), [])
+        mdb.engine.execute('CREATE TABLE contents_v0 (id INTEGER PRIMARY KEY, path VARCHAR, coverage_path VARCHAR)')
+        mdb.engine.execute('CREATE TABLE products_v0 (id INTEGER PRIMARY KEY)')
+        mdb.engine.execute("INSERT INTO contents_v0 (path, coverage_path) VALUES ('old.image', NULL), ('kept.image', 'old.coverage')")
+        s = mdb.session()
+        when = datetime.utcnow()
+        s.add(Content(path='kept.image', atime=when, mtime=when, dtype='float32'))
+        s.commit()
+        self.assertEqual(mdb.legacy_content_paths(), ['old.coverage', 'old.image'])
+        mdb.drop_legacy_tables()
+        self.assertEqual(mdb.legacy_content_paths(), [])
+        self.assertFalse({'contents_v0', 'products_v0'} & set(mdb.engine.table_names()))
+
+
 def _debug(type, value, tb):
     "enable with sys.excepthook = debug"
     if not sys.stdin.isatty():
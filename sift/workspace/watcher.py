@@ -0,0 +1,300 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+PURPOSE
+Follow a landing directory for newly arriving files using Linux inotify
+ Files are reported once they have been closed after writing (or moved into place) and have stopped changing,
+ so partially written granules are never handed to an importer
+ Arrivals settling at about the same time are reported together as one batch
+
+REFERENCES
+ man 7 inotify
+
+REQUIRES
+ Linux, libc with inotify_init1
+
+:author: R.K.Garcia <rkgarcia@wisc.edu>
+:copyright: 2017 by University of Wisconsin Regents, see AUTHORS for more details
+:license: GPLv3, see LICENSE for more details
+"""
+import os, sys
+import ctypes, ctypes.util
+import errno
+import logging, unittest
+import select
+import struct
+import threading
+import time
+from typing import Callable, List
+
+LOG = logging.getLogger(__name__)
+
+# inotify event masks, from <sys/inotify.h>
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE_SELF = 0x00000400
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+IN_Q_OVERFLOW = 0x00004000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+WATCH_MASK = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE | IN_DELETE_SELF
+
+_EVENT_HEADER = struct.Struct('iIII')  # wd, mask, cookie, len
+READ_SIZE = 64 * 1024
+
+DEFAULT_SETTLE_SECONDS = 2.0  # quiet time required after the last write before a file is considered complete
+
+_libc = None
+
+
+def _inotify_libc():
+    global _libc
+    if _libc is None:
+        if not sys.platform.startswith('linux'):
+            raise OSError(errno.ENOSYS, 'inotify directory watching requires Linux')
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        libc.inotify_init1.argtypes = [ctypes.c_int]
+        libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        libc.inotify_rm_watch.argtypes = [ctypes.c_int, ctypes.c_int]
+        _libc = libc
+    return _libc
+
+
+def is_available() -> bool:
+    """
+    :return: whether inotify watching can be used on this system
+    """
+    try:
+        _inotify_libc()
+    except (OSError, AttributeError):
+        return False
+    return True
+
+
+class DirectoryWatcher(object):
+    """
+    Background thread following one directory tree with inotify, reporting settled files in batches
+    """
+    _fd = None
+    _thread = None
+
+    def __init__(self, path: str, on_arrival: Callable[[List[str]], None],
+                 accept: Callable[[str], bool] = None,
+                 recursive: bool = True,
+                 settle: float = DEFAULT_SETTLE_SECONDS):
+        """
+        :param path: directory to follow
+        :param on_arrival: called on the watcher thread with a list of complete file paths
+        :param accept: predicate on the file's base name; files it rejects are ignored
+        :param recursive: also follow subdirectories, including ones created later
+        :param settle: seconds a file must stay unchanged after it is closed before it is reported
+        """
+        self.path = os.path.abspath(path)
+        self._on_arrival = on_arrival
+        self._accept = accept or (lambda name: True)
+        self._recursive = recursive
+        self._settle = settle
+        self._dirs = {}  # watch descriptor: directory path
+        self._pending = {}  # path: (monotonic time of last event, size at that time, whether closed)
+        self._stopping = threading.Event()
+
+    def start(self):
+        libc = _inotify_libc()
+        fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if fd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, os.strerror(err))
+        self._fd = fd
+        self._add_tree(self.path)
+        self._thread = threading.Thread(target=self._run, name='watch {}'.format(self.path), daemon=True)
+        self._thread.start()
+        LOG.info('watching {} for new files'.format(self.path))
+
+    def stop(self, timeout=None):
+        self._stopping.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    @property
+    def is_running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def _add_watch(self, dir_path):
+        wd = _inotify_libc().inotify_add_watch(self._fd, os.fsencode(dir_path), WATCH_MASK)
+        if wd < 0:
+            err = ctypes.get_errno()
+            LOG.warning('unable to watch {}: {}'.format(dir_path, os.strerror(err)))
+            return
+        self._dirs[wd] = dir_path
+
+    def _add_tree(self, dir_path, report_existing=False):
+        """
+        watch a directory and, if recursive, its subdirectories
+        :param report_existing: treat files already present as arrivals; used for directories created while watching
+        """
+        self._add_watch(dir_path)
+        try:
+            with os.scandir(dir_path) as entries:
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        if self._recursive:
+                            self._add_tree(entry.path, report_existing)
+                    elif report_existing and self._accept(entry.name):
+                        self._touch(entry.path, closed=True)
+        except OSError as oops:
+            LOG.warning('unable to scan {}: {}'.format(dir_path, oops))
+
+    def _touch(self, path, closed):
+        try:
+            size = os.stat(path).st_size
+        except OSError:
+            self._pending.pop(path, None)
+            return
+        _, _, was_closed = self._pending.get(path, (None, None, False))
+        self._pending[path] = (time.monotonic(), size, closed or was_closed)
+
+    def _events(self, buf):
+        offset = 0
+        while offset + _EVENT_HEADER.size <= len(buf):
+            wd, mask, cookie, length = _EVENT_HEADER.unpack_from(buf, offset)
+            offset += _EVENT_HEADER.size
+            name = os.fsdecode(buf[offset:offset + length].rstrip(b'\0'))
+            offset += length
+            yield wd, mask, name
+
+    def _read_events(self):
+        try:
+            buf = os.read(self._fd, READ_SIZE)
+        except BlockingIOError:
+            return
+        for wd, mask, name in self._events(buf):
+            if mask & IN_Q_OVERFLOW:
+                LOG.warning('inotify queue overflowed for {}, some arrivals may be missed'.format(self.path))
+                continue
+            if mask & (IN_IGNORED | IN_DELETE_SELF):
+                self._dirs.pop(wd, None)
+                continue
+            parent = self._dirs.get(wd)
+            if parent is None or not name:
+                continue
+            path = os.path.join(parent, name)
+            if mask & IN_ISDIR:
+                if self._recursive and mask & (IN_CREATE | IN_MOVED_TO):
+                    self._add_tree(path, report_existing=True)
+                continue
+            if not self._accept(name):
+                continue
+            if mask & (IN_CLOSE_WRITE | IN_MOVED_TO):
+                self._touch(path, closed=True)
+            elif path in self._pending or mask & IN_CREATE:
+                self._touch(path, closed=False)
+
+    def _settled(self):
+        """
+        pop and return files which have been closed and unchanged for the settle period
+        """
+        now = time.monotonic()
+        ready = []
+        for path, (when, size, closed) in list(self._pending.items()):
+            if not closed or now - when < self._settle:
+                continue
+            try:
+                current = os.stat(path).st_size
+            except OSError:
+                del self._pending[path]
+                continue
+            if current != size:  # still being appended to by another writer
+                self._pending[path] = (now, current, closed)
+                continue
+            del self._pending[path]
+            ready.append(path)
+        return sorted(ready)
+
+    def _run(self):
+        poll_interval = min(0.5, self._settle / 2.0) or 0.1
+        try:
+            while not self._stopping.is_set():
+                readable, _, _ = select.select([self._fd], [], [], poll_interval)
+                if readable:
+                    self._read_events()
+                ready = self._settled()
+                if ready:
+                    LOG.debug('{} new files settled in {}'.format(len(ready), self.path))
+                    try:
+                        self._on_arrival(ready)
+                    except Exception:
+                        LOG.error('failed to ingest new files from {}'.format(self.path), exc_info=True)
+        finally:
+            os.close(self._fd)
+            self._fd = None
+            self._dirs.clear()
+
+
+class tests(unittest.TestCase):
+
+    @unittest.skipUnless(is_available(), 'requires inotify')
+    def test_settled_arrivals(self):
+        from tempfile import TemporaryDirectory
+        arrived = []
+        done = threading.Event()
+
+        def on_arrival(paths):
+            arrived.extend(paths)
+            done.set()
+
+        with TemporaryDirectory() as tmp:
+            watcher = DirectoryWatcher(tmp, on_arrival, accept=lambda name: name.endswith('.nc'), settle=0.2)
+            watcher.start()
+            try:
+                os.makedirs(os.path.join(tmp, 'sub'))
+                time.sleep(0.1)
+                with open(os.path.join(tmp, 'sub', 'granule.nc'), 'wb') as fp:
+                    fp.write(b'partial')
+                    fp.flush()
+                    time.sleep(0.5)
+                    self.assertEqual(arrived, [])  # still open for writing
+                    fp.write(b' complete')
+                open(os.path.join(tmp, 'ignored.txt'), 'wb').close()
+                self.assertTrue(done.wait(5.0))
+            finally:
+                watcher.stop()
+            self.assertEqual(arrived, [os.path.join(tmp, 'sub', 'granule.nc')])
+            self.assertFalse(watcher.is_running)
+
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(
+        description="print files as they arrive in a directory",
+        epilog="",
+        fromfile_prefix_chars='@')
+    parser.add_argument('-v', '--verbose', dest='verbosity', action="count", default=0,
+                        help='each occurrence increases verbosity 1 level through ERROR-WARNING-INFO-DEBUG')
+    parser.add_argument('directory', nargs='?',
+                        help="directory to follow")
+    args = parser.parse_args()
+
+    levels = [logging.ERROR, logging.WARN, logging.INFO, logging.DEBUG]
+    logging.basicConfig(level=levels[min(3, args.verbosity)])
+
+    if not args.directory:
+        unittest.main(argv=sys.argv[:1])
+        return 0
+
+    watcher = DirectoryWatcher(args.directory, lambda paths: print('\n'.join(paths)))
+    watcher.start()
+    try:
+        while watcher.is_running:
+            time.sleep(1.0)
+    except KeyboardInterrupt:
+        watcher.stop()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -46,7 +46,9 @@ import argparse
 import logging
 import os
 import sys
+import threading
 import unittest
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from uuid import UUID, uuid1 as uuidgen
 from typing import Mapping, Set, List
@@ -54,24 +56,34 @@ from collections import Mapping as ReadOnlyMapping
 
 import numba as nb
 import numpy as np
-from PyQt4.QtCore import QObject, pyqtSignal
+from PyQt4.QtCore import QObject, pyqtSignal, Qt
 from pyproj import Proj
 from rasterio import Affine
 from shapely.geometry.polygon import LinearRing
+from sqlalchemy import select
+from sqlalchemy.orm import object_session
 
 from sift.common import INFO, KIND
 from sift.model.shapes import content_within_shape
 from sift.workspace.importer import GeoTiffImporter, GoesRPUGImporter
-from .metadatabase import Metadatabase, Content, Product, Resource
+from .metadatabase import Metadatabase, Content, Product, Resource, DirectoryStamp, AlgebraicKey, FOOTPRINTS, footprint_for_grid
 from .importer import aImporter, GeoTiffImporter, GoesRPUGImporter, generate_guidebook_metadata
+from .collector import ABI_AHI_Hunter
+from .algebraic import AlgebraicContent, compile_expression, content_key, evaluate_expression, evaluate_into, materialize_to_file
 
 LOG = logging.getLogger(__name__)
 
 DEFAULT_WORKSPACE_SIZE = 256
 MIN_WORKSPACE_SIZE = 8
+ALGEBRAIC_CHUNK_BYTES = 64 * 1024 ** 2  # bound on memory used per row block when materializing algebraic layers
 
 IMPORT_CLASSES = [GeoTiffImporter, GoesRPUGImporter]
 
+# number of concurrent stat calls when validating the inventory; source paths may be on slow network filesystems
+VALIDATION_STAT_THREADS = 8
+# keep IN (...) queries under the SQLite host parameter limit
+SQL_IN_CHUNK = 500
+
 
 # first instance is main singleton instance; don't preclude the possibility of importing from another workspace later on
 TheWorkspace = None
@@ -175,8 +187,18 @@ class ActiveContent(QObject):
         Returns:
             bool
         """
-        path = os.path.join(wsd, c.path)
-        return os.access(path, os.R_OK) and (os.stat(path).st_size > 0)
+        return cls.can_attach_path(wsd, c.path)
+
+    @staticmethod
+    def can_attach_path(wsd:str, path:str):
+        """
+        Is this content path (relative to the workspace) available?
+        """
+        path = os.path.join(wsd, path)
+        try:
+            return os.access(path, os.R_OK) and (os.stat(path).st_size > 0)
+        except OSError:
+            return False
 
     @property
     def data(self):
@@ -249,6 +271,7 @@ class Workspace(QObject):
     cwd = None  # directory we work in
     _own_cwd = None  # whether or not we created the cwd - which is also whether or not we're allowed to destroy it
     _pool = None  # process pool that importers can use for background activities, if any
+    _own_pool = False  # the process pool was started by this workspace, which shuts it down on close
     # _importers = None  # list of importers to consult when asked to start an import
     _available: Mapping[int, ActiveContent] = None  # dictionary of {Content.id : ActiveContent object}
     _inventory: Metadatabase = None  # metadatabase instance, sqlalchemy
@@ -256,6 +279,8 @@ class Workspace(QObject):
     _tempdir = None  # TemporaryDirectory, if it's needed (i.e. a directory name was not given)
     _max_size_gb = None  # maximum size in gigabytes of flat files we cache in the workspace
     _queue = None
+    _watchers = None  # {directory path: DirectoryWatcher} for landing directories we follow
+    _materializing = None  # {product uuid: threading.Event} cancellation flags for algebraic layers being written to the cache
 
     # signals
     didStartImport = pyqtSignal(dict)  # a dataset started importing; generated after overview level of detail is available
@@ -263,6 +288,7 @@ class Workspace(QObject):
     didUpdateDataset = pyqtSignal(dict)  # partial completion of a dataset import, new datasetinfo dict is released
     didFinishImport = pyqtSignal(dict)  # all loading activities for a dataset have completed
     didDiscoverExternalDataset = pyqtSignal(dict)  # a new dataset was added to the workspace from an external agent
+    didReceiveArrivals = pyqtSignal(list)  # complete files arrived in a watched directory, emitted from the watcher thread
 
     _importers = [GeoTiffImporter, GoesRPUGImporter]
 
@@ -289,6 +315,8 @@ class Workspace(QObject):
         Initialize a new or attach an existing workspace, creating any necessary bookkeeping.
         """
         super(Workspace, self).__init__()
+        self._queue = queue
+        self._pool = process_pool
         self._max_size_gb = max_size_gb if max_size_gb is not None else DEFAULT_WORKSPACE_SIZE
         if self._max_size_gb < MIN_WORKSPACE_SIZE:
             self._max_size_gb = MIN_WORKSPACE_SIZE
@@ -310,6 +338,10 @@ class Workspace(QObject):
             self._own_cwd = False
             self._init_inventory_existing_datasets()
         self._available = {}
+        self._watchers = {}
+        # arrivals are imported on the thread the workspace lives on, like files opened by the user
+        self.didReceiveArrivals.connect(self._ingest_arrivals, type=Qt.QueuedConnection)
+        self._materializing = {}
         self._importers = [x for x in IMPORT_CLASSES]
         global TheWorkspace  # singleton
         if TheWorkspace is None:
@@ -325,43 +357,148 @@ class Workspace(QObject):
         if not os.path.isdir(dn):
             raise EnvironmentError("workspace directory {} does not exist".format(dn))
         LOG.info('{} database at {}'.format('initializing' if should_init else 'attaching', self._inventory_path))
-        self._inventory = md = Metadatabase('sqlite:///' + self._inventory_path, create_tables=should_init)
+        # always create missing tables, older workspaces may only have previous versions of the schema
+        self._inventory = md = Metadatabase('sqlite:///' + self._inventory_path, create_tables=True)
         if should_init:
             with self._inventory as s:
                 assert(0 == s.query(Content).count())
+        else:
+            self._purge_legacy_inventory()
         LOG.info('done with init')
 
+    def _purge_legacy_inventory(self):
+        """
+        discard the inventory of an older schema along with its cache files, products are re-imported from their resources
+        """
+        paths = self._inventory.legacy_content_paths()
+        if paths:
+            LOG.warning("removing {} cache files of an older workspace inventory".format(len(paths)))
+        for path in paths:
+            pn = os.path.join(self.cwd, path)
+            try:
+                os.remove(pn)
+            except FileNotFoundError:
+                pass
+            except OSError as err:
+                LOG.warning("could not remove {}: {}".format(pn, err))
+        self._inventory.drop_legacy_tables()
+
+    @staticmethod
+    def _parallel_test(test, items):
+        """
+        run a blocking predicate (typically a stat) over items with a bounded number of threads
+        :return: list of bool in the same order as items
+        """
+        items = list(items)
+        if len(items) <= 1:
+            return [test(x) for x in items]
+        with ThreadPoolExecutor(max_workers=VALIDATION_STAT_THREADS) as pool:
+            return list(pool.map(test, items))
+
+    @staticmethod
+    def _dir_mtime(path):
+        try:
+            return os.stat(path).st_mtime
+        except OSError:
+            return None
+
+    @staticmethod
+    def _chunks(seq, n=SQL_IN_CHUNK):
+        seq = list(seq)
+        for i in range(0, len(seq), n):
+            yield seq[i:i + n]
+
+    def _changed_directories(self, session, dirs):
+        """
+        compare directory mtimes against stored generation stamps
+        :param dirs: iterable of absolute directory paths
+        :return: ({dir: mtime} for directories needing validation, which may be None if the directory is gone,
+                  {dir: mtime} for directories whose stamp still matches)
+        """
+        dirs = list(dirs)
+        stamps = dict((d.path, d.mtime) for d in session.query(DirectoryStamp).all())
+        mtimes = self._parallel_test(self._dir_mtime, dirs)
+        changed, unchanged = {}, {}
+        for d, mt in zip(dirs, mtimes):
+            if mt is not None and stamps.get(d) == mt:
+                unchanged[d] = mt
+            else:
+                changed[d] = mt
+        return changed, unchanged
+
+    @staticmethod
+    def _stamp_directories(session, dir_mtimes):
+        now = datetime.utcnow()
+        for d, mt in dir_mtimes.items():
+            if mt is None:
+                session.query(DirectoryStamp).filter_by(path=d).delete()
+            else:
+                session.merge(DirectoryStamp(path=d, mtime=mt, validated=now))
+
     def _purge_missing_content(self):
         """
         remove Content entries that no longer correspond to files in the cache directory
+        content is checked per directory holding it, directories whose mtime matches their stamp are skipped
+        a directory's mtime only changes when entries are added, removed or renamed: a file truncated or rewritten
+        in place goes unnoticed until something else changes in its directory, and every import into a directory
+        has its content re-checked on the next validation
         """
         LOG.debug("purging Content no longer available in the cache")
-        to_purge = []
         with self._inventory as s:
-            for c in s.query(Content).all():
-                if not ActiveContent.can_attach(self.cwd, c):
+            by_dir = {}
+            for cid, path in s.query(Content.id, Content.path).filter(Content.path.isnot(None)).all():
+                by_dir.setdefault(os.path.dirname(os.path.join(self.cwd, path)), []).append((cid, path))
+            changed, unchanged = self._changed_directories(s, by_dir.keys())
+            LOG.debug("{} of {} content directories changed since last validation".format(len(changed), len(by_dir)))
+            if not changed:
+                return
+            id_paths = [ip for d in changed.keys() for ip in by_dir[d]]
+            present = self._parallel_test(lambda ip: ActiveContent.can_attach_path(self.cwd, ip[1]), id_paths)
+            purge_ids = [ip[0] for ip, ok in zip(id_paths, present) if not ok]
+            LOG.debug("{} content entities no longer present in cache - will remove from database".format(len(purge_ids)))
+            for ids in self._chunks(purge_ids):
+                for c in s.query(Content).filter(Content.id.in_(ids)).all():
+                    if c.product is not None and c.product.expression:
+                        LOG.info("algebraic content {} left the cache, it will be evaluated on demand".format(c.path))
+                        c.path = None
+                        continue
                     LOG.warning("purging missing content {}".format(c.path))
-                    to_purge.append(c)
-            LOG.debug("{} content entities no longer present in cache - will remove from database".format(len(to_purge)))
-            for c in to_purge:
-                try:
-                    c.product.content.remove(c)
-                except AttributeError as no_product:
-                    LOG.warning("orphaned content {}??, removing".format(c.path))
-                s.delete(c)
+                    try:
+                        c.product.content.remove(c)
+                    except AttributeError as no_product:
+                        LOG.warning("orphaned content {}??, removing".format(c.path))
+                    s.delete(c)
+            self._stamp_directories(s, changed)
 
     def _purge_inaccessible_resources(self):
         """
         remove Resources that are no longer accessible
+        only resources in directories which changed since they were last validated are checked
         """
         LOG.debug("purging any resources that are no longer accessible")
         with self._inventory as s:
-            for r in s.query(Resource).all():
-                if not r.exists():
-                    LOG.info("resource {} no longer exists, purging from database")
-                    # for p in r.product:
-                    #     p.resource.remove(r)
+            rows = s.query(Resource.id, Resource.scheme, Resource.path).all()
+            by_dir = {}
+            for rid, scheme, path in rows:
+                if scheme not in {None, 'file'}:
+                    continue  # FUTURE: alternate tests for still-exists-ness
+                by_dir.setdefault(os.path.dirname(path), []).append((rid, path))
+            changed, unchanged = self._changed_directories(s, by_dir.keys())
+            LOG.debug("{} of {} resource directories changed since last validation".format(len(changed), len(by_dir)))
+            purge_ids = []
+            to_check = []
+            for d, mt in changed.items():
+                if mt is None:  # whole directory is gone
+                    purge_ids += [rid for rid, _ in by_dir[d]]
+                else:
+                    to_check += by_dir[d]
+            present = self._parallel_test(lambda rp: os.path.exists(rp[1]), to_check)
+            purge_ids += [rp[0] for rp, ok in zip(to_check, present) if not ok]
+            for ids in self._chunks(purge_ids):
+                for r in s.query(Resource).filter(Resource.id.in_(ids)).all():
+                    LOG.info("resource {} no longer exists, purging from database".format(r.path))
                     s.delete(r)
+            self._stamp_directories(s, changed)
 
     def _purge_orphan_products(self):
         """
@@ -369,24 +506,59 @@ class Workspace(QObject):
         """
         LOG.debug("purging Products no longer recoverable by re-importing from Resources, and having no Content representation in cache")
         with self._inventory as s:
-            for p in s.query(Product).all():
-                if len(p.content)==0 and len(p.resource)==0:
-                    LOG.info("discarding orphaned product {}".format(repr(p)))
-                    s.delete(p)
+            for p in s.query(Product).filter(~Product.content.any(), ~Product.resource.any()).all():
+                LOG.info("discarding orphaned product {}".format(repr(p)))
+                s.delete(p)
+
+    def _index_footprint(self, session, prod: Product):
+        """
+        compute a product's lon/lat footprint from its native content navigation and add it to the spatiotemporal index
+        """
+        content = self._product_native_content(session, prod=prod)
+        if content is None:
+            return
+        bounds = footprint_for_grid(content.proj4, content.origin_x, content.origin_y,
+                                    content.cell_width, content.cell_height, content.rows, content.cols)
+        self._inventory.set_footprint(session, prod, bounds)
+
+    def _index_missing_footprints(self):
+        """
+        index products imported before footprints were recorded
+        """
+        with self._inventory as s:
+            indexed = select([FOOTPRINTS.c.id])
+            for p in s.query(Product).filter(Product.content.any(), ~Product.id.in_(indexed)).all():
+                self._index_footprint(s, p)
 
+    def _bgnd_validate_inventory(self):
+        """
+        background task checking that the workspace inventory still corresponds to the filesystem
+        """
+        from sift.queue import TASK_DOING, TASK_PROGRESS
+        stages = [('checking cached content', self._purge_missing_content),
+                  ('checking source files', self._purge_inaccessible_resources),
+                  ('removing orphan products', self._purge_orphan_products),
+                  ('indexing product footprints', self._index_missing_footprints)]
+        for idx, (doing, stage) in enumerate(stages):
+            yield {TASK_DOING: doing, TASK_PROGRESS: float(idx) / len(stages)}
+            stage()
+        yield {TASK_DOING: 'workspace validated', TASK_PROGRESS: 1.0}
 
     def _init_inventory_existing_datasets(self):
         """
         Do an inventory of an pre-existing workspace
-        FIXME: go through and check that everything in the workspace makes sense
+        Validation of content and resources is done on the background queue if we have one,
+        so that the application can start without waiting on the filesystem.
         FIXME: check workspace subdirectories for helper sockets and mmaps
         :return:
         """
         # attach the database, creating it if needed
         self._init_create_workspace()
-        self._purge_missing_content()
-        self._purge_inaccessible_resources()
-        self._purge_orphan_products()
+        if self._queue is not None:
+            self._queue.add('workspace_validate', self._bgnd_validate_inventory(), 'Validate workspace inventory')
+        else:
+            for _ in self._bgnd_validate_inventory():
+                pass
 
     def _store_inventory(self):
         """
@@ -421,6 +593,25 @@ class Workspace(QObject):
         c.product.touch()
         return zult
 
+    def _activate_virtual_content(self, c: Content) -> AlgebraicContent:
+        """
+        algebraic content has no cache file; bind its expression to the content of its input products
+        """
+        prod = c.product
+        s = object_session(c)
+        inputs = {}
+        for sym in prod.symbol:
+            if not isinstance(sym.value, UUID):
+                continue
+            ic = s.query(Content).filter((Product.uuid_str==str(sym.value)) & (Content.product_id==Product.id)).order_by(Content.lod.desc()).first()
+            if ic is None:
+                raise AssertionError('no content in workspace for algebraic input {}'.format(sym.value))
+            inputs[sym.key] = self._cached_arrays_for_content(ic).data
+        self._available[c.id] = zult = AlgebraicContent(prod.expression, inputs, shape=(c.rows, c.cols))
+        c.touch()
+        prod.touch()
+        return zult
+
     def _cached_arrays_for_content(self, c:Content):
         """
         attach cached data indicated in Content, unless it's been attached already and is in _available
@@ -429,7 +620,11 @@ class Workspace(QObject):
         :return: workspace_content_arrays
         """
         cache_entry = self._available.get(c.id)
-        return cache_entry or self._activate_content(c)
+        if cache_entry is not None:
+            return cache_entry
+        if c.path is None and c.product.expression:
+            return self._activate_virtual_content(c)
+        return self._activate_content(c)
 
     def _deactivate_content_for_product(self, p:Product):
         if p is None:
@@ -534,6 +729,39 @@ class Workspace(QObject):
                 return frozendict(ChainMap(native_content.info, prod.info))
             return frozendict(prod.info)  # mapping semantics for database fields, as well as key-value fields; flatten to one namespace and read-only
 
+    @property
+    def queryable_info_keys(self):
+        """
+        INFO keys which product_uuids_where can match and order on
+        """
+        return frozenset(Metadatabase.QUERYABLE.keys())
+
+    def product_uuids_where(self, match=None, bands=None, time_range=None, order_by=(INFO.SCHED_TIME, INFO.SHORT_NAME),
+                            region=None):
+        """
+        ordered UUIDs of products in the metadatabase matching criteria, see Metadatabase.product_uuids_where
+        :param match: {INFO key: value} required values
+        :param bands: collection of acceptable band numbers
+        :param time_range: (start, end) inclusive range of schedule times
+        :param order_by: sequence of INFO keys to sort on
+        :param region: (west, south, east, north) degrees which imported products' footprints must intersect
+        :return: list of UUIDs
+        """
+        with self._inventory as s:
+            return self._inventory.product_uuids_where(s, match=match, bands=bands, time_range=time_range,
+                                                       order_by=order_by, region=region)
+
+    def product_uuids_covering(self, lon, lat, time_range=None, match=None):
+        """
+        cached products whose footprint includes a point, e.g. for probing a location across everything in the workspace
+        :param lon: longitude in degrees
+        :param lat: latitude in degrees
+        :param time_range: (start, end) inclusive range of schedule times
+        :param match: {INFO key: value} required values
+        :return: list of UUIDs in time order
+        """
+        return self.product_uuids_where(match=match, time_range=time_range, region=(lon, lat, lon, lat))
+
     def get_algebraic_namespace(self, uuid):
         if uuid is None:
             return {}, ""
@@ -583,12 +811,26 @@ class Workspace(QObject):
         typically used for add-from-cache dialog
         FUTURE:
         """
+        return self.product_names_available_in_cache_where()
+
+    def product_names_available_in_cache_where(self, region=None, time_range=None, match=None):
+        """
+        product_names_available_in_cache, narrowed to products covering a lon/lat box during a time range
+        :param region: (west, south, east, north) degrees
+        :param time_range: (start, end) inclusive range of schedule times
+        :param match: {INFO key: value} required values
+        Returns: dictionary of {resource or product name: UUID,...}
+        """
         # find non-overview non-auxiliary data files
         # FIXME: also need to include coverage and sparsity paths?? really?
         zult = {}
         product_ids_taken_care_of = set()
         with self._inventory as s:
-            for c in s.query(Content).all():
+            q = s.query(Content)
+            if region is not None or time_range is not None or match:
+                uuids = self._inventory.product_uuids_where(s, match=match, time_range=time_range, region=region)
+                q = q.join(Content.product).filter(Product.uuid_str.in_([str(u) for u in uuids]))
+            for c in q.all():
                 p = c.product
                 if p.id in product_ids_taken_care_of:
                     continue
@@ -696,6 +938,14 @@ class Workspace(QObject):
                 # remove all content for lowest atimes until
 
     def close(self):
+        for path in list(self._watchers.keys()):
+            self.unwatch_directory(path)
+        for cancel in list(self._materializing.values()):
+            cancel.set()
+        if self._own_pool and self._pool is not None:
+            # don't leave spawned workers running after the application exits
+            self._pool.shutdown(wait=False)
+            self._pool = None
         self._clean_cache()
         # self._S.commit()
 
@@ -799,6 +1049,7 @@ class Workspace(QObject):
             # self._data[uuid] = data = self._convert_to_memmap(str(uuid), data)
             LOG.debug('received {} updates during import'.format(nupd))
             uuid = prod.uuid
+            self._index_footprint(S, prod)
         # S.commit()
         # S.flush()
 
@@ -806,6 +1057,66 @@ class Workspace(QObject):
         ac = self._overview_content_for_uuid(uuid)
         return ac.data
 
+    def watch_directory(self, path, recursive=True):
+        """
+        follow a landing directory, importing complete files as they arrive
+        didDiscoverExternalDataset is emitted for each newly imported product
+        :param path: directory to follow
+        :param recursive: also follow subdirectories
+        """
+        from .watcher import DirectoryWatcher  # Linux only
+        path = os.path.abspath(path)
+        if path in self._watchers:
+            return
+        hunter = ABI_AHI_Hunter(self._inventory)
+        watcher = DirectoryWatcher(path, lambda paths: self.didReceiveArrivals.emit(list(paths)), recursive=recursive,
+                                   accept=lambda name: hunter.skim(name) is not None)
+        watcher.start()
+        self._watchers[path] = watcher
+
+    def unwatch_directory(self, path):
+        watcher = self._watchers.pop(os.path.abspath(path), None)
+        if watcher is not None:
+            watcher.stop()
+
+    def _ingest_arrivals(self, paths):
+        """
+        slot for didReceiveArrivals: skim the arrived files into the metadatabase and queue the import of their content
+        :param paths: complete files which arrived in a watched directory
+        """
+        with self._inventory as S:
+            found = ABI_AHI_Hunter(self._inventory).hunt_seq(S, paths)
+            LOG.debug('{} new products registered from {} arrivals'.format(found, len(paths)))
+            uuids = []
+            for chunk in self._chunks(paths):
+                q = S.query(Product.uuid_str).join(Product.resource).filter(Resource.path.in_(chunk))
+                uuids.extend(UUID(uuid_str) for (uuid_str,) in q)
+        if not uuids:
+            return
+        task = self._bgnd_import_arrivals(uuids)
+        if self._queue is not None:
+            self._queue.add('import arrivals {}'.format(uuids[0]), task, 'Import arriving data')
+        else:
+            for _ in task:
+                pass
+
+    def _bgnd_import_arrivals(self, uuids):
+        """
+        background task importing the content of arrived products, announcing each as it completes
+        """
+        from sift.queue import TASK_DOING, TASK_PROGRESS
+        for idx, uuid in enumerate(uuids):
+            yield {TASK_DOING: 'importing arriving data', TASK_PROGRESS: float(idx) / len(uuids)}
+            try:
+                self.import_product_content(uuid=uuid)
+            except Exception:
+                LOG.error('unable to import arriving product {}'.format(uuid), exc_info=True)
+                continue
+            info = self.get_info(uuid)
+            if info is not None:
+                self.didDiscoverExternalDataset.emit(dict(info))
+        yield {TASK_DOING: 'imported arriving data', TASK_PROGRESS: 1.0}
+
     def create_composite(self, symbols:dict, relation:dict):
         """
         create a layer composite in the workspace
@@ -828,19 +1139,28 @@ class Workspace(QObject):
     #     mm = np.memmap(fp, dtype=data.dtype, shape=data.shape, mode='w+')
     #     mm[:] = data[:]
     #     return mm
-    def create_algebraic_composite(self, operations, namespace, info=None):
+    def create_algebraic_composite(self, operations, namespace, info=None, resolution='finest'):
+        """
+        register an algebraic layer as a virtual product whose pixels are evaluated on demand, tile by tile
+        :param operations: code block, last statement assigning the result
+        :param namespace: {symbol: input product uuid}
+        :param info: initial metadata for the new product
+        :param resolution: 'finest' evaluates on the grid of the finest input, index-mapping coarser inputs;
+                           'coarsest' evaluates on the grid of the coarsest input, striding through finer inputs
+        :return: uuid, info, lazily evaluated overview content
+        """
+        if resolution not in ('finest', 'coarsest'):
+            raise ValueError("resolution must be 'finest' or 'coarsest', not {}".format(repr(resolution)))
         from functools import reduce
         from datetime import timedelta
         if not info:
             info = {}
 
-        import ast
-        try:
-            ops_ast = ast.parse(operations, mode='exec')
-            ops = compile(ast.parse(operations, mode='exec'), '<string>', 'exec')
-            result_name = ops_ast.body[-1].targets[0].id
-        except SyntaxError:
-            raise ValueError("Invalid syntax or operations in algebraic layer")
+        compile_expression(operations)
+        key = content_key(operations, namespace, resolution)
+        previous = self._reuse_algebraic_product(key, info)
+        if previous is not None:
+            return previous
 
         uuid = uuidgen()
         dep_metadata = {n: self.get_metadata(u) for n, u in namespace.items() if isinstance(u, UUID)}
@@ -872,39 +1192,258 @@ class Workspace(QObject):
             LOG.error("witness sample: {}".format(repr(dep_metadata[badboys[0]])))
             raise
         valids_namespace = {n: valid_combos[idx] for idx, n in enumerate(names)}
-        content = {n: self.get_content(m[INFO.UUID]) for n, m in dep_metadata.items()}
 
-        # Get all content in the same shape
-        max_meta = max(dep_metadata.values(), key=lambda x: x[INFO.SHAPE])
+        # the result takes the grid of the finest- or coarsest-resolution input, judged by pixel count
+        pick = max if resolution == 'finest' else min
+        grid_meta = pick(dep_metadata.values(), key=lambda x: int(np.prod(x[INFO.SHAPE][:2])))
         for k in (INFO.PROJ, INFO.ORIGIN_X, INFO.ORIGIN_Y, INFO.CELL_WIDTH, INFO.CELL_HEIGHT):
-            info[k] = max_meta[k]
-        max_shape = max_meta[INFO.SHAPE]
-        for k, v in content.items():
-            if v.shape != max_shape:
-                f0 = int(max_shape[0] / v.shape[0])
-                f1 = int(max_shape[1] / v.shape[1])
-                v = np.ma.repeat(np.ma.repeat(v, f0, axis=0), f1, axis=1)
-                content[k] = v
-
-        # Run the code: code_object, no globals, copy of locals
-        exec(ops, None, valids_namespace)
-        if result_name not in valids_namespace:
-            raise RuntimeError("Unable to retrieve result '{}' from code execution".format(result_name))
-        info[INFO.VALID_RANGE] = (np.nanmin(valids_namespace[result_name]), np.nanmax(valids_namespace[result_name]))
-        info[INFO.CLIM] = (np.nanmin(valids_namespace[result_name]), np.nanmax(valids_namespace[result_name]))
+            info[k] = grid_meta[k]
+
+        # the same fused kernel later used on the data gives the range over every combination of input limits
+        valids = evaluate_expression(operations, valids_namespace)
+        info[INFO.VALID_RANGE] = (np.nanmin(valids), np.nanmax(valids))
+        info[INFO.CLIM] = (np.nanmin(valids), np.nanmax(valids))
         info[INFO.OBS_DURATION] = reduce(min, [x.get(INFO.OBS_DURATION, timedelta(seconds=0)) for x in md_list])
-        exec(ops, None, content)
-        if result_name not in content:
-            raise RuntimeError("Unable to retrieve result '{}' from code execution".format(result_name))
-        info[INFO.SHAPE] = content[result_name].shape
+        info[INFO.SHAPE] = tuple(grid_meta[INFO.SHAPE])
 
         info = generate_guidebook_metadata(info)
 
-        uuid, info, data = self._create_product_from_array(info, content[result_name],
-                                                           namespace=namespace,
-                                                           codeblock=operations)
+        uuid, info, data = self._create_virtual_product(info, namespace=namespace, codeblock=operations, key=key)
         return uuid, info, data
 
+    def _reuse_algebraic_product(self, key, info):
+        """
+        find an existing product for a normalized algebraic request, created in this or an earlier session
+        its name is updated to the one requested, its content is reused whether it is cached or virtual
+        a document holding the product as a layer takes the new name from the returned info
+        :return: (uuid, info, data) or None if there is no such product with content
+        """
+        with self._inventory as s:
+            found = s.query(AlgebraicKey).filter_by(key=key).first()
+            if found is None or not found.product.content:
+                return None
+            prod = found.product
+            uuid = prod.uuid
+            name = info.get(INFO.SHORT_NAME)
+            if name is not None and name != prod.info.get(INFO.SHORT_NAME):
+                relabel = {INFO.SHORT_NAME: name, INFO.DATASET_NAME: info.get(INFO.DATASET_NAME, name)}
+                renamed = dict(prod.info)
+                renamed.pop(INFO.DISPLAY_NAME, None)
+                renamed.update(relabel)
+                relabel[INFO.DISPLAY_NAME] = generate_guidebook_metadata(renamed)[INFO.DISPLAY_NAME]
+                prod.update(relabel)
+        LOG.info('reusing algebraic product {} for an equivalent request'.format(uuid))
+        return uuid, self.get_info(uuid), self._overview_content_for_uuid(uuid)
+
+    def _create_virtual_product(self, info, namespace, codeblock, key=None):
+        """
+        add Product and Content entries for an algebraic product without computing any of its data
+        the Content has no path; its arrays are evaluated from the expression and symbol table when requested
+        Returns:
+            uuid, info, data: uuid of the new product, its official read-only metadata, and lazily evaluated content
+        """
+        parms = dict(info)
+        now = datetime.utcnow()
+        parms.update(dict(
+            atime = now,
+            mtime = now,
+        ))
+        P = Product.from_info(parms, symbols=namespace, codeblock=codeblock)
+        if key is not None:
+            P.algebraic_keys.append(AlgebraicKey(key=key))
+        uuid = P.uuid
+        parms.update(dict(
+            lod = Content.LOD_OVERVIEW,
+            path = None,
+            dtype = 'float32',
+            proj4 = info[INFO.PROJ],
+            resolution = min(info[INFO.CELL_WIDTH], info[INFO.CELL_HEIGHT])
+        ))
+        parms.update(dict(zip(('rows', 'cols', 'levels'), info[INFO.SHAPE])))
+        C = Content.from_info(parms, only_fields=True)
+        P.content.append(C)
+
+        with self._inventory as S:
+            S.add(P)
+            S.add(C)
+            self._index_footprint(S, P)
+
+        overview_data = self._overview_content_for_uuid(uuid)
+        return uuid, self.get_info(uuid), overview_data
+
+    def materialize_algebraic(self, uuid):
+        """
+        write an algebraic product's content into the workspace cache in the background, one row block at a time
+        until it completes, the layer continues to be evaluated on demand
+        :param uuid: product uuid of an algebraic layer created with create_algebraic_composite
+        """
+        if uuid in self._materializing:
+            return
+        self._materializing[uuid] = cancel = threading.Event()
+        task = self._bgnd_materialize_algebraic(uuid, cancel)
+        if self._queue is not None:
+            self._queue.add('materialize {}'.format(uuid), task, 'Calculate algebraic layer')
+        else:
+            for _ in task:
+                pass
+
+    def cancel_materialize_algebraic(self, uuid):
+        """
+        stop writing an algebraic product to the cache; it remains available through on-demand evaluation
+        """
+        cancel = self._materializing.get(uuid)
+        if cancel is not None:
+            cancel.set()
+
+    def _bgnd_materialize_algebraic(self, uuid, cancel: threading.Event):
+        from sift.queue import TASK_DOING, TASK_PROGRESS
+        doing = 'calculating algebraic layer'
+        ws_filename = '{}.data'.format(str(uuid))
+        ws_path = os.path.join(self.cwd, ws_filename)
+        try:
+            with self._inventory as s:
+                c = self._product_overview_content(s, uuid=uuid)
+                if c is None or c.path is not None:
+                    return
+                cid, rows, cols = c.id, c.rows, c.cols
+                algebraic = self._cached_arrays_for_content(c)
+            yield {TASK_DOING: doing, TASK_PROGRESS: 0.0}
+            with open(ws_path, 'wb+') as fp:
+                mm = np.memmap(fp, dtype=np.float32, shape=(rows, cols), mode='w+')
+            for progress in evaluate_into(algebraic, mm, ALGEBRAIC_CHUNK_BYTES, target='parallel'):
+                if cancel.is_set():
+                    break
+                yield {TASK_DOING: doing, TASK_PROGRESS: progress}
+            mm.flush()
+            del mm
+            if cancel.is_set():
+                LOG.info('cancelled calculation of algebraic layer {}'.format(uuid))
+                os.remove(ws_path)
+            else:
+                self._adopt_materialized_content(cid, ws_filename)
+            yield {TASK_DOING: doing, TASK_PROGRESS: 1.0}
+        finally:
+            self._materializing.pop(uuid, None)
+
+    def _adopt_materialized_content(self, cid, ws_filename):
+        """
+        point virtual algebraic Content at its newly written cache file
+        further requests for this content attach the file instead of evaluating
+        """
+        with self._inventory as s:
+            c = s.query(Content).filter_by(id=cid).first()
+            if c is None:  # product was removed while we were busy
+                os.remove(os.path.join(self.cwd, ws_filename))
+                return
+            c.path = ws_filename
+            self._activate_content(c)
+
+    @property
+    def _process_pool(self):
+        """
+        process pool for CPU-bound background work, created on first use
+        None if no pool can be started safely, in which case the work is done on the calling thread
+        """
+        if self._pool is None and not self._own_pool:
+            import multiprocessing
+            from concurrent.futures import ProcessPoolExecutor
+            try:
+                # spawn rather than fork, the parent holds Qt and sqlite state which must not be duplicated
+                self._pool = ProcessPoolExecutor(mp_context=multiprocessing.get_context('spawn'))
+            except TypeError:
+                # mp_context is new in Python 3.7, and a forked pool is not safe here
+                LOG.info('no spawned process pool before Python 3.7, calculating algebraic layers in this process')
+            # only try once, and remember to shut down what we started
+            self._own_pool = True
+        return self._pool
+
+    def materialize_algebraic_batch(self, uuids):
+        """
+        write several algebraic products into the workspace cache, evaluating them in parallel on the process pool
+        typically the same expression applied to each time step of a loop, so worker processes reuse their compiled kernel
+        products whose inputs are not in the cache themselves (e.g. algebraic layers of algebraic layers)
+        are calculated on the task queue thread instead
+        :param uuids: product uuids of algebraic layers
+        """
+        uuids = [u for u in uuids if u not in self._materializing]
+        if not uuids:
+            return
+        cancels = {}
+        for uuid in uuids:
+            self._materializing[uuid] = cancels[uuid] = threading.Event()
+        task = self._bgnd_materialize_algebraic_batch(cancels)
+        if self._queue is not None:
+            self._queue.add('materialize batch {}'.format(uuids[0]), task, 'Calculate algebraic layers')
+        else:
+            for _ in task:
+                pass
+
+    def _materialize_job(self, session, uuid):
+        """
+        :return: (content id, materialize_to_file arguments) for an algebraic product, or None if it needs this process
+        """
+        c = self._product_overview_content(session, uuid=uuid)
+        if c is None or c.path is not None:
+            return None
+        inputs = {}
+        for sym in c.product.symbol:
+            if not isinstance(sym.value, UUID):
+                continue
+            ic = self._product_native_content(session, uuid=sym.value)
+            if ic is None or ic.path is None:
+                return None
+            inputs[sym.key] = (os.path.join(self.cwd, ic.path), ic.dtype or 'float32', (ic.rows, ic.cols))
+        ws_filename = '{}.data'.format(str(uuid))
+        return c.id, ws_filename, (c.product.expression, inputs, (c.rows, c.cols),
+                                   os.path.join(self.cwd, ws_filename), ALGEBRAIC_CHUNK_BYTES)
+
+    def _bgnd_materialize_algebraic_batch(self, cancels):
+        from concurrent.futures import wait, FIRST_COMPLETED
+        from sift.queue import TASK_DOING, TASK_PROGRESS
+        doing = 'calculating algebraic layers'
+        local = []
+        futures = {}
+        try:
+            with self._inventory as s:
+                jobs = {uuid: self._materialize_job(s, uuid) for uuid in cancels.keys()}
+            pool = self._process_pool
+            for uuid, job in jobs.items():
+                if job is None or pool is None:
+                    local.append(uuid)
+                    continue
+                cid, ws_filename, args = job
+                futures[pool.submit(materialize_to_file, *args)] = (uuid, cid, ws_filename)
+            total, done = len(cancels), 0
+            yield {TASK_DOING: doing, TASK_PROGRESS: 0.0}
+            pending = set(futures.keys())
+            while pending:
+                finished, pending = wait(pending, timeout=0.5, return_when=FIRST_COMPLETED)
+                for future in list(pending):
+                    if cancels[futures[future][0]].is_set() and future.cancel():
+                        pending.discard(future)
+                        done += 1
+                for future in finished:
+                    uuid, cid, ws_filename = futures[future]
+                    done += 1
+                    try:
+                        future.result()
+                    except Exception:
+                        LOG.error('failed to calculate algebraic layer {}'.format(uuid), exc_info=True)
+                        continue
+                    if cancels[uuid].is_set():
+                        os.remove(os.path.join(self.cwd, ws_filename))
+                    else:
+                        self._adopt_materialized_content(cid, ws_filename)
+                    self._materializing.pop(uuid, None)
+                yield {TASK_DOING: doing, TASK_PROGRESS: float(done) / total}
+            for uuid in local:
+                for status in self._bgnd_materialize_algebraic(uuid, cancels[uuid]):
+                    yield {TASK_DOING: doing, TASK_PROGRESS: (done + status[TASK_PROGRESS]) / total}
+                done += 1
+        finally:
+            for uuid in cancels.keys():
+                self._materializing.pop(uuid, None)
+
     def _create_product_from_array(self, info, data, namespace=None, codeblock=None):
         """
         update metadatabase to include Product and Content entries for this new dataset we've calculated
@@ -956,6 +1495,7 @@ class Workspace(QObject):
         with self._inventory as S:
             S.add(P)
             S.add(C)
+            self._index_footprint(S, P)
 
         # activate the content we just loaded into the workspace
         overview_data = self._overview_content_for_uuid(uuid)